@@ -13,9 +13,121 @@ class NetBoxPDUManagerConfig(PluginConfig):
     max_version = '4.9.99'
     required_settings = []
     default_settings = {
-        'enable_api_sync': False,  # Phase 2で使用
-        'sync_interval': 300,      # Phase 2: 秒単位
+        'enable_api_sync': False,
+        'sync_interval': 300,      # 秒単位
+        'sync_concurrency': 200,   # 同時にポーリングするPDU数 (接続プール上限)
+        'sync_timeout': 10,        # リクエスト毎のタイムアウト (秒)
+        'sync_verify_ssl': True,
+        # Raritan セッショントークンと接続の再利用 (Basic認証の代わり)
+        'sessions': {
+            'enabled': True,
+            'max_sessions': 10000,     # 保持するトークン数の上限 (LRU)
+            'idle_timeout': 600,       # PDU側のセッションアイドルタイムアウト (秒)
+            'refresh_margin': 60,      # 期限切れのこの時間前にトークンを取り直す (秒)
+            'keepalive_timeout': 300,  # ポーリング間でHTTP(S)接続を保持する時間 (秒)
+            'shared': True,            # トークンをDjangoキャッシュ経由でプロセス間共有
+        },
+        # PDU毎に次回ポーリング時刻を調整する (sync_interval を基準間隔として使用)
+        'adaptive_polling': False,
+        'poll_scheduler': {
+            'min_interval': 60,    # 最短ポーリング間隔 (秒)
+            'max_interval': 900,   # 最長ポーリング間隔 (秒)
+            'max_backoff': 3600,   # 接続失敗時の最大待機時間 (秒)
+            'jitter': 0.1,         # 次回時刻のばらつき (間隔に対する割合)
+            'load_threshold': 0.8, # 定格電流に対する負荷率がこれ以上なら最短間隔
+            'lease_ttl': 120,      # ポーリング中のPDUを他のワーカーから保護する時間 (秒)
+        },
+        # 分散コレクター (pdu_collector) の設定
+        'collector': {
+            'shard_key': 'pdu',    # 'pdu' または 'site' (同一サイトのPDUを同じワーカーに割り当て)
+            'heartbeat_ttl': 30,   # この時間ハートビートのないワーカーはリングから外す (秒)
+            'replicas': 128,       # ワーカー毎の仮想ノード数
+        },
+        # DB停止中の測定値をローカルのリングファイルに退避し、復旧後に再投入する
+        'spool': {
+            'enabled': False,
+            'path': None,              # 退避ファイル (未設定時は一時ディレクトリ、ホスト内のプロセスで共有)
+            'max_size': 64,            # ファイルサイズ上限 (MB、超えると古い測定値から上書き)
+            'replay_batch': 50000,     # 再投入時の1トランザクションあたりのレコード数
+        },
+        # 一括電源操作 (アウトレットの一括編集とAPI)
+        'switching': {
+            'concurrency': 20,         # 同時に操作するPDU数
+            'stagger_delay': 2.0,      # 電源投入の段階間の待ち時間 (秒)
+            'cycle_delay': 5.0,        # 電源再投入時のOFF時間 (秒)
+            'inrush_factor': 4.0,      # 突入電流の見積り (定常電流に対する倍率)
+            'default_current': 1.0,    # 測定値のないアウトレットの定常電流 (A)
+            'bank_rated_current': 16,  # バンク (ブレーカー) 毎の定格電流 (A)
+        },
+        # 相バランス・過負荷分析 (numpy が必要)
+        'analysis': {
+            'near_limit': 0.8,         # 定格電流に対するこの割合以上の相・バンクを警告
+            'imbalance_threshold': 20, # 相電流の不平衡率 (%) がこれ以上の三相PDUを警告
+        },
+        # PDU詳細ページのライブ更新 (Server-Sent Events)
+        'live_updates': {
+            'enabled': True,
+            'refresh_interval': 3,     # ページが変更を取りに来る間隔 (秒)
+            'poll_interval': 1.0,      # 変更フィードをキャッシュから読む間隔 (秒)
+            'retention': 300,          # 変更イベントと監視の保持時間 (秒)
+            'max_backlog': 100,        # 1回で返す変更イベント数の上限 (超えるとページ再読み込み)
+        },
+        # Prometheus エクスポーター (/api/plugins/pdu-manager/metrics/)
+        'metrics': {
+            'enabled': False,
+            'min_interval': 15,        # スナップショットを再構築する最短間隔 (秒)
+            'compress_level': 1,       # PDU毎に保持する gzip データの圧縮レベル (1-9)
+        },
+        # 変化がこの幅以下の測定値は書き込まない
+        'telemetry_deadband': {
+            'voltage': 1.0,        # V
+            'current': 0.05,       # A
+            'power': 5.0,          # W
+        },
+        'measurement_history': True,
+        # 保存期間 (日数)
+        'measurement_retention': {
+            'raw': 7,
+            '1m': 30,
+            '15m': 365,
+            '1h': 1825,
+        },
+        # 測定履歴の列指向ブロック保存 (アウトレット毎・ブロック毎に圧縮、numpy が必要)
+        'measurement_blocks': {
+            'enabled': False,
+            'block_size': 60,          # ブロックの幅 (分)
+            'retention': 365,          # ブロックの保存期間 (日数)
+            'compress_level': 6,       # zlib 圧縮レベル (1-9)
+        },
+        # アウトレット毎の電力量 (kWh) の積算と月次の締め (TIME_ZONE の暦月)
+        'energy': {
+            'enabled': False,
+            'max_gap': 900,            # 測定値の間隔がこれを超える区間は積算しない (秒)
+        },
+        # PDUタイプ毎のアウトレット自動作成テンプレート (provisioning.OUTLET_TEMPLATES を上書き)
+        'outlet_templates': {},
+        # CSVインポートのアップロード先 (RQワーカーと共有するディレクトリ、未設定時は一時ディレクトリ)
+        'import_directory': None,
     }
 
+    def ready(self):
+        super().ready()
+        from . import signals  # noqa: F401
+
+        from netbox.jobs import system_job
+        from netbox.plugins import get_plugin_config
+        from . import energy, jobs
+        if get_plugin_config(self.name, 'enable_api_sync'):
+            if get_plugin_config(self.name, 'adaptive_polling'):
+                # Runs every minute and polls only the PDUs which are due
+                interval = 1
+            else:
+                interval = max(1, get_plugin_config(self.name, 'sync_interval') // 60)
+            system_job(interval=interval)(jobs.PDUSyncJob)
+        if get_plugin_config(self.name, 'measurement_history'):
+            system_job(interval=1)(jobs.MeasurementMaintenanceJob)
+        if energy.get_settings()['enabled']:
+            system_job(interval=60)(jobs.EnergyPeriodJob)
+
 
 config = NetBoxPDUManagerConfig
@@ -0,0 +1,243 @@
+"""
+Fleet-wide phase balance and overload analysis
+
+The phase, bank and last measured current of every outlet are loaded into columnar
+NumPy arrays (one query for PDUs and one for outlets), and phase currents, phase
+imbalance, bank utilization and the outlets on phases or banks near their breaker
+limit are computed in vectorized passes over the whole fleet.
+"""
+import time
+
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .choices import PHASE_INDEX, PHASE_LABELS
+from .models import PDU, Outlet
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = (
+    'FleetAnalysis',
+    'analyze_fleet',
+)
+
+
+def get_settings():
+    return {
+        **config.default_settings['analysis'],
+        **get_plugin_config('netbox_pdu_manager', 'analysis'),
+    }
+
+
+def _bank_rated_current():
+    return {
+        **config.default_settings['switching'],
+        **get_plugin_config('netbox_pdu_manager', 'switching'),
+    }['bank_rated_current']
+
+
+class FleetAnalysis:
+    """
+    Result of analyze_fleet(). PDU-level arrays are indexed like `pdu_ids`, and
+    `phase_current` and `phase_utilization` have one column per line (L1-L3).
+    """
+    def __init__(self, pdus, outlets, near_limit, imbalance_threshold, bank_rated_current):
+        self.near_limit = near_limit
+        self.imbalance_threshold = imbalance_threshold
+        self.bank_rated_current = bank_rated_current
+        self.timings = {}
+        started = time.perf_counter()
+
+        pdu_ids, names, rated_current, phase_count = pdus
+        self.pdu_ids = np.asarray(pdu_ids, dtype=np.int64)
+        self.names = names
+        self.rated_current = np.asarray(rated_current, dtype=np.float64)
+        self.phase_count = np.asarray(phase_count, dtype=np.int8)
+        outlet_ids, outlet_pdu_ids, outlet_numbers, phases, banks, currents = outlets
+        self.outlet_ids = np.asarray(outlet_ids, dtype=np.int64)
+        self.outlet_numbers = np.asarray(outlet_numbers, dtype=np.int64)
+        current = np.asarray(currents, dtype=np.float64)
+        self.current = np.nan_to_num(current)
+        self.measured = ~np.isnan(current)
+        self.bank = bank = np.asarray(banks, dtype=np.int64)
+
+        n = len(self.pdu_ids)
+        # PDUs are loaded in ID order, so each outlet's PDU is found by binary search
+        self.pdu_index = np.searchsorted(self.pdu_ids, np.asarray(outlet_pdu_ids, dtype=np.int64))
+        three_phase = self.phase_count[self.pdu_index] == 3
+        phase = np.asarray(phases, dtype=np.int8)
+        # Every outlet of a single phase PDU is on its one line
+        self.phase_index = np.where(three_phase, phase, 0)
+        assigned = self.phase_index >= 0
+
+        # Phase currents and utilization
+        flat = self.pdu_index[assigned] * 3 + self.phase_index[assigned]
+        self.phase_current = np.bincount(flat, weights=self.current[assigned], minlength=n * 3).reshape(n, 3)
+        self.unassigned_current = np.bincount(
+            self.pdu_index[~assigned], weights=self.current[~assigned], minlength=n
+        )
+        self.total_current = self.phase_current.sum(axis=1) + self.unassigned_current
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.phase_utilization = np.where(
+                self.rated_current[:, None] > 0, self.phase_current / self.rated_current[:, None], 0.0
+            )
+        self.phase_utilization[self.phase_count != 3, 1:] = 0.0
+
+        # Imbalance: the largest deviation from the mean phase current, as a percentage of the mean
+        mean = self.phase_current.mean(axis=1)
+        deviation = np.abs(self.phase_current - mean[:, None]).max(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.imbalance = np.where((self.phase_count == 3) & (mean > 0), deviation / mean * 100, 0.0)
+
+        # Bank currents, keyed by PDU and bank number
+        banked = bank > 0
+        self.bank_count = int(bank.max()) if bank.size else 0
+        self.bank_current = np.bincount(
+            self.pdu_index[banked] * self.bank_count + bank[banked] - 1,
+            weights=self.current[banked],
+            minlength=n * self.bank_count
+        ).reshape(n, self.bank_count)
+        self.bank_used = np.bincount(
+            self.pdu_index[banked] * self.bank_count + bank[banked] - 1, minlength=n * self.bank_count
+        ).reshape(n, self.bank_count) > 0
+        self.bank_utilization = self.bank_current / bank_rated_current
+
+        # Outlets on a phase or bank at or above the near-limit threshold
+        phase_hot = np.zeros(len(self.outlet_ids), dtype=bool)
+        phase_hot[assigned] = (
+            self.phase_utilization[self.pdu_index[assigned], self.phase_index[assigned]] >= near_limit
+        )
+        bank_hot = np.zeros(len(self.outlet_ids), dtype=bool)
+        bank_hot[banked] = self.bank_utilization[self.pdu_index[banked], bank[banked] - 1] >= near_limit
+        self.near_limit_outlets = phase_hot | bank_hot
+
+        self.timings['analyze'] = time.perf_counter() - started
+
+    def summary(self):
+        three_phase = self.phase_count == 3
+        return {
+            'pdus': len(self.pdu_ids),
+            'outlets': len(self.outlet_ids),
+            'measured_outlets': int(self.measured.sum()),
+            'total_current': round(float(self.total_current.sum()), 2),
+            'three_phase_pdus': int(three_phase.sum()),
+            'imbalanced_pdus': int((self.imbalance >= self.imbalance_threshold).sum()),
+            'phases_near_limit': int((self.phase_utilization >= self.near_limit).sum()),
+            'phases_overloaded': int((self.phase_utilization >= 1).sum()),
+            'banks_near_limit': int(((self.bank_utilization >= self.near_limit) & self.bank_used).sum()),
+            'outlets_near_limit': int(self.near_limit_outlets.sum()),
+            'near_limit': self.near_limit,
+            'imbalance_threshold': self.imbalance_threshold,
+            'bank_rated_current': self.bank_rated_current,
+            'timings': {name: round(seconds, 4) for name, seconds in self.timings.items()},
+        }
+
+    def _pdu(self, i):
+        i = int(i)
+        return {
+            'pdu': int(self.pdu_ids[i]),
+            'name': self.names[i],
+            'phase_count': int(self.phase_count[i]),
+            'rated_current': float(self.rated_current[i]),
+            'total_current': round(float(self.total_current[i]), 2),
+            'phase_current': {
+                label: round(float(self.phase_current[i, j]), 2)
+                for j, label in enumerate(PHASE_LABELS[:self.phase_count[i]])
+            },
+            'max_phase_utilization': round(float(self.phase_utilization[i].max()) * 100, 1),
+            'imbalance': round(float(self.imbalance[i]), 1),
+        }
+
+    def imbalanced_pdus(self, limit=100):
+        """Return the three phase PDUs with an imbalance above the threshold, most imbalanced first"""
+        indexes = np.flatnonzero(self.imbalance >= self.imbalance_threshold)
+        return [self._pdu(i) for i in indexes[np.argsort(-self.imbalance[indexes], kind='stable')][:limit]]
+
+    def loaded_pdus(self, limit=100):
+        """Return the PDUs with a phase at or above the near-limit threshold, most loaded first"""
+        utilization = self.phase_utilization.max(axis=1)
+        indexes = np.flatnonzero(utilization >= self.near_limit)
+        return [self._pdu(i) for i in indexes[np.argsort(-utilization[indexes], kind='stable')][:limit]]
+
+    def loaded_banks(self, limit=100):
+        """Return the banks at or above the near-limit threshold, most loaded first"""
+        pdus, banks = np.nonzero((self.bank_utilization >= self.near_limit) & self.bank_used)
+        utilization = self.bank_utilization[pdus, banks]
+        order = np.argsort(-utilization, kind='stable')[:limit]
+        return [
+            {
+                'pdu': int(self.pdu_ids[pdus[k]]),
+                'name': self.names[pdus[k]],
+                'bank_number': int(banks[k]) + 1,
+                'current': round(float(self.bank_current[pdus[k], banks[k]]), 2),
+                'utilization': round(float(utilization[k]) * 100, 1),
+            }
+            for k in order
+        ]
+
+    def near_limit_outlets_list(self, limit=100):
+        """Return the outlets on a phase or bank near its limit, highest current first"""
+        indexes = np.flatnonzero(self.near_limit_outlets)
+        indexes = indexes[np.argsort(-self.current[indexes], kind='stable')][:limit]
+        return [
+            {
+                'outlet': int(self.outlet_ids[k]),
+                'outlet_number': int(self.outlet_numbers[k]),
+                'pdu': int(self.pdu_ids[self.pdu_index[k]]),
+                'name': self.names[self.pdu_index[k]],
+                'phase': PHASE_LABELS[self.phase_index[k]] if self.phase_index[k] >= 0 else None,
+                'bank_number': int(self.bank[k]) or None,
+                'current': round(float(self.current[k]), 2),
+            }
+            for k in indexes
+        ]
+
+    def serialize(self, limit=100):
+        return {
+            'summary': self.summary(),
+            'imbalanced_pdus': self.imbalanced_pdus(limit),
+            'loaded_pdus': self.loaded_pdus(limit),
+            'loaded_banks': self.loaded_banks(limit),
+            'near_limit_outlets': self.near_limit_outlets_list(limit),
+        }
+
+
+def analyze_fleet(pdus=None, near_limit=None, imbalance_threshold=None):
+    """
+    Analyze the phase balance and load of the PDUs in the `pdus` queryset (default: all)
+    and return a FleetAnalysis. `near_limit` is a fraction of the rated current and
+    `imbalance_threshold` a percentage; both default to the analysis settings.
+    """
+    if np is None:
+        raise ValueError("numpy is not installed")
+    settings = get_settings()
+    if pdus is None:
+        pdus = PDU.objects.all()
+    started = time.perf_counter()
+
+    pdu_rows = list(pdus.order_by('pk').values_list('pk', 'name', 'rated_current', 'phase_count'))
+    outlet_rows = list(Outlet.objects.filter(pdu__in=pdus.values('pk')).order_by().values_list(
+        'pk', 'pdu_id', 'outlet_number', 'phase', 'bank_number', 'last_measured_current'
+    ))
+    pdu_columns = tuple(zip(*pdu_rows)) if pdu_rows else ((), (), (), ())
+    outlet_ids, pdu_ids, numbers, phases, banks, currents = zip(*outlet_rows) if outlet_rows else ((),) * 6
+    # Phase choices are mapped to line indexes once per distinct value
+    codes, inverse = np.unique(np.asarray(phases, dtype=str), return_inverse=True)
+    phases = np.asarray([PHASE_INDEX.get(code, -1) for code in codes], dtype=np.int8)[inverse.reshape(-1)]
+    # NULLs become NaN, and unbanked outlets bank 0
+    banks = np.nan_to_num(np.asarray(banks, dtype=np.float64)).astype(np.int64)
+    currents = np.asarray(currents, dtype=np.float64)
+    loaded = time.perf_counter()
+
+    analysis = FleetAnalysis(
+        pdu_columns,
+        (outlet_ids, pdu_ids, numbers, phases, banks, currents),
+        near_limit=settings['near_limit'] if near_limit is None else near_limit,
+        imbalance_threshold=settings['imbalance_threshold'] if imbalance_threshold is None else imbalance_threshold,
+        bank_rated_current=_bank_rated_current(),
+    )
+    analysis.timings['load'] = loaded - started
+    return analysis
@@ -1,2 +1 @@
 # API module for netbox_pdu_manager
-# Phase 2 will implement REST API endpoints
@@ -0,0 +1,98 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from netbox.api.pagination import OptionalLimitOffsetPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(OptionalLimitOffsetPagination):
+    """
+    Opt-in keyset (cursor) pagination. Requests which include a `cursor` parameter
+    (empty for the first page) are ordered by the view's `keyset_ordering` and resume
+    after the last row of the previous page, so deep pages cost the same as the first.
+    Requests without it fall back to limit/offset pagination.
+    """
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = view.keyset_ordering
+        self.fields = [
+            queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name)
+            for name in (field.lstrip('-') for field in self.ordering)
+        ]
+        self.limit = self.get_limit(request) or self.default_limit
+
+        queryset = queryset.order_by(*self.ordering)
+        if cursor := self.decode_cursor(request.query_params[self.cursor_query_param]):
+            queryset = queryset.filter(self.get_keyset_filter(cursor))
+
+        page = list(queryset[:self.limit + 1])
+        self.next_cursor = None
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            self.next_cursor = self.encode_cursor([
+                getattr(page[-1], field.lstrip('-')) for field in self.ordering
+            ])
+        return page
+
+    def get_keyset_filter(self, cursor):
+        """
+        Return a filter selecting rows which sort after the cursor, i.e. the expansion
+        of (a, b, ...) > (x, y, ...) into index-friendly OR'd conditions.
+        """
+        query = Q()
+        for i, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{field.lstrip("-")}__{lookup}': cursor[i]})
+            for prior, value in zip(self.ordering[:i], cursor):
+                condition &= Q(**{prior.lstrip('-'): value})
+            query |= condition
+        return query
+
+    def encode_cursor(self, values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+        # Values of the wrong type would fail in the database instead
+        try:
+            values = [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (DjangoValidationError, TypeError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+        if None in values:
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+        return values
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.offset_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': None,
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
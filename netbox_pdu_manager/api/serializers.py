@@ -0,0 +1,190 @@
+from dcim.api.serializers import DeviceSerializer, RackSerializer, SiteSerializer
+from ipam.api.serializers import IPAddressSerializer
+from netbox.api.fields import ChoiceField
+from netbox.api.serializers import BaseModelSerializer, NetBoxModelSerializer
+from rest_framework import serializers
+
+from ..choices import OutletStatusChoices, PDUTypeChoices, PhaseChoices, PollReasonChoices, RedundancyChoices
+from ..models import PDU, DevicePowerDependency, Outlet, PDUPollState, RackPowerSummary, SitePowerSummary
+
+
+class PDUPollStateSerializer(serializers.ModelSerializer):
+    reason = ChoiceField(
+        choices=PollReasonChoices,
+        read_only=True
+    )
+
+    class Meta:
+        model = PDUPollState
+        fields = ('next_poll', 'interval', 'priority', 'reason', 'load', 'failures', 'last_poll', 'last_error')
+        read_only_fields = fields
+
+
+class PDUSerializer(NetBoxModelSerializer):
+    url = serializers.HyperlinkedIdentityField(
+        view_name='plugins-api:netbox_pdu_manager-api:pdu-detail'
+    )
+    pdu_type = ChoiceField(
+        choices=PDUTypeChoices,
+        required=False
+    )
+    site = SiteSerializer(
+        nested=True
+    )
+    rack = RackSerializer(
+        nested=True,
+        required=False,
+        allow_null=True
+    )
+    ip_address = IPAddressSerializer(
+        nested=True,
+        required=False,
+        allow_null=True
+    )
+    rated_power = serializers.IntegerField(
+        read_only=True
+    )
+    poll_state = PDUPollStateSerializer(
+        read_only=True
+    )
+
+    class Meta:
+        model = PDU
+        fields = (
+            'id', 'url', 'display', 'name', 'manufacturer', 'model', 'serial_number', 'pdu_type',
+            'ip_address', 'api_url', 'api_port', 'api_username', 'api_password_ref', 'api_version',
+            'site', 'rack', 'rack_position',
+            'rated_voltage', 'rated_current', 'rated_power', 'outlet_count', 'phase_count',
+            'firmware_version', 'last_sync', 'poll_state',
+            'outlets_total', 'outlets_on', 'outlets_off', 'outlets_unknown', 'outlets_error', 'outlets_connected',
+            'description', 'comments', 'tags', 'custom_fields', 'created', 'last_updated',
+        )
+        brief_fields = ('id', 'url', 'display', 'name', 'description')
+        extra_kwargs = {
+            'api_password_ref': {'write_only': True},
+        }
+
+
+class OutletSerializer(NetBoxModelSerializer):
+    url = serializers.HyperlinkedIdentityField(
+        view_name='plugins-api:netbox_pdu_manager-api:outlet-detail'
+    )
+    pdu = PDUSerializer(
+        nested=True
+    )
+    status = ChoiceField(
+        choices=OutletStatusChoices,
+        required=False
+    )
+    phase = ChoiceField(
+        choices=PhaseChoices,
+        allow_blank=True,
+        required=False
+    )
+    connected_device = DeviceSerializer(
+        nested=True,
+        required=False,
+        allow_null=True
+    )
+
+    class Meta:
+        model = Outlet
+        fields = (
+            'id', 'url', 'display', 'pdu', 'outlet_number', 'name', 'label', 'description', 'status',
+            'connected_device', 'connected_device_port',
+            'last_measured_voltage', 'last_measured_current', 'last_measured_power', 'last_update',
+            'bank_number', 'phase', 'tags', 'custom_fields', 'created', 'last_updated',
+        )
+        brief_fields = ('id', 'url', 'display', 'pdu', 'outlet_number', 'name', 'description')
+
+
+class RackPowerSummarySerializer(BaseModelSerializer):
+    # The rack or site is the primary key; there is no id attribute
+    id = serializers.IntegerField(
+        source='pk',
+        read_only=True
+    )
+    url = serializers.HyperlinkedIdentityField(
+        view_name='plugins-api:netbox_pdu_manager-api:rackpowersummary-detail'
+    )
+    rack = RackSerializer(
+        nested=True,
+        read_only=True
+    )
+    site = SiteSerializer(
+        nested=True,
+        read_only=True
+    )
+    headroom = serializers.FloatField(
+        read_only=True
+    )
+    utilization = serializers.FloatField(
+        read_only=True
+    )
+
+    class Meta:
+        model = RackPowerSummary
+        fields = (
+            'id', 'url', 'display', 'rack', 'site', 'rated_power', 'measured_power', 'headroom', 'utilization',
+            'pdu_count', 'outlet_count', 'phase_power', 'bank_power', 'last_updated',
+        )
+        read_only_fields = fields
+        brief_fields = ('id', 'url', 'display', 'rack', 'rated_power', 'measured_power', 'headroom')
+
+
+class SitePowerSummarySerializer(BaseModelSerializer):
+    # The rack or site is the primary key; there is no id attribute
+    id = serializers.IntegerField(
+        source='pk',
+        read_only=True
+    )
+    url = serializers.HyperlinkedIdentityField(
+        view_name='plugins-api:netbox_pdu_manager-api:sitepowersummary-detail'
+    )
+    site = SiteSerializer(
+        nested=True,
+        read_only=True
+    )
+    headroom = serializers.FloatField(
+        read_only=True
+    )
+    utilization = serializers.FloatField(
+        read_only=True
+    )
+
+    class Meta:
+        model = SitePowerSummary
+        fields = (
+            'id', 'url', 'display', 'site', 'rated_power', 'measured_power', 'headroom', 'utilization',
+            'pdu_count', 'outlet_count', 'phase_power', 'bank_power', 'last_updated',
+        )
+        read_only_fields = fields
+        brief_fields = ('id', 'url', 'display', 'site', 'rated_power', 'measured_power', 'headroom')
+
+
+class DevicePowerDependencySerializer(BaseModelSerializer):
+    # The device is the primary key; there is no id attribute
+    id = serializers.IntegerField(
+        source='pk',
+        read_only=True
+    )
+    url = serializers.HyperlinkedIdentityField(
+        view_name='plugins-api:netbox_pdu_manager-api:devicepowerdependency-detail'
+    )
+    device = DeviceSerializer(
+        nested=True,
+        read_only=True
+    )
+    redundancy = ChoiceField(
+        choices=RedundancyChoices,
+        read_only=True
+    )
+
+    class Meta:
+        model = DevicePowerDependency
+        fields = (
+            'id', 'url', 'display', 'device', 'redundancy', 'outlet_count', 'pdu_count', 'line_count',
+            'pdus', 'feeds', 'last_updated',
+        )
+        read_only_fields = fields
+        brief_fields = ('id', 'url', 'display', 'device', 'redundancy', 'pdu_count')
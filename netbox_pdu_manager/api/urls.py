@@ -1,6 +1,24 @@
 from django.urls import path
+from netbox.api.routers import NetBoxRouter
 
-# API endpoints will be implemented in Phase 2
-# For now, this is an empty URL configuration to satisfy NetBox requirements
+from . import views
 
-urlpatterns = []
+app_name = 'netbox_pdu_manager'
+
+router = NetBoxRouter()
+router.register('pdus', views.PDUViewSet)
+router.register('outlets', views.OutletViewSet)
+router.register('rack-power', views.RackPowerSummaryViewSet)
+router.register('site-power', views.SitePowerSummaryViewSet)
+router.register('power-dependencies', views.DevicePowerDependencyViewSet)
+
+urlpatterns = [
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
+    path('ingest/', views.MeasurementIngestView.as_view(), name='measurement-ingest'),
+    path('provision-outlets/', views.OutletProvisionView.as_view(), name='outlet-provision'),
+    path('discover/', views.PDUDiscoveryView.as_view(), name='pdu-discovery'),
+    path('failure-impact/', views.FailureImpactView.as_view(), name='failure-impact'),
+    path('energy/', views.EnergyReportView.as_view(), name='energy-report'),
+    path('power-analysis/', views.PowerAnalysisView.as_view(), name='power-analysis'),
+    path('switch-outlets/', views.OutletSwitchView.as_view(), name='outlet-switch'),
+] + router.urls
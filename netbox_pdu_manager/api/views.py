@@ -0,0 +1,420 @@
+import gzip
+import json
+
+from django.http import HttpResponse, StreamingHttpResponse
+from netbox.api.viewsets import NetBoxModelViewSet, NetBoxReadOnlyModelViewSet
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .. import analysis, dependencies, energy, filtersets, ingest, metrics
+from ..choices import PowerActionChoices
+from ..forms import EnergyReportForm, FailureScenarioForm
+from ..jobs import OutletSwitchJob, PDUDiscoveryJob
+from ..provisioning import get_drift, provision_outlets
+from ..models import PDU, DevicePowerDependency, Outlet, RackPowerSummary, SitePowerSummary
+from ..switching import SwitchResult, switch_outlets
+from .pagination import KeysetPagination
+from .serializers import (
+    DevicePowerDependencySerializer, OutletSerializer, PDUSerializer, RackPowerSummarySerializer,
+    SitePowerSummarySerializer,
+)
+
+
+class SparseFieldsMixin:
+    """
+    Load only what the requested serializer fields need. For GET requests with
+    ?fields= (or ?brief), the queryset is restricted with only() and joined with
+    select_related() for the relations those fields render; otherwise all
+    relations in `field_relations` are joined.
+    """
+    # Additional model fields required to render a serializer field
+    field_dependencies = {}
+    # Relations to join when a serializer field is rendered
+    field_relations = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.requested_fields if self.request.method == 'GET' else None
+        if not fields:
+            return queryset.select_related(*{
+                relation for relations in self.field_relations.values() for relation in relations
+            })
+
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        only = {'pk'}
+        relations = set()
+        for name in fields:
+            if name in model_fields:
+                only.add(name)
+            only.update(self.field_dependencies.get(name, ()))
+            relations.update(self.field_relations.get(name, ()))
+        only.update(relation.split('__')[0] for relation in relations)
+        # Keyset pagination reads its ordering fields from the last row of a page
+        only.update(
+            'pk' if name == 'pk' else queryset.model._meta.get_field(name).name
+            for name in (field.lstrip('-') for field in getattr(self, 'keyset_ordering', ()))
+        )
+
+        return queryset.select_related(*relations).only(*only)
+
+
+class PDUViewSet(SparseFieldsMixin, NetBoxModelViewSet):
+    queryset = PDU.objects.all()
+    serializer_class = PDUSerializer
+    filterset_class = filtersets.PDUFilterSet
+    pagination_class = KeysetPagination
+    keyset_ordering = ('pk',)
+    field_dependencies = {
+        'display': ('name',),
+        'rated_power': ('rated_voltage', 'rated_current'),
+        'custom_fields': ('custom_field_data',),
+    }
+    field_relations = {
+        'display': ('site',),
+        'site': ('site',),
+        'rack': ('rack',),
+        'ip_address': ('ip_address',),
+        'poll_state': ('poll_state',),
+    }
+
+
+class OutletViewSet(SparseFieldsMixin, NetBoxModelViewSet):
+    queryset = Outlet.objects.all()
+    serializer_class = OutletSerializer
+    filterset_class = filtersets.OutletFilterSet
+    pagination_class = KeysetPagination
+    keyset_ordering = ('pdu_id', 'outlet_number')
+    field_dependencies = {
+        'display': ('outlet_number', 'name'),
+        'custom_fields': ('custom_field_data',),
+    }
+    field_relations = {
+        'display': ('pdu',),
+        'pdu': ('pdu__site',),
+        'connected_device': ('connected_device',),
+    }
+
+
+class RackPowerSummaryViewSet(NetBoxReadOnlyModelViewSet):
+    queryset = RackPowerSummary.objects.select_related('rack', 'site')
+    serializer_class = RackPowerSummarySerializer
+    filterset_class = filtersets.RackPowerSummaryFilterSet
+
+
+class SitePowerSummaryViewSet(NetBoxReadOnlyModelViewSet):
+    queryset = SitePowerSummary.objects.select_related('site')
+    serializer_class = SitePowerSummarySerializer
+    filterset_class = filtersets.SitePowerSummaryFilterSet
+
+
+class DevicePowerDependencyViewSet(NetBoxReadOnlyModelViewSet):
+    queryset = DevicePowerDependency.objects.select_related('device')
+    serializer_class = DevicePowerDependencySerializer
+    filterset_class = filtersets.DevicePowerDependencyFilterSet
+
+
+class MeasurementIngestView(APIView):
+    """
+    Accept a stream of outlet readings from an external collector. The request body is
+    NDJSON (application/x-ndjson) or concatenated msgpack maps (application/msgpack), one
+    {pdu, outlet_number, voltage, current, power, ts} record each. `pdu` may be a PDU name
+    or ID; `ts` is an ISO 8601 string or a UNIX timestamp and defaults to the time of receipt.
+    Records for outlets the user may not change are rejected.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = []
+
+    def get_view_name(self):
+        return "Measurement Ingest"
+
+    def post(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.change_outlet'):
+            raise PermissionDenied("This user does not have permission to update outlets.")
+
+        if request.stream is None:
+            return Response({'detail': "Request body is empty."}, status=status.HTTP_400_BAD_REQUEST)
+        if request.content_type.split(';')[0].strip() == 'application/msgpack':
+            records = ingest.iter_msgpack(request.stream)
+        else:
+            records = ingest.iter_ndjson(request.stream)
+        # The key map is shared by all users; object permissions are applied per record
+        permitted = None
+        if not request.user.is_superuser:
+            permitted = set(Outlet.objects.restrict(request.user, 'change').values_list('pk', flat=True))
+        try:
+            result = ingest.ingest_records(records, permitted=permitted)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result.serialize())
+
+
+class OutletProvisionView(APIView):
+    """
+    GET lists the PDUs whose actual outlet count differs from outlet_count. POST creates
+    the missing outlets of the PDUs given as {"pdus": [id, ...]} (or of every PDU with
+    drift if omitted); set "template" to false to create outlets with their number only
+    and "dry_run" to true to only count them.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_view_name(self):
+        return "Outlet Provisioning"
+
+    def get(self, request):
+        pdus = get_drift(PDU.objects.restrict(request.user, 'view')).order_by('pk')
+        return Response([
+            {
+                'id': pdu.pk,
+                'name': pdu.name,
+                'outlet_count': pdu.outlet_count,
+                'outlets_total': pdu.outlets_total,
+                'drift': pdu.drift,
+            }
+            for pdu in pdus.only('pk', 'name', 'outlet_count', 'outlets_total')
+        ])
+
+    def post(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.add_outlet'):
+            raise PermissionDenied("This user does not have permission to create outlets.")
+
+        pdus = PDU.objects.restrict(request.user, 'change')
+        pdu_ids = request.data.get('pdus')
+        if pdu_ids is None:
+            pdus = get_drift(pdus)
+        elif isinstance(pdu_ids, list) and all(isinstance(pk, int) for pk in pdu_ids):
+            pdus = pdus.filter(pk__in=pdu_ids)
+        else:
+            return Response({'detail': "pdus must be a list of PDU IDs."}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = provision_outlets(
+            pdus,
+            use_template=bool(request.data.get('template', True)),
+            dry_run=bool(request.data.get('dry_run', False)),
+        )
+        return Response(result.serialize())
+
+
+class PDUDiscoveryView(APIView):
+    """
+    Queue a discovery job which reads the inventory of the PDUs given as
+    {"pdus": [id, ...]} (or of every PDU with an API URL if omitted) and reconciles the
+    stored PDUs and outlets with it. Set "dry_run" to true to only report the differences.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_view_name(self):
+        return "PDU Discovery"
+
+    def post(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.change_pdu'):
+            raise PermissionDenied("This user does not have permission to change PDUs.")
+
+        pdus = PDU.objects.restrict(request.user, 'change')
+        pdu_ids = request.data.get('pdus')
+        if pdu_ids is not None:
+            if not isinstance(pdu_ids, list) or not all(isinstance(pk, int) for pk in pdu_ids):
+                return Response({'detail': "pdus must be a list of PDU IDs."}, status=status.HTTP_400_BAD_REQUEST)
+            pdus = pdus.filter(pk__in=pdu_ids)
+
+        job = PDUDiscoveryJob.enqueue(
+            user=request.user,
+            pdus=list(pdus.exclude(api_url='').values_list('pk', flat=True)),
+            dry_run=bool(request.data.get('dry_run', False)),
+        )
+        return Response(
+            {'job': job.pk, 'url': request.build_absolute_uri(job.get_absolute_url())},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class OutletSwitchView(APIView):
+    """
+    Switch outlets on, off or power cycle them: {"outlets": [id, ...], "action": "on"|"off"|"cycle"}.
+    The response streams one NDJSON result per outlet as it completes, followed by a
+    {"summary": ...} line. With "background": true the operation is queued as a job instead.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_view_name(self):
+        return "Outlet Switching"
+
+    def post(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.change_outlet'):
+            raise PermissionDenied("This user does not have permission to switch outlets.")
+
+        action = request.data.get('action')
+        if action not in PowerActionChoices.values():
+            return Response(
+                {'detail': f"action must be one of {', '.join(PowerActionChoices.values())}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        outlet_ids = request.data.get('outlets')
+        if not isinstance(outlet_ids, list) or not all(isinstance(pk, int) for pk in outlet_ids):
+            return Response({'detail': "outlets must be a list of outlet IDs."}, status=status.HTTP_400_BAD_REQUEST)
+        outlets = Outlet.objects.restrict(request.user, 'change').filter(pk__in=outlet_ids)
+
+        if request.data.get('background'):
+            job = OutletSwitchJob.enqueue(
+                user=request.user,
+                outlets=list(outlets.values_list('pk', flat=True)),
+                action=action,
+            )
+            return Response(
+                {'job': job.pk, 'url': request.build_absolute_uri(job.get_absolute_url())},
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        def stream():
+            result = SwitchResult()
+            for item in switch_outlets(outlets, action):
+                result.add(item)
+                yield json.dumps(item) + '\n'
+            summary = result.serialize()
+            del summary['errors']
+            yield json.dumps({'summary': summary}) + '\n'
+
+        return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+
+class PowerAnalysisView(APIView):
+    """
+    Phase imbalance, phase and bank load and outlets near their limits over all PDUs
+    the user can view. Accepts ?site_id=, ?near_limit= (a fraction of the rated current),
+    ?imbalance_threshold= (a percentage) and ?limit= (entries per list, default 100).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_view_name(self):
+        return "Phase Balance Analysis"
+
+    def get(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.view_pdu'):
+            raise PermissionDenied("This user does not have permission to view PDUs.")
+
+        pdus = PDU.objects.restrict(request.user, 'view')
+        try:
+            if site_id := request.query_params.get('site_id'):
+                pdus = pdus.filter(site_id=int(site_id))
+            options = {
+                name: float(request.query_params[name])
+                for name in ('near_limit', 'imbalance_threshold') if name in request.query_params
+            }
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response(
+                {'detail': "site_id and limit must be integers, near_limit and imbalance_threshold numbers."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            report = analysis.analyze_fleet(pdus, **options)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(report.serialize(limit=limit))
+
+
+class MetricsView(APIView):
+    """
+    Outlet and PDU telemetry in the Prometheus text exposition format, served from the
+    pre-rendered snapshot (see metrics.py). The response is gzip compressed if the client
+    accepts it. Requires the global view_pdu permission; object permissions do not apply.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_view_name(self):
+        return "Metrics"
+
+    def perform_content_negotiation(self, request, force=False):
+        # The response is always text; scrapers may not accept any of the API renderers
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.view_pdu'):
+            raise PermissionDenied("This user does not have permission to view PDUs.")
+        if not metrics.get_settings()['enabled']:
+            return Response({'detail': "The metrics exporter is not enabled."}, status=status.HTTP_404_NOT_FOUND)
+
+        snapshot = metrics.get_snapshot()
+        if snapshot is None:
+            # The series are being rendered again in the background
+            response = HttpResponse(
+                "Metrics are being rebuilt.\n", content_type=metrics.CONTENT_TYPE,
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = metrics.get_settings()['min_interval']
+            return response
+        body = snapshot['body']
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(body, content_type=metrics.CONTENT_TYPE)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(body), content_type=metrics.CONTENT_TYPE)
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+class FailureImpactView(APIView):
+    """
+    The devices which lose all power ("down") or some of their feeds ("degraded") if the
+    PDUs selected by ?pdu_id=, ?rack_id= and/or ?site_id= (each repeatable) fail, or only
+    their ?phase= or ?bank_number=. Accepts ?limit= (devices per list, default 100).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_view_name(self):
+        return "Failure Impact"
+
+    def get(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.view_pdu'):
+            raise PermissionDenied("This user does not have permission to view PDUs.")
+
+        form = FailureScenarioForm(request.query_params)
+        if not form.is_valid():
+            return Response(form.errors.get_json_data(), status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({'detail': "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        impact = dependencies.analyze_failure(
+            form.get_pdus(PDU.objects.restrict(request.user, 'view')),
+            line=form.line,
+            bank_number=form.cleaned_data['bank_number'],
+            dependencies=DevicePowerDependency.objects.restrict(request.user, 'view'),
+        )
+        return Response(impact.serialize(limit=limit))
+
+
+class EnergyReportView(APIView):
+    """
+    The energy (kWh) drawn by the outlets in the billing period ?period= (YYYY-MM,
+    default the current one), per ?scope= (tenant, device, outlet, pdu, rack or site;
+    default tenant). Accepts ?limit= (rows, default 100).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_view_name(self):
+        return "Energy Report"
+
+    def get(self, request):
+        if not request.user.has_perm('netbox_pdu_manager.view_outlet'):
+            raise PermissionDenied("This user does not have permission to view outlets.")
+
+        form = EnergyReportForm(request.query_params)
+        if not form.is_valid():
+            return Response(form.errors.get_json_data(), status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({'detail': "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = energy.get_energy_report(
+            scope=form.cleaned_data['scope'],
+            period_start=form.cleaned_data['period'],
+            outlets=Outlet.objects.restrict(request.user, 'view'),
+        )
+        return Response(report.serialize(limit=limit))
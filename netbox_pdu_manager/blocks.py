@@ -0,0 +1,156 @@
+"""
+Columnar codec for blocks of outlet measurements
+
+A block holds the samples of one outlet for one window as four columns: timestamps
+(microsecond offsets from the window start) and voltage, current and power. Each
+column is encoded on its own and the result compressed with zlib:
+
+- Timestamps, and measurements which are exact decimals with up to MAX_DECIMALS
+  places (as PDUs report them), are scaled to integers and delta encoded, so a
+  steady poll interval or a stable reading becomes a run of identical small values.
+- Other measurements are stored as their IEEE 754 bits XORed with the previous
+  value, which zeroes the sign, exponent and leading mantissa bits of similar values.
+
+Both are byte-shuffled (all first bytes, then all second bytes, ...) before
+compression, and null measurements are kept in a bitmap. Decoding yields NumPy arrays.
+"""
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = (
+    'check_numpy',
+    'decode_block',
+    'encode_block',
+    'summarize',
+)
+
+VERSION = 1
+METRICS = ('voltage', 'current', 'power')
+MAX_DECIMALS = 4
+
+# Column encodings
+ENCODING_EMPTY = 0
+ENCODING_DECIMAL = 1
+ENCODING_FLOAT = 2
+HAS_NULLS = 0x80
+
+# version, samples
+HEADER = struct.Struct('<BI')
+# encoding, decimal places, payload length
+COLUMN = struct.Struct('<BBI')
+
+
+def check_numpy():
+    if np is None:
+        raise ValueError("numpy is not installed")
+
+
+def _shuffle(values):
+    return values.view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _unshuffle(data, count, dtype):
+    return np.frombuffer(data, dtype=np.uint8).reshape(8, count).T.copy().view(dtype).reshape(count)
+
+
+def _delta(values):
+    """Zigzag encoded differences of an int64 array"""
+    delta = values.copy()
+    delta[1:] -= values[:-1]
+    return ((delta << 1) ^ (delta >> 63)).view(np.uint64)
+
+
+def _undelta(values):
+    delta = ((values >> np.uint64(1)) ^ (np.uint64(0) - (values & np.uint64(1)))).view(np.int64)
+    return np.cumsum(delta)
+
+
+def _encode_values(values):
+    valid = ~np.isnan(values)
+    present = values if valid.all() else values[valid]
+    if not present.size:
+        return ENCODING_EMPTY, 0, b''
+    magnitude = np.abs(present).max()
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10.0 ** decimals
+        if magnitude * scale >= 2 ** 53:
+            continue
+        scaled = np.round(present * scale)
+        if (scaled / scale == present).all():
+            encoding, payload = ENCODING_DECIMAL, _shuffle(_delta(scaled.astype(np.int64)))
+            break
+    else:
+        bits = present.view(np.uint64)
+        encoding, decimals = ENCODING_FLOAT, 0
+        payload = _shuffle(bits ^ np.concatenate((np.zeros(1, dtype=np.uint64), bits[:-1])))
+    if present.size < values.size:
+        encoding |= HAS_NULLS
+        payload = np.packbits(valid).tobytes() + payload
+    return encoding, decimals, payload
+
+
+def _decode_values(encoding, decimals, payload, count):
+    values = np.full(count, np.nan)
+    if encoding == ENCODING_EMPTY:
+        return values
+    valid = None
+    if encoding & HAS_NULLS:
+        size = (count + 7) // 8
+        valid = np.unpackbits(np.frombuffer(payload[:size], dtype=np.uint8), count=count).astype(bool)
+        payload = payload[size:]
+    present = count if valid is None else int(valid.sum())
+    if encoding & ~HAS_NULLS == ENCODING_DECIMAL:
+        decoded = _undelta(_unshuffle(payload, present, np.uint64)) / 10.0 ** decimals
+    else:
+        bits = _unshuffle(payload, present, np.uint64)
+        decoded = np.bitwise_xor.accumulate(bits).view(np.float64)
+    if valid is None:
+        return decoded
+    values[valid] = decoded
+    return values
+
+
+def encode_block(offsets, voltage, current, power, level=6):
+    """
+    Encode the samples of a block. `offsets` are int64 microseconds from the window
+    start, sorted and unique; the measurements are float64 arrays with NaN for null.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    parts = [HEADER.pack(VERSION, len(offsets))]
+    payload = _shuffle(_delta(offsets))
+    parts.append(COLUMN.pack(ENCODING_DECIMAL, 0, len(payload)) + payload)
+    for values in (voltage, current, power):
+        encoding, decimals, payload = _encode_values(np.asarray(values, dtype=np.float64))
+        parts.append(COLUMN.pack(encoding, decimals, len(payload)) + payload)
+    return zlib.compress(b''.join(parts), level)
+
+
+def decode_block(data):
+    """Decode a block into an (offsets, voltage, current, power) tuple of NumPy arrays"""
+    data = zlib.decompress(data)
+    version, count = HEADER.unpack_from(data)
+    if version != VERSION:
+        raise ValueError(f"Unsupported block version {version}")
+    position = HEADER.size
+    columns = []
+    for _ in range(1 + len(METRICS)):
+        encoding, decimals, size = COLUMN.unpack_from(data, position)
+        position += COLUMN.size
+        columns.append((encoding, decimals, data[position:position + size]))
+        position += size
+    _, _, payload = columns[0]
+    offsets = _undelta(_unshuffle(payload, count, np.uint64))
+    return (offsets, *(_decode_values(*column, count) for column in columns[1:]))
+
+
+def summarize(values):
+    """Return the (min, max, avg, last) of a float64 array, ignoring NaN, as floats or None"""
+    valid = values[~np.isnan(values)]
+    if not valid.size:
+        return None, None, None, None
+    return float(valid.min()), float(valid.max()), float(valid.mean()), float(valid[-1])
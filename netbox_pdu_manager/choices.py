@@ -54,3 +54,97 @@ class PhaseChoices(ChoiceSet):
         (LINE_2, 'Line 2'),
         (LINE_3, 'Line 3'),
     ]
+
+
+# Phase choices mapped to the index of the line they are on
+PHASE_INDEX = {
+    PhaseChoices.PHASE_A: 0,
+    PhaseChoices.PHASE_B: 1,
+    PhaseChoices.PHASE_C: 2,
+    PhaseChoices.LINE_1: 0,
+    PhaseChoices.LINE_2: 1,
+    PhaseChoices.LINE_3: 2,
+}
+PHASE_LABELS = ('L1', 'L2', 'L3')
+
+
+class MeasurementTierChoices(ChoiceSet):
+    """Rollup tiers for outlet measurement history"""
+
+    TIER_1M = '1m'
+    TIER_15M = '15m'
+    TIER_1H = '1h'
+
+    CHOICES = [
+        (TIER_1M, '1 minute'),
+        (TIER_15M, '15 minutes'),
+        (TIER_1H, '1 hour'),
+    ]
+
+
+class EnergyScopeChoices(ChoiceSet):
+    """Entities which outlet energy is attributed to in energy reports"""
+
+    SCOPE_TENANT = 'tenant'
+    SCOPE_DEVICE = 'device'
+    SCOPE_OUTLET = 'outlet'
+    SCOPE_PDU = 'pdu'
+    SCOPE_RACK = 'rack'
+    SCOPE_SITE = 'site'
+
+    CHOICES = [
+        (SCOPE_TENANT, 'Tenant'),
+        (SCOPE_DEVICE, 'Device'),
+        (SCOPE_OUTLET, 'Outlet'),
+        (SCOPE_PDU, 'PDU'),
+        (SCOPE_RACK, 'Rack'),
+        (SCOPE_SITE, 'Site'),
+    ]
+
+
+class PollReasonChoices(ChoiceSet):
+    """Reasons recorded by the polling scheduler for a PDU's next poll time"""
+
+    REASON_INITIAL = 'initial'
+    REASON_NEAR_LIMIT = 'near_limit'
+    REASON_CHANGING = 'changing'
+    REASON_STEADY = 'steady'
+    REASON_STABLE = 'stable'
+    REASON_BACKOFF = 'backoff'
+
+    CHOICES = [
+        (REASON_INITIAL, 'Initial', 'gray'),
+        (REASON_NEAR_LIMIT, 'Near rated current', 'red'),
+        (REASON_CHANGING, 'Readings changing', 'orange'),
+        (REASON_STEADY, 'Steady', 'blue'),
+        (REASON_STABLE, 'Stable', 'green'),
+        (REASON_BACKOFF, 'Backing off', 'purple'),
+    ]
+
+
+class PowerActionChoices(ChoiceSet):
+    """Remote outlet power actions"""
+
+    ACTION_ON = 'on'
+    ACTION_OFF = 'off'
+    ACTION_CYCLE = 'cycle'
+
+    CHOICES = [
+        (ACTION_ON, 'Power on'),
+        (ACTION_OFF, 'Power off'),
+        (ACTION_CYCLE, 'Power cycle'),
+    ]
+
+
+class RedundancyChoices(ChoiceSet):
+    """How redundantly a device is fed by PDU outlets"""
+
+    REDUNDANCY_SINGLE_PDU = 'single_pdu'
+    REDUNDANCY_SINGLE_PHASE = 'single_phase'
+    REDUNDANCY_REDUNDANT = 'redundant'
+
+    CHOICES = [
+        (REDUNDANCY_SINGLE_PDU, 'Single PDU', 'red'),
+        (REDUNDANCY_SINGLE_PHASE, 'Single phase', 'orange'),
+        (REDUNDANCY_REDUNDANT, 'Redundant', 'green'),
+    ]
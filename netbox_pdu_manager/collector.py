@@ -0,0 +1,224 @@
+"""
+Background collection of outlet readings from Raritan PDUs
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.db import DatabaseError
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from .energy import get_settings as get_energy_settings, record_energy
+from .history import record_measurements
+from .models import PDU
+from .raritan import RaritanClient, create_session, resolve_password
+from .sessions import get_session_cache, get_settings as get_session_settings
+from .spool import replay_spool, spool_readings
+
+__all__ = (
+    'Poller',
+    'collect_readings',
+    'poll_pdus',
+    'run_sweep',
+    'store_readings',
+    'write_readings',
+)
+
+logger = logging.getLogger('netbox.netbox_pdu_manager.collector')
+
+
+def get_pollable_pdus(pdu_ids=None):
+    """Return all PDUs which have an API URL configured"""
+    queryset = PDU.objects.exclude(api_url='').order_by('pk').only(
+        'pk', 'name', 'api_url', 'api_username', 'api_password_ref'
+    )
+    if pdu_ids:
+        queryset = queryset.filter(pk__in=pdu_ids)
+    return list(queryset)
+
+
+async def _poll_pdu(session, semaphore, pdu, tokens=None, timings=None):
+    async with semaphore:
+        started = time.perf_counter()
+        client = RaritanClient(
+            session,
+            pdu.api_url,
+            username=pdu.api_username,
+            password=resolve_password(pdu.api_password_ref) if pdu.api_password_ref else '',
+            tokens=tokens,
+            key=pdu.pk,
+        )
+        try:
+            return await client.get_outlet_readings()
+        finally:
+            if timings is not None:
+                timings[pdu.pk] = time.perf_counter() - started
+
+
+async def poll_pdus(pdus, concurrency, timeout, verify_ssl=True, session=None, tokens=None, timings=None):
+    """
+    Poll the given PDUs concurrently over a shared connection pool (a new one unless
+    `session` is given), authenticating with the session tokens in `tokens` if given.
+    Returns a {pdu_pk: readings} map and a {pdu_pk: exception} map for failures. If
+    `timings` is a dict, the seconds spent polling each PDU are stored in it by PK.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    if session is None:
+        async with create_session(concurrency, timeout, verify_ssl=verify_ssl) as session:
+            return await poll_pdus(pdus, concurrency, timeout, session=session, tokens=tokens, timings=timings)
+    results = await asyncio.gather(
+        *(_poll_pdu(session, semaphore, pdu, tokens, timings) for pdu in pdus),
+        return_exceptions=True
+    )
+
+    readings, errors = {}, {}
+    for pdu, result in zip(pdus, results):
+        if isinstance(result, BaseException):
+            errors[pdu.pk] = result
+        else:
+            readings[pdu.pk] = result
+    return readings, errors
+
+
+def write_readings(readings, timestamp=None):
+    """
+    Apply polled readings through the telemetry write path, which skips unchanged
+    outlets and bypasses change logging. Returns the number of outlets updated.
+    """
+    return len(PDU.objects.update_telemetry(readings, timestamp=timestamp))
+
+
+def store_readings(readings, timestamp):
+    """
+    Write polled readings to the outlets and, if enabled, the measurement history and
+    the energy totals. Returns the updated Outlets. If the database cannot be written
+    and the spool is enabled, the readings are spooled for replay instead and nothing
+    is returned.
+    """
+    try:
+        changed = PDU.objects.update_telemetry(readings, timestamp=timestamp)
+        if get_plugin_config('netbox_pdu_manager', 'measurement_history'):
+            record_measurements(readings, timestamp)
+        if get_energy_settings()['enabled']:
+            record_energy(readings, timestamp)
+    except DatabaseError as e:
+        spooled = spool_readings(readings, timestamp)
+        if spooled is None:
+            raise
+        logger.warning(f"Storing readings failed, spooled {spooled} readings: {e}")
+        return []
+    return changed
+
+
+class Poller:
+    """
+    An event loop and connection pool kept open between polls, so that a long-running
+    process such as a pdu_collector worker reuses keep-alive (and therefore TLS)
+    connections to the PDUs across poll cycles instead of reconnecting every time.
+    """
+    def __init__(self, concurrency, timeout, verify_ssl=True, keepalive_timeout=60):
+        self.options = (concurrency, timeout, verify_ssl, keepalive_timeout)
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.session = self.loop.run_until_complete(self._open())
+        self._lock = threading.Lock()
+
+    async def _open(self):
+        concurrency, timeout, verify_ssl, keepalive_timeout = self.options
+        return create_session(concurrency, timeout, verify_ssl=verify_ssl, keepalive_timeout=keepalive_timeout)
+
+    def poll(self, pdus, tokens=None, timings=None):
+        concurrency, timeout, verify_ssl, _ = self.options
+        with self._lock:
+            return self.loop.run_until_complete(
+                poll_pdus(pdus, concurrency, timeout, session=self.session, tokens=tokens, timings=timings)
+            )
+
+    def close(self):
+        if self.pid != os.getpid():
+            # Inherited through fork(); the parent owns the connections
+            return
+        self.loop.run_until_complete(self.session.close())
+        self.loop.close()
+
+
+_poller = None
+
+
+def get_poller(concurrency, timeout, verify_ssl=True, keepalive_timeout=60):
+    """Return the process-wide Poller, replacing it if the options changed or the process forked"""
+    global _poller
+    options = (concurrency, timeout, verify_ssl, keepalive_timeout)
+    if _poller is None or _poller.options != options or _poller.pid != os.getpid():
+        if _poller is not None:
+            _poller.close()
+        _poller = Poller(*options)
+    return _poller
+
+
+@atexit.register
+def close_poller():
+    global _poller
+    if _poller is not None:
+        _poller.close()
+        _poller = None
+
+
+def get_session_stats():
+    """Return the session token cache statistics of this process, or None if disabled"""
+    tokens = get_session_cache()
+    return tokens.stats() if tokens is not None else None
+
+
+def collect_readings(pdus, concurrency=None, timeout=None, timings=None):
+    """
+    Poll the given PDUs from a synchronous context. Connections and session tokens
+    are kept for the next call. See poll_pdus() for `timings`.
+    """
+    poller = get_poller(
+        concurrency=concurrency or get_plugin_config('netbox_pdu_manager', 'sync_concurrency'),
+        timeout=timeout or get_plugin_config('netbox_pdu_manager', 'sync_timeout'),
+        verify_ssl=get_plugin_config('netbox_pdu_manager', 'sync_verify_ssl'),
+        keepalive_timeout=get_session_settings()['keepalive_timeout'],
+    )
+    tokens = get_session_cache()
+    if tokens is None:
+        return poller.poll(pdus, timings=timings)
+    tokens.load(pdu.pk for pdu in pdus)
+    try:
+        return poller.poll(pdus, tokens=tokens, timings=timings)
+    finally:
+        tokens.prune()
+        tokens.save()
+
+
+def run_sweep(pdu_ids=None, concurrency=None, timeout=None):
+    """
+    Poll every pollable PDU once and store the readings.
+    Returns a summary dict suitable for job data.
+    """
+    started = time.monotonic()
+    pdus = get_pollable_pdus(pdu_ids)
+    readings, errors = collect_readings(pdus, concurrency=concurrency, timeout=timeout)
+    polled = time.monotonic()
+    updated = len(store_readings(readings, timezone.now()))
+    # Readings spooled during an earlier outage
+    replayed = replay_spool()
+
+    for pk, error in errors.items():
+        logger.warning(f"Polling PDU {pk} failed: {error!r}")
+
+    return {
+        'pdus': len(pdus),
+        'succeeded': len(readings),
+        'failed': len(errors),
+        'outlets_updated': updated,
+        'replayed': replayed['records'] if replayed else 0,
+        'sessions': get_session_stats(),
+        'poll_seconds': round(polled - started, 3),
+        'write_seconds': round(time.monotonic() - polled, 3),
+    }
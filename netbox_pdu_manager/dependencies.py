@@ -0,0 +1,84 @@
+"""
+Failure impact analysis over the device power dependency index
+
+A failure scenario is a set of PDUs, optionally narrowed to one line (phase) or one
+bank of those PDUs. The devices fed by any of the PDUs are found with one indexed
+query on DevicePowerDependency, and each device's feeds are then checked in a single
+pass: a device is down if all of its feeds fail, and degraded if only some do.
+"""
+from .choices import PHASE_LABELS
+from .models import DevicePowerDependency
+
+__all__ = (
+    'FailureImpact',
+    'analyze_failure',
+)
+
+
+class FailureImpact:
+    """Result of analyze_failure()"""
+
+    def __init__(self, pdus, line=None, bank_number=None):
+        self.pdus = pdus
+        self.line = line
+        self.bank_number = bank_number
+        self.devices = 0
+        self.down = []
+        self.degraded = []
+
+    def fails(self, pdu_id, line, bank_number):
+        """Return whether a feed (the outlet of a PDU on a line and bank) fails in this scenario"""
+        return (
+            pdu_id in self.pdus
+            and (self.line is None or line == self.line)
+            and (self.bank_number is None or bank_number == self.bank_number)
+        )
+
+    def add(self, device_id, name, feeds):
+        self.devices += 1
+        failed = [feed for feed in feeds if self.fails(*feed[1:])]
+        if not failed:
+            return
+        item = {
+            'device': device_id,
+            'name': name,
+            'feeds': len(feeds),
+            'failed_feeds': len(failed),
+            'failed_outlets': [outlet_id for outlet_id, *_ in failed],
+            'remaining_pdus': sorted({pdu_id for _, pdu_id, *_ in feeds} - {pdu_id for _, pdu_id, *_ in failed}),
+        }
+        (self.down if len(failed) == len(feeds) else self.degraded).append(item)
+
+    def summary(self):
+        return {
+            'pdus': len(self.pdus),
+            'line': PHASE_LABELS[self.line] if self.line is not None else None,
+            'bank_number': self.bank_number,
+            'devices': self.devices,
+            'down': len(self.down),
+            'degraded': len(self.degraded),
+        }
+
+    def serialize(self, limit=100):
+        return {
+            'summary': self.summary(),
+            'down': self.down[:limit],
+            'degraded': self.degraded[:limit],
+        }
+
+
+def analyze_failure(pdus, line=None, bank_number=None, dependencies=None):
+    """
+    Return the FailureImpact of the failure of the PDUs in the `pdus` queryset, or only
+    of their line `line` (0-2 for L1-L3) or bank `bank_number` if given. `dependencies`
+    restricts the devices considered (default: all).
+    """
+    impact = FailureImpact(set(pdus.values_list('pk', flat=True)), line, bank_number)
+    if dependencies is None:
+        dependencies = DevicePowerDependency.objects.all()
+    rows = dependencies.filter(pdus__overlap=list(impact.pdus)).order_by('device__name', 'device').values_list(
+        'device_id', 'device__name', 'feeds'
+    )
+    for device_id, name, feeds in rows.iterator(chunk_size=2000):
+        impact.add(device_id, name, feeds)
+    return impact
@@ -0,0 +1,248 @@
+"""
+Inventory discovery and reconciliation of PDUs
+
+The nameplate, firmware and outlet layout of every PDU with an API URL are read
+concurrently over one bounded connection pool, in two round trips per PDU. The live
+inventory is then compared with the stored PDU and Outlet rows, one batch of PDUs at
+a time with one query for their outlets, and unless it is a dry run the differences
+are written back with bulk updates and inserts.
+"""
+import asyncio
+import time
+
+from django.db import transaction
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from .models import PDU, Outlet, bulk_update_rows
+from .provisioning import build_outlets, get_outlet_template
+from .raritan import RaritanClient, create_session, resolve_password
+from .sessions import get_session_cache
+
+__all__ = (
+    'DiscoveryResult',
+    'discover_pdus',
+    'reconcile',
+    'run_discovery',
+)
+
+# Fields of the PDU and Outlet models taken from the live inventory
+PDU_FIELDS = ('serial_number', 'model', 'firmware_version', 'api_version', 'outlet_count', 'phase_count')
+OUTLET_FIELDS = ('name', 'label', 'phase')
+
+
+class DiscoveryResult:
+    """Reconciliation report of a discovery run"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.pdus = 0
+        self.discovered = 0
+        self.failed = 0
+        self.pdus_changed = 0
+        self.outlets_updated = 0
+        self.outlets_created = 0
+        self.outlets_extra = 0
+        self.changes = []
+        self.errors = []
+        self.timings = {}
+
+    def add(self, change):
+        self.pdus_changed += 1
+        self.outlets_updated += len(change['outlets']['updated'])
+        self.outlets_created += len(change['outlets']['created'])
+        self.outlets_extra += len(change['outlets']['extra'])
+        self.changes.append(change)
+
+    def serialize(self, limit=None):
+        return {
+            'dry_run': self.dry_run,
+            'pdus': self.pdus,
+            'discovered': self.discovered,
+            'failed': self.failed,
+            'pdus_changed': self.pdus_changed,
+            'outlets_updated': self.outlets_updated,
+            'outlets_created': self.outlets_created,
+            'outlets_extra': self.outlets_extra,
+            'timings': {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            'changes': self.changes[:limit],
+            'errors': self.errors[:limit],
+        }
+
+
+async def _discover_pdu(session, semaphore, pdu, tokens):
+    async with semaphore:
+        client = RaritanClient(
+            session,
+            pdu.api_url,
+            username=pdu.api_username,
+            password=resolve_password(pdu.api_password_ref) if pdu.api_password_ref else '',
+            tokens=tokens,
+            key=pdu.pk,
+        )
+        return await client.get_inventory()
+
+
+async def discover_pdus(pdus, concurrency, timeout, verify_ssl=True, tokens=None):
+    """
+    Read the inventory of the given PDUs concurrently, at most `concurrency` at a time.
+    Returns a {pdu_pk: inventory} map and a {pdu_pk: exception} map for failures.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    async with create_session(concurrency, timeout, verify_ssl=verify_ssl) as session:
+        results = await asyncio.gather(
+            *(_discover_pdu(session, semaphore, pdu, tokens) for pdu in pdus),
+            return_exceptions=True
+        )
+
+    inventories, errors = {}, {}
+    for pdu, result in zip(pdus, results):
+        if isinstance(result, BaseException):
+            errors[pdu.pk] = result
+        else:
+            inventories[pdu.pk] = result
+    return inventories, errors
+
+
+def _changed(old, new):
+    """Return whether a live value differs from the stored one; blank live values are ignored"""
+    return new not in ('', None) and new != old
+
+
+def reconcile(pdu, outlets, inventory):
+    """
+    Compare a PDU and its stored Outlets (a {number: Outlet} map) with its live
+    inventory, and apply the differences to the instances. Returns the change report
+    and the unsaved Outlets to create, or (None, []) if nothing differs.
+    """
+    fields = {}
+    for field in PDU_FIELDS:
+        if _changed(getattr(pdu, field), inventory[field]):
+            fields[field] = [getattr(pdu, field), inventory[field]]
+            setattr(pdu, field, inventory[field])
+
+    updated, created = [], []
+    live = {item['outlet_number']: item for item in inventory['outlets']}
+    for number, item in live.items():
+        outlet = outlets.get(number)
+        if outlet is None:
+            continue
+        changes = {}
+        for field in OUTLET_FIELDS:
+            if _changed(getattr(outlet, field), item[field]):
+                changes[field] = [getattr(outlet, field), item[field]]
+                setattr(outlet, field, item[field])
+        if changes:
+            updated.append({'outlet': outlet.pk, 'outlet_number': number, **changes})
+
+    # Missing outlets are laid out like provisioned ones, then named like the live outlets
+    missing = set(live) - set(outlets)
+    if missing:
+        created = build_outlets(pdu, set(range(1, pdu.outlet_count + 1)) - missing, get_outlet_template(pdu.pdu_type))
+        for outlet in created:
+            item = live[outlet.outlet_number]
+            for field in OUTLET_FIELDS:
+                if item[field]:
+                    setattr(outlet, field, item[field])
+            outlet.search_text = outlet.get_search_text(pdu_name=pdu.name)
+    extra = sorted(number for number in outlets if number not in live)
+
+    if not (fields or updated or created or extra):
+        return None, []
+    return {
+        'pdu': pdu.pk,
+        'name': pdu.name,
+        'fields': fields,
+        'outlets': {
+            'updated': updated,
+            'created': sorted(missing),
+            'extra': extra,
+        },
+    }, created
+
+
+def _apply(batch, inventories, result):
+    pdus = {pdu.pk: pdu for pdu in batch if pdu.pk in inventories}
+    outlets = {}
+    for outlet in Outlet.objects.filter(pdu_id__in=pdus.keys()).order_by().only(
+        'pk', 'pdu_id', 'outlet_number', 'description', *OUTLET_FIELDS
+    ):
+        outlets.setdefault(outlet.pdu_id, {})[outlet.outlet_number] = outlet
+
+    now = timezone.now()
+    changed_pdus, changed_outlets, created = [], [], []
+    for pk, pdu in pdus.items():
+        change, new_outlets = reconcile(pdu, outlets.get(pk, {}), inventories[pk])
+        if change is None:
+            continue
+        result.add(change)
+        if change['fields']:
+            pdu.search_text = pdu.get_search_text()
+            pdu.last_updated = now
+            changed_pdus.append(pdu)
+        pdu_outlets = outlets.get(pk, {})
+        for item in change['outlets']['updated']:
+            outlet = pdu_outlets[item['outlet_number']]
+            outlet.search_text = outlet.get_search_text(pdu_name=pdu.name)
+            outlet.last_updated = now
+            changed_outlets.append(outlet)
+        created.extend(new_outlets)
+
+    if result.dry_run or not (changed_pdus or changed_outlets or created):
+        return
+    with transaction.atomic():
+        bulk_update_rows(changed_pdus, (*PDU_FIELDS, 'search_text', 'last_updated'))
+        bulk_update_rows(changed_outlets, (*OUTLET_FIELDS, 'search_text', 'last_updated'))
+        # Outlets created concurrently for the same PDU are skipped
+        Outlet.objects.bulk_create(created, batch_size=1000, ignore_conflicts=True)
+        affected = PDU.objects.filter(
+            pk__in={pdu.pk for pdu in changed_pdus} | {outlet.pdu_id for outlet in (*changed_outlets, *created)}
+        )
+        affected.refresh_outlet_counters()
+        affected.refresh_power_summaries()
+        affected.refresh_power_dependencies()
+
+
+def run_discovery(pdu_ids=None, dry_run=False, concurrency=None, timeout=None, batch_size=500):
+    """
+    Discover the inventory of every PDU with an API URL (or of the given PDUs) and
+    reconcile the stored PDUs and outlets with it. With `dry_run`, only the report is
+    produced. Like other bulk writes, this creates no change records and fires no
+    signals. Returns a DiscoveryResult.
+    """
+    result = DiscoveryResult(dry_run=dry_run)
+    started = time.monotonic()
+    pdus = PDU.objects.exclude(api_url='').order_by('pk').only(
+        'pk', 'name', 'pdu_type', 'api_url', 'api_username', 'api_password_ref',
+        'manufacturer', 'description', *PDU_FIELDS
+    )
+    if pdu_ids is not None:
+        pdus = pdus.filter(pk__in=pdu_ids)
+    pdus = list(pdus)
+    result.pdus = len(pdus)
+
+    tokens = get_session_cache()
+    if tokens is not None:
+        tokens.load(pdu.pk for pdu in pdus)
+    try:
+        inventories, errors = asyncio.run(discover_pdus(
+            pdus,
+            concurrency=concurrency or get_plugin_config('netbox_pdu_manager', 'sync_concurrency'),
+            timeout=timeout or get_plugin_config('netbox_pdu_manager', 'sync_timeout'),
+            verify_ssl=get_plugin_config('netbox_pdu_manager', 'sync_verify_ssl'),
+            tokens=tokens,
+        ))
+    finally:
+        if tokens is not None:
+            tokens.prune()
+            tokens.save()
+    result.discovered = len(inventories)
+    result.failed = len(errors)
+    result.errors = [{'pdu': pk, 'error': str(e) or repr(e)} for pk, e in errors.items()]
+    discovered = time.monotonic()
+    result.timings['discover'] = discovered - started
+
+    for i in range(0, len(pdus), batch_size):
+        _apply(pdus[i:i + batch_size], inventories, result)
+    result.timings['reconcile'] = time.monotonic() - discovered
+    return result
@@ -0,0 +1,267 @@
+"""
+Energy (kWh) accounting of outlets, attributed to devices, tenants, PDUs, racks and sites
+
+Every stored power reading advances a running total per outlet (OutletEnergy) by the
+energy drawn since the previous reading: the mean of the two readings times the time
+between them. A batch of readings is applied with one set-based upsert, so the cost
+per reading is constant and no history is read. Intervals longer than max_gap, or
+with a missing power reading, are not metered; readings which are not newer than the
+last one applied (e.g. replayed after a newer poll) are skipped.
+
+Billing periods are calendar months in the configured time zone. When a period ends,
+each outlet's total is closed into an OutletEnergyPeriod row, together with the PDU,
+device, rack, site and tenant it is attributed to at that time, and its running total
+restarts at zero. Reports add up those rows, or the running totals of the open period.
+"""
+from datetime import datetime
+
+from dcim.models import Device
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .choices import EnergyScopeChoices
+from .models import PDU, Outlet, OutletEnergy, OutletEnergyPeriod
+
+__all__ = (
+    'EnergyReport',
+    'accumulate_energy',
+    'close_periods',
+    'get_energy_report',
+    'get_period_start',
+    'record_energy',
+)
+
+ENERGY_TABLE = OutletEnergy._meta.db_table
+PERIOD_TABLE = OutletEnergyPeriod._meta.db_table
+ENERGY_STAGING_TABLE = 'netbox_pdu_manager_energy_staging'
+
+# Report scopes mapped to the lookups of the entity on closed periods and on open totals
+SCOPES = {
+    EnergyScopeChoices.SCOPE_TENANT: ('tenant', 'outlet__connected_device__tenant'),
+    EnergyScopeChoices.SCOPE_DEVICE: ('device', 'outlet__connected_device'),
+    EnergyScopeChoices.SCOPE_OUTLET: ('outlet', 'outlet'),
+    EnergyScopeChoices.SCOPE_PDU: ('pdu', 'outlet__pdu'),
+    EnergyScopeChoices.SCOPE_RACK: ('rack', 'outlet__pdu__rack'),
+    EnergyScopeChoices.SCOPE_SITE: ('site', 'outlet__pdu__site'),
+}
+
+
+def get_settings():
+    return {
+        **config.default_settings['energy'],
+        **get_plugin_config('netbox_pdu_manager', 'energy'),
+    }
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def get_period_start(timestamp):
+    """Return the start of the billing period (month) containing `timestamp`"""
+    return timezone.localtime(timestamp).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_period(value):
+    """Return the start of the billing period given as 'YYYY-MM', or raise ValueError"""
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m'))
+
+
+#
+# Accumulation
+#
+
+def record_energy(readings, timestamp):
+    """
+    Advance the running totals with polled readings ({pdu_id: [reading, ...]}).
+    Returns the number of outlets updated.
+    """
+    return accumulate_energy([
+        (pdu_id, reading['outlet_number'], timestamp, reading.get('power'))
+        for pdu_id, pdu_readings in readings.items()
+        for reading in pdu_readings
+    ])
+
+
+def accumulate_energy(samples):
+    """
+    Advance the running totals with power readings given as (pdu_id, outlet_number,
+    timestamp, power) tuples, in any order. Periods which ended before a reading are
+    closed first. Returns the number of outlets updated.
+    """
+    max_gap = get_settings()['max_gap']
+    # Readings of one poll share its timestamp, so there are few distinct timestamps
+    by_timestamp = {}
+    for sample in samples:
+        by_timestamp.setdefault(sample[2], []).append(sample)
+    periods = {}
+    for timestamp, batch in by_timestamp.items():
+        periods.setdefault(get_period_start(timestamp), []).extend(batch)
+
+    updated = 0
+    for period_start, batch in sorted(periods.items()):
+        with transaction.atomic():
+            if OutletEnergy.objects.filter(period_start__lt=period_start).exists():
+                close_periods(period_start)
+            updated += _accumulate(batch, period_start, max_gap)
+    return updated
+
+
+def _accumulate(samples, period_start, max_gap):
+    """
+    COPY readings into a staging table and apply them with one upsert. Each outlet's
+    readings newer than its last one are integrated in timestamp order, starting from
+    the stored last reading.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {ENERGY_STAGING_TABLE} ("
+            f"pdu_id bigint, outlet_number integer, ts timestamptz, power double precision"
+            f") ON COMMIT DELETE ROWS"
+        )
+        cursor.execute(f"TRUNCATE {ENERGY_STAGING_TABLE}")
+        with cursor.copy(f"COPY {ENERGY_STAGING_TABLE} (pdu_id, outlet_number, ts, power) FROM STDIN") as copy:
+            for sample in samples:
+                copy.write_row(sample)
+        # Temporary tables are not analyzed automatically
+        cursor.execute(f"ANALYZE {ENERGY_STAGING_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {_qn(ENERGY_TABLE)} AS e "
+            f"(outlet_id, period_start, energy, metered, last_power, last_reading) "
+            f"SELECT outlet_id, %s, "
+            f"coalesce(sum((power + prev_power) / 2 * seconds) FILTER (WHERE metered), 0) / 3600, "
+            f"coalesce(sum(seconds) FILTER (WHERE metered), 0), "
+            f"(array_agg(power ORDER BY ts DESC))[1], max(ts) "
+            f"FROM ("
+            f"SELECT outlet_id, ts, power, prev_power, seconds, "
+            f"prev_power IS NOT NULL AND power IS NOT NULL AND seconds <= %s AS metered "
+            f"FROM ("
+            f"SELECT o.id AS outlet_id, s.ts, s.power, "
+            f"lag(s.power, 1, c.last_power) OVER w AS prev_power, "
+            f"extract(epoch FROM s.ts - lag(s.ts, 1, c.last_reading) OVER w)::double precision AS seconds "
+            f"FROM (SELECT DISTINCT ON (pdu_id, outlet_number, ts) * FROM {ENERGY_STAGING_TABLE}) s "
+            f"JOIN {_qn(Outlet._meta.db_table)} o ON o.pdu_id = s.pdu_id AND o.outlet_number = s.outlet_number "
+            f"LEFT JOIN {_qn(ENERGY_TABLE)} c ON c.outlet_id = o.id "
+            f"WHERE c.last_reading IS NULL OR s.ts >= c.last_reading "
+            f"WINDOW w AS (PARTITION BY o.id ORDER BY s.ts)"
+            f") AS r"
+            f") AS m GROUP BY outlet_id "
+            f"ON CONFLICT (outlet_id) DO UPDATE SET "
+            f"energy = e.energy + excluded.energy, metered = e.metered + excluded.metered, "
+            f"last_power = excluded.last_power, last_reading = excluded.last_reading "
+            f"WHERE e.last_reading IS NULL OR e.last_reading <= excluded.last_reading",
+            [period_start, max_gap]
+        )
+        return cursor.rowcount
+
+
+def close_periods(before=None):
+    """
+    Close the open periods of all outlets which started before `before` (default: the
+    current period). Each outlet's total, metered up to the end of its period if its
+    last reading is recent enough, is stored as an OutletEnergyPeriod with its current
+    attribution, and its running total restarts at the end of the period. Returns the
+    number of outlet periods closed.
+    """
+    before = before or get_period_start(timezone.now())
+    max_gap = get_settings()['max_gap']
+    tz = timezone.get_current_timezone_name()
+    period_end = f"((date_trunc('month', e.period_start AT TIME ZONE %s) + interval '1 month') AT TIME ZONE %s)"
+    # The last power reading is held until the end of the period
+    held = (
+        f"CASE WHEN e.last_power IS NOT NULL AND e.last_reading < {period_end} "
+        f"AND e.last_reading >= {period_end} - make_interval(secs => %s) "
+        f"THEN extract(epoch FROM {period_end} - e.last_reading)::double precision ELSE 0 END"
+    )
+    held_params = [tz, tz, tz, tz, max_gap, tz, tz]
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Concurrent closes would add the same totals twice, and readings applied
+        # meanwhile would be lost
+        cursor.execute(f"LOCK TABLE {_qn(ENERGY_TABLE)} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(
+            f"INSERT INTO {_qn(PERIOD_TABLE)} AS p "
+            f"(outlet_id, period_start, energy, metered, pdu_id, device_id, rack_id, site_id, tenant_id) "
+            f"SELECT e.outlet_id, e.period_start, "
+            f"e.energy + coalesce(e.last_power * held, 0) / 3600, e.metered + held, "
+            f"o.pdu_id, o.connected_device_id, u.rack_id, u.site_id, d.tenant_id "
+            f"FROM (SELECT *, {held} AS held FROM {_qn(ENERGY_TABLE)} e WHERE e.period_start < %s) e "
+            f"JOIN {_qn(Outlet._meta.db_table)} o ON o.id = e.outlet_id "
+            f"JOIN {_qn(PDU._meta.db_table)} u ON u.id = o.pdu_id "
+            f"LEFT JOIN {_qn(Device._meta.db_table)} d ON d.id = o.connected_device_id "
+            f"ON CONFLICT (period_start, outlet_id) DO UPDATE SET "
+            f"energy = p.energy + excluded.energy, metered = p.metered + excluded.metered",
+            [*held_params, before]
+        )
+        closed = cursor.rowcount
+        cursor.execute(
+            f"UPDATE {_qn(ENERGY_TABLE)} e SET period_start = %s, energy = 0, metered = 0, "
+            f"last_reading = CASE WHEN {held} > 0 THEN {period_end} ELSE e.last_reading END "
+            f"WHERE e.period_start < %s",
+            [before, *held_params, tz, tz, before]
+        )
+    return closed
+
+
+#
+# Reports
+#
+
+class EnergyReport:
+    """Energy per entity of one scope for a billing period"""
+
+    def __init__(self, scope, period_start, closed):
+        self.scope = scope
+        self.period_start = period_start
+        self.closed = closed
+        self.rows = []
+
+    def serialize(self, limit=None):
+        return {
+            'scope': self.scope,
+            'period': f'{self.period_start:%Y-%m}',
+            'period_start': self.period_start.isoformat(),
+            'closed': self.closed,
+            'energy': round(sum(row['energy'] for row in self.rows), 3),
+            'outlets': sum(row['outlets'] for row in self.rows),
+            'rows': self.rows[:limit],
+        }
+
+
+def get_energy_report(scope=EnergyScopeChoices.SCOPE_TENANT, period_start=None, outlets=None):
+    """
+    Return the EnergyReport of `scope` for the billing period starting at `period_start`
+    (default: the open period). Closed periods are read from the stored period totals
+    with the attribution at closing; the open period from the running totals with the
+    current attribution. `outlets` restricts the outlets counted (default: all).
+    Energy is in kWh, ordered from the largest; outlets without an entity of the scope
+    (e.g. without a connected device) are reported with an ID of None.
+    """
+    current = get_period_start(timezone.now())
+    period_start = period_start or current
+    closed_field, open_field = SCOPES[scope]
+    if period_start < current:
+        queryset = OutletEnergyPeriod.objects.filter(period_start=period_start)
+        field = closed_field
+    else:
+        queryset = OutletEnergy.objects.filter(period_start=period_start)
+        field = open_field
+    if outlets is not None:
+        queryset = queryset.filter(outlet__in=outlets)
+    name = 'outlet__name' if scope == EnergyScopeChoices.SCOPE_OUTLET else f'{field}__name'
+
+    report = EnergyReport(scope, period_start, closed=period_start < current)
+    rows = queryset.order_by().values(field, name).annotate(
+        total=Sum('energy'), outlet_count=Count('pk'), seconds=Sum('metered')
+    ).order_by('-total')
+    for row in rows:
+        report.rows.append({
+            'id': row[field],
+            'name': row[name],
+            'energy': round(row['total'] / 1000, 3),
+            'outlets': row['outlet_count'],
+            'metered_hours': round(row['seconds'] / 3600, 1),
+        })
+    return report
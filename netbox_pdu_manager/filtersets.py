@@ -1,9 +1,9 @@
 import django_filters
-from django.db.models import Q
 from dcim.models import Site, Rack, Device
-from netbox.filtersets import NetBoxModelFilterSet
+from netbox.filtersets import BaseFilterSet, NetBoxModelFilterSet
 
-from .models import PDU, Outlet
+from .choices import RedundancyChoices
+from .models import PDU, DevicePowerDependency, Outlet, RackPowerSummary, SitePowerSummary, get_stale_cutoff
 
 
 class PDUFilterSet(NetBoxModelFilterSet):
@@ -31,6 +31,10 @@ class PDUFilterSet(NetBoxModelFilterSet):
     pdu_type = django_filters.MultipleChoiceFilter(
         choices=lambda: PDU._meta.get_field('pdu_type').choices
     )
+    stale = django_filters.BooleanFilter(
+        method='filter_stale',
+        label='Stale (not synced for two sync intervals)'
+    )
 
     class Meta:
         model = PDU
@@ -40,26 +44,33 @@ class PDUFilterSet(NetBoxModelFilterSet):
         """Quick search functionality"""
         if not value.strip():
             return queryset
-        return queryset.filter(
-            Q(name__icontains=value) |
-            Q(manufacturer__icontains=value) |
-            Q(model__icontains=value) |
-            Q(serial_number__icontains=value) |
-            Q(description__icontains=value)
-        )
+        # Matches name, manufacturer, model, serial number and description via the trigram index
+        return queryset.filter(search_text__contains=value.lower())
+
+    def filter_stale(self, queryset, name, value):
+        """Filter by whether the PDU has been synced within two sync intervals"""
+        if value:
+            return queryset.stale()
+        return queryset.filter(last_sync__gte=get_stale_cutoff())
 
 
 class OutletFilterSet(NetBoxModelFilterSet):
     """FilterSet for Outlet model"""
+    # These filters never traverse a multi-valued relation, so DISTINCT is not needed;
+    # omitting it lets the (pdu, status), (status, pdu) and partial connected_device
+    # indexes serve the query directly.
     pdu_id = django_filters.ModelMultipleChoiceFilter(
         queryset=PDU.objects.all(),
+        distinct=False,
         label='PDU (ID)',
     )
     status = django_filters.MultipleChoiceFilter(
-        choices=lambda: Outlet._meta.get_field('status').choices
+        choices=lambda: Outlet._meta.get_field('status').choices,
+        distinct=False
     )
     connected_device_id = django_filters.ModelMultipleChoiceFilter(
         queryset=Device.objects.all(),
+        distinct=False,
         label='Connected Device (ID)',
     )
     has_connected_device = django_filters.BooleanFilter(
@@ -75,15 +86,108 @@ class OutletFilterSet(NetBoxModelFilterSet):
         """Quick search functionality"""
         if not value.strip():
             return queryset
-        return queryset.filter(
-            Q(name__icontains=value) |
-            Q(label__icontains=value) |
-            Q(description__icontains=value) |
-            Q(pdu__name__icontains=value)
-        )
+        # Matches name, label, description and PDU name via the trigram index
+        return queryset.filter(search_text__contains=value.lower())
 
     def filter_has_connected_device(self, queryset, name, value):
-        """Filter by connected device existence"""
+        """Filter by connected device existence (IS NOT NULL matches the partial index predicate)"""
         if value:
             return queryset.filter(connected_device__isnull=False)
         return queryset.filter(connected_device__isnull=True)
+
+
+class RackPowerSummaryFilterSet(BaseFilterSet):
+    """FilterSet for RackPowerSummary model"""
+    q = django_filters.CharFilter(
+        method='search',
+        label='Search'
+    )
+    rack_id = django_filters.ModelMultipleChoiceFilter(
+        field_name='rack',
+        queryset=Rack.objects.all(),
+        label='Rack (ID)',
+    )
+    site_id = django_filters.ModelMultipleChoiceFilter(
+        queryset=Site.objects.all(),
+        label='Site (ID)',
+    )
+    site = django_filters.ModelMultipleChoiceFilter(
+        field_name='site__slug',
+        queryset=Site.objects.all(),
+        to_field_name='slug',
+        label='Site (slug)',
+    )
+
+    class Meta:
+        model = RackPowerSummary
+        fields = ('rated_power', 'measured_power', 'pdu_count', 'outlet_count')
+
+    def search(self, queryset, name, value):
+        """Quick search functionality"""
+        if not value.strip():
+            return queryset
+        return queryset.filter(rack__name__icontains=value.strip())
+
+
+class SitePowerSummaryFilterSet(BaseFilterSet):
+    """FilterSet for SitePowerSummary model"""
+    q = django_filters.CharFilter(
+        method='search',
+        label='Search'
+    )
+    site_id = django_filters.ModelMultipleChoiceFilter(
+        field_name='site',
+        queryset=Site.objects.all(),
+        label='Site (ID)',
+    )
+
+    class Meta:
+        model = SitePowerSummary
+        fields = ('rated_power', 'measured_power', 'pdu_count', 'outlet_count')
+
+    def search(self, queryset, name, value):
+        """Quick search functionality"""
+        if not value.strip():
+            return queryset
+        return queryset.filter(site__name__icontains=value.strip())
+
+
+class DevicePowerDependencyFilterSet(BaseFilterSet):
+    """FilterSet for DevicePowerDependency model"""
+    q = django_filters.CharFilter(
+        method='search',
+        label='Search'
+    )
+    device_id = django_filters.ModelMultipleChoiceFilter(
+        field_name='device',
+        queryset=Device.objects.all(),
+        label='Device (ID)',
+    )
+    site_id = django_filters.ModelMultipleChoiceFilter(
+        field_name='device__site',
+        queryset=Site.objects.all(),
+        label='Site (ID)',
+    )
+    pdu_id = django_filters.ModelMultipleChoiceFilter(
+        queryset=PDU.objects.all(),
+        method='filter_pdu',
+        label='Fed by PDU (ID)',
+    )
+    redundancy = django_filters.MultipleChoiceFilter(
+        choices=RedundancyChoices
+    )
+
+    class Meta:
+        model = DevicePowerDependency
+        fields = ('outlet_count', 'pdu_count', 'line_count')
+
+    def search(self, queryset, name, value):
+        """Quick search functionality"""
+        if not value.strip():
+            return queryset
+        return queryset.filter(device__name__icontains=value.strip())
+
+    def filter_pdu(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(pdus__overlap=[pdu.pk for pdu in value])
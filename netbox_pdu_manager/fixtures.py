@@ -0,0 +1,60 @@
+"""
+Synthetic PDU/outlet datasets for benchmarks and load tests
+"""
+from dcim.models import Site
+
+from .choices import OutletStatusChoices
+from .models import PDU, Outlet
+
+__all__ = (
+    'generate_dataset',
+)
+
+# Outlet status distribution of generated outlets (out of 100)
+STATUS_DISTRIBUTION = (
+    (OutletStatusChoices.STATUS_ON, 90),
+    (OutletStatusChoices.STATUS_OFF, 5),
+    (OutletStatusChoices.STATUS_UNKNOWN, 4),
+    (OutletStatusChoices.STATUS_ERROR, 1),
+)
+
+
+def generate_dataset(pdu_count, outlet_count, prefix='bench', site=None, pdu_attrs=None, batch_size=10000):
+    """
+    Bulk create `pdu_count` PDUs with `outlet_count` outlets each. Returns the created PDUs.
+    `pdu_attrs` may be a callable returning extra field values for the n-th PDU, including
+    its own outlet_count.
+    """
+    if site is None:
+        site, _ = Site.objects.get_or_create(name=f'{prefix} site', slug=f'{prefix}-site')
+    statuses = [status for status, weight in STATUS_DISTRIBUTION for _ in range(weight)]
+
+    pdus = []
+    for i in range(pdu_count):
+        pdu = PDU(**{
+            'name': f'{prefix}-rack-{i:04d}-a', 'model': 'PX3-5000', 'serial_number': f'SN{i:08d}', 'site': site,
+            'rated_voltage': 230, 'rated_current': 32, 'outlet_count': outlet_count,
+            **(pdu_attrs(i) if pdu_attrs else {})
+        })
+        pdu.outlets_total = pdu.outlet_count
+        pdu.search_text = pdu.get_search_text()
+        pdus.append(pdu)
+    PDU.objects.bulk_create(pdus, batch_size=1000)
+
+    outlets = []
+    for i, pdu in enumerate(pdus):
+        for number in range(1, pdu.outlet_count + 1):
+            outlet = Outlet(
+                pdu=pdu, outlet_number=number, name=f'server-{i}-{number}', label=str(number),
+                status=statuses[(i * pdu.outlet_count + number) % len(statuses)]
+            )
+            outlet.search_text = outlet.get_search_text(pdu_name=pdu.name)
+            outlets.append(outlet)
+        if len(outlets) >= batch_size:
+            Outlet.objects.bulk_create(outlets)
+            outlets = []
+    Outlet.objects.bulk_create(outlets)
+    PDU.objects.filter(pk__in=[pdu.pk for pdu in pdus]).refresh_outlet_counters()
+    PDU.objects.filter(pk__in=[pdu.pk for pdu in pdus]).refresh_power_summaries()
+
+    return pdus
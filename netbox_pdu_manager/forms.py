@@ -1,9 +1,14 @@
 from django import forms
+from django.db.models import Q
 from dcim.models import Device, Rack, Site
 from ipam.models import IPAddress
-from netbox.forms import NetBoxModelForm
-from utilities.forms.fields import CommentField, DynamicModelChoiceField
+from netbox.forms import NetBoxModelBulkEditForm, NetBoxModelForm
+from utilities.forms import add_blank_choice
+from utilities.forms.fields import CommentField, DynamicModelChoiceField, DynamicModelMultipleChoiceField
+from utilities.forms.rendering import FieldSet
 
+from .choices import PHASE_INDEX, EnergyScopeChoices, OutletStatusChoices, PhaseChoices, PowerActionChoices
+from .energy import parse_period
 from .models import PDU, Outlet
 
 
@@ -59,3 +64,129 @@ class OutletForm(NetBoxModelForm):
             'connected_device', 'connected_device_port',
             'tags'
         )
+
+
+class OutletBulkEditForm(NetBoxModelBulkEditForm):
+    """Form for bulk editing Outlet objects, and for switching them remotely"""
+    model = Outlet
+    status = forms.ChoiceField(
+        choices=add_blank_choice(OutletStatusChoices),
+        required=False
+    )
+    phase = forms.ChoiceField(
+        choices=add_blank_choice(PhaseChoices),
+        required=False
+    )
+    bank_number = forms.IntegerField(
+        min_value=1,
+        required=False
+    )
+    connected_device = DynamicModelChoiceField(
+        queryset=Device.objects.all(),
+        required=False
+    )
+    description = forms.CharField(
+        max_length=200,
+        required=False
+    )
+    power_action = forms.ChoiceField(
+        choices=add_blank_choice(PowerActionChoices),
+        required=False,
+        label='Power action',
+        help_text='Switch the selected outlets on the PDUs (in the background, powering on in stages)'
+    )
+
+    fieldsets = (
+        FieldSet('status', 'phase', 'bank_number', 'description', name='Outlet'),
+        FieldSet('connected_device', name='Connection'),
+        FieldSet('power_action', name='Remote Control'),
+    )
+    nullable_fields = ('phase', 'bank_number', 'connected_device', 'description')
+
+
+class StreamingImportForm(forms.Form):
+    """Upload form for the streaming CSV import"""
+    csv_file = forms.FileField(
+        label='CSV file',
+        help_text='UTF-8 CSV with a header row; columns are model field names'
+    )
+    update_existing = forms.BooleanField(
+        required=False,
+        initial=True,
+        help_text='Update objects which already exist instead of rejecting their rows'
+    )
+
+
+class FailureScenarioForm(forms.Form):
+    """Selects the PDUs, and optionally the phase or bank of them, which fail"""
+    pdu_id = DynamicModelMultipleChoiceField(
+        queryset=PDU.objects.all(),
+        required=False,
+        label='PDUs'
+    )
+    rack_id = DynamicModelMultipleChoiceField(
+        queryset=Rack.objects.all(),
+        required=False,
+        label='Racks',
+        help_text='All PDUs in these racks'
+    )
+    site_id = DynamicModelMultipleChoiceField(
+        queryset=Site.objects.all(),
+        required=False,
+        label='Sites',
+        help_text='All PDUs at these sites'
+    )
+    phase = forms.ChoiceField(
+        choices=add_blank_choice(PhaseChoices),
+        required=False,
+        help_text='Only this phase (line) of the PDUs fails'
+    )
+    bank_number = forms.IntegerField(
+        min_value=1,
+        required=False,
+        help_text='Only this bank of the PDUs fails'
+    )
+
+    def clean(self):
+        super().clean()
+        if not any(self.cleaned_data.get(name) for name in ('pdu_id', 'rack_id', 'site_id')):
+            raise forms.ValidationError("Select the PDUs, racks or sites which fail.")
+        return self.cleaned_data
+
+    def get_pdus(self, pdus):
+        """Return the failed PDUs of the `pdus` queryset"""
+        return pdus.filter(
+            Q(pk__in=self.cleaned_data['pdu_id']) |
+            Q(rack__in=self.cleaned_data['rack_id']) |
+            Q(site__in=self.cleaned_data['site_id'])
+        )
+
+    @property
+    def line(self):
+        return PHASE_INDEX.get(self.cleaned_data['phase'])
+
+
+class EnergyReportForm(forms.Form):
+    """Selects the billing period and the entities energy is reported by"""
+    period = forms.CharField(
+        required=False,
+        help_text='Billing period as YYYY-MM (default: the current period)'
+    )
+    scope = forms.ChoiceField(
+        choices=EnergyScopeChoices,
+        required=False,
+        initial=EnergyScopeChoices.SCOPE_TENANT,
+        help_text='Report energy by'
+    )
+
+    def clean_period(self):
+        period = self.cleaned_data['period']
+        if not period:
+            return None
+        try:
+            return parse_period(period)
+        except ValueError:
+            raise forms.ValidationError("Enter the period as YYYY-MM.")
+
+    def clean_scope(self):
+        return self.cleaned_data['scope'] or EnergyScopeChoices.SCOPE_TENANT
@@ -0,0 +1,734 @@
+"""
+Outlet measurement history: raw sample storage, incremental rollups, compressed
+blocks and retention
+"""
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from . import blocks, config
+from .choices import MeasurementTierChoices
+from .models import Outlet, OutletMeasurement, OutletMeasurementBlock, OutletMeasurementRollup, bulk_update_rows
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__all__ = (
+    'compact_blocks',
+    'compacted_until',
+    'copy_measurements',
+    'ensure_partitions',
+    'get_block_settings',
+    'get_samples',
+    'get_sample_window',
+    'get_series',
+    'merge_blocks',
+    'prepare_partitions',
+    'purge_expired',
+    'record_measurements',
+    'replay_measurements',
+    'rollup',
+    'rollup_tier',
+)
+
+logger = logging.getLogger('netbox.netbox_pdu_manager.history')
+
+RAW_TABLE = OutletMeasurement._meta.db_table
+ROLLUP_TABLE = OutletMeasurementRollup._meta.db_table
+BLOCK_TABLE = OutletMeasurementBlock._meta.db_table
+REPLAY_STAGING_TABLE = 'netbox_pdu_manager_replay_staging'
+METRICS = ('voltage', 'current', 'power')
+# Aggregate columns of rollups and blocks
+SUMMARY_FIELDS = tuple(f'{metric}_{agg}' for metric in METRICS for agg in ('min', 'max', 'avg', 'last'))
+
+# Tiers in order of increasing width; each is rolled up from the one before it
+TIERS = {
+    MeasurementTierChoices.TIER_1M: timedelta(minutes=1),
+    MeasurementTierChoices.TIER_15M: timedelta(minutes=15),
+    MeasurementTierChoices.TIER_1H: timedelta(hours=1),
+}
+TIER_SOURCES = {
+    MeasurementTierChoices.TIER_1M: None,
+    MeasurementTierChoices.TIER_15M: MeasurementTierChoices.TIER_1M,
+    MeasurementTierChoices.TIER_1H: MeasurementTierChoices.TIER_15M,
+}
+
+# Raw samples arriving later than this after a window closes are not rolled up
+ROLLUP_DELAY = timedelta(minutes=2)
+
+EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# Daily partitions of the raw table are created this many days ahead
+PARTITION_DAYS_AHEAD = 2
+
+# Days whose raw partition is known to exist in this process
+_partition_days = set()
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def _floor(value, width):
+    return value - (value - EPOCH) % width
+
+
+def _retention(tier):
+    return timedelta(days=get_plugin_config('netbox_pdu_manager', 'measurement_retention')[tier])
+
+
+def get_block_settings():
+    return {
+        **config.default_settings['measurement_blocks'],
+        **get_plugin_config('netbox_pdu_manager', 'measurement_blocks'),
+    }
+
+
+#
+# Raw samples
+#
+
+def record_measurements(readings, timestamp, batch_size=5000):
+    """
+    Append raw samples for polled readings ({pdu_id: [reading, ...]}).
+    Returns the number of samples written.
+    """
+    outlet_ids = {
+        (pdu_id, outlet_number): pk
+        for pk, pdu_id, outlet_number in Outlet.objects.filter(pdu_id__in=readings.keys()).order_by().values_list(
+            'pk', 'pdu_id', 'outlet_number'
+        )
+    }
+    prepare_partitions([timestamp])
+    measurements = [
+        OutletMeasurement(
+            outlet_id=outlet_ids[(pdu_id, reading['outlet_number'])],
+            timestamp=timestamp,
+            voltage=reading.get('voltage'),
+            current=reading.get('current'),
+            power=reading.get('power'),
+        )
+        for pdu_id, pdu_readings in readings.items()
+        for reading in pdu_readings
+        if (pdu_id, reading['outlet_number']) in outlet_ids
+    ]
+    OutletMeasurement.objects.bulk_create(measurements, batch_size=batch_size)
+    return len(measurements)
+
+
+def replay_measurements(samples, batch_size=5000):
+    """
+    Append raw samples given as (pdu_id, outlet_number, timestamp, voltage, current,
+    power) tuples, e.g. replayed from the spool, skipping those already stored for the
+    same outlet and timestamp. Samples of windows already compacted are merged into
+    their blocks; other samples outside the retained raw window are skipped. Returns
+    the number of samples written.
+    """
+    outlet_ids = {
+        (pdu_id, outlet_number): pk
+        for pk, pdu_id, outlet_number in Outlet.objects.filter(
+            pdu_id__in={sample[0] for sample in samples}
+        ).order_by().values_list('pk', 'pdu_id', 'outlet_number')
+    }
+    rows = [
+        (outlet_ids[(pdu_id, outlet_number)], timestamp, voltage, current, power)
+        for pdu_id, outlet_number, timestamp, voltage, current, power in samples
+        if (pdu_id, outlet_number) in outlet_ids
+    ]
+    written = 0
+    settings = get_block_settings()
+    if settings['enabled']:
+        # Samples of windows already compacted go into their blocks
+        until = compacted_until(settings)
+        late = [row for row in rows if until is not None and row[1] < until]
+        if late:
+            rows = [row for row in rows if row[1] >= until]
+            written = merge_blocks(late, settings)
+    earliest, latest = get_sample_window()
+    rows = [row for row in rows if earliest <= row[1] < latest]
+    prepare_partitions(row[1] for row in rows)
+    if connection.vendor == 'postgresql':
+        return written + _replay_postgresql(rows)
+
+    # Samples of one poll share its timestamp, so there are few distinct timestamps
+    existing = set(OutletMeasurement.objects.filter(
+        timestamp__in={row[1] for row in rows},
+        outlet_id__in=outlet_ids.values(),
+    ).order_by().values_list('outlet_id', 'timestamp'))
+    measurements = []
+    for outlet_id, timestamp, voltage, current, power in rows:
+        if (outlet_id, timestamp) in existing:
+            continue
+        existing.add((outlet_id, timestamp))
+        measurements.append(OutletMeasurement(
+            outlet_id=outlet_id, timestamp=timestamp, voltage=voltage, current=current, power=power
+        ))
+    OutletMeasurement.objects.bulk_create(measurements, batch_size=batch_size)
+    return written + len(measurements)
+
+
+def _replay_postgresql(rows):
+    """COPY samples into a staging table and insert those not stored yet with one statement"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        return copy_measurements(cursor, REPLAY_STAGING_TABLE, rows, skip_existing=True)
+
+
+def copy_measurements(cursor, table, rows, insert=True, skip_existing=False):
+    """
+    COPY samples given as (outlet_id, timestamp, voltage, current, power) tuples into
+    the temporary staging `table`, which is emptied on commit, and (if `insert`) append
+    them to the raw history with one statement, skipping samples already stored for the
+    same outlet and timestamp if `skip_existing`. Returns the number of samples
+    inserted. PostgreSQL only; the raw partitions must exist.
+    """
+    ts = _qn('timestamp')
+    cursor.execute(
+        f"CREATE TEMP TABLE IF NOT EXISTS {table} ("
+        f"outlet_id bigint, ts timestamptz, voltage double precision, "
+        f"\"current\" double precision, power double precision"
+        f") ON COMMIT DELETE ROWS"
+    )
+    with cursor.copy(f"COPY {table} (outlet_id, ts, voltage, \"current\", power) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+    if not insert:
+        return 0
+    if skip_existing:
+        cursor.execute(
+            f"INSERT INTO {_qn(RAW_TABLE)} (outlet_id, {ts}, voltage, \"current\", power) "
+            f"SELECT DISTINCT ON (outlet_id, ts) outlet_id, ts, voltage, \"current\", power "
+            f"FROM {table} s WHERE NOT EXISTS ("
+            f"SELECT 1 FROM {_qn(RAW_TABLE)} m WHERE m.outlet_id = s.outlet_id AND m.{ts} = s.ts"
+            f") ORDER BY outlet_id, ts"
+        )
+    else:
+        cursor.execute(
+            f"INSERT INTO {_qn(RAW_TABLE)} (outlet_id, {ts}, voltage, \"current\", power) "
+            f"SELECT outlet_id, ts, voltage, \"current\", power FROM {table}"
+        )
+    return cursor.rowcount
+
+
+def _partition_name(day):
+    return f'{RAW_TABLE}_p{day:%Y%m%d}'
+
+
+def _create_partition(cursor, day):
+    """
+    Create the daily partition of the raw table for `day` unless it exists. Samples of
+    that day in the default partition are moved into it first, as it could not be
+    attached otherwise. Must run in a transaction.
+    """
+    name = _partition_name(day)
+    # Serializes concurrent creation of the same partition
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [name])
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return False
+    start = datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+    end = start + timedelta(days=1)
+    cursor.execute(f"CREATE TABLE {_qn(name)} (LIKE {_qn(RAW_TABLE)} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {_qn(f'{RAW_TABLE}_default')} "
+        f"WHERE {_qn('timestamp')} >= %s AND {_qn('timestamp')} < %s RETURNING *) "
+        f"INSERT INTO {_qn(name)} SELECT * FROM moved",
+        [start, end]
+    )
+    if cursor.rowcount:
+        logger.info(f"Moved {cursor.rowcount} samples from the default partition into {name}")
+    cursor.execute(
+        f"ALTER TABLE {_qn(RAW_TABLE)} ATTACH PARTITION {_qn(name)} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+    return True
+
+
+def prepare_partitions(timestamps):
+    """Make sure the daily partitions for the given timestamps exist before samples are written"""
+    if connection.vendor != 'postgresql':
+        return
+    days = {timestamp.astimezone(dt_timezone.utc).date() for timestamp in timestamps} - _partition_days
+    if not days:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        for day in sorted(days):
+            _create_partition(cursor, day)
+    # Only remembered once committed; an outer rollback would undo the partitions
+    transaction.on_commit(lambda: _partition_days.update(days))
+
+
+def ensure_partitions(days_ahead=PARTITION_DAYS_AHEAD, today=None):
+    """
+    Create the daily partitions of the raw table for today and the next few days.
+    Samples of other days are written to their partition, created on demand.
+    """
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(days_ahead + 1):
+            _create_partition(cursor, today + timedelta(days=offset))
+
+
+def get_sample_window(now=None):
+    """
+    Return the (earliest, latest) timestamps of raw samples which are accepted: from
+    the raw retention period ago up to the last day partitions are created ahead for
+    """
+    now = now or timezone.now()
+    today = now.astimezone(dt_timezone.utc).date()
+    latest = datetime(today.year, today.month, today.day, tzinfo=dt_timezone.utc)
+    return now - _retention('raw'), latest + timedelta(days=PARTITION_DAYS_AHEAD + 1)
+
+
+def _get_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s",
+            [RAW_TABLE]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def purge_expired(now=None):
+    """
+    Apply the configured retention periods. Raw samples are dropped a daily
+    partition at a time, and deleted from the default partition; rollups and
+    blocks are deleted by window start.
+    """
+    now = now or timezone.now()
+    raw_cutoff = now - _retention('raw')
+    cutoff_day = raw_cutoff.astimezone(dt_timezone.utc).date()
+    prefix = f'{RAW_TABLE}_p'
+    deleted = 0
+    with connection.cursor() as cursor:
+        for name in _get_partitions():
+            if not name.startswith(prefix):
+                continue
+            day = datetime.strptime(name[len(prefix):], '%Y%m%d').date()
+            if day + timedelta(days=1) <= cutoff_day:
+                cursor.execute(f"DROP TABLE {_qn(name)}")
+                _partition_days.discard(day)
+                logger.info(f"Dropped expired measurement partition {name}")
+        cursor.execute(
+            f"DELETE FROM {_qn(f'{RAW_TABLE}_default')} WHERE {_qn('timestamp')} < %s",
+            [raw_cutoff]
+        )
+
+        # Rollups and blocks have no dependents, so they are deleted without the collector
+        for tier in TIERS:
+            cursor.execute(
+                f"DELETE FROM {_qn(ROLLUP_TABLE)} WHERE tier = %s AND window_start < %s",
+                [tier, now - _retention(tier)]
+            )
+            deleted += cursor.rowcount
+        cursor.execute(
+            f"DELETE FROM {_qn(BLOCK_TABLE)} WHERE window_start < %s",
+            [now - timedelta(days=get_block_settings()['retention'])]
+        )
+        deleted += cursor.rowcount
+    return deleted
+
+
+#
+# Rollups
+#
+
+def _raw_aggregates():
+    ts = _qn('timestamp')
+    columns = []
+    for metric in METRICS:
+        col = _qn(metric)
+        columns.extend([
+            f"min({col})",
+            f"max({col})",
+            f"avg({col})",
+            f"(array_agg({col} ORDER BY {ts} DESC) FILTER (WHERE {col} IS NOT NULL))[1]",
+        ])
+    return ', '.join(columns)
+
+
+def _rollup_aggregates():
+    columns = []
+    for metric in METRICS:
+        columns.extend([
+            f"min({metric}_min)",
+            f"max({metric}_max)",
+            f"sum({metric}_avg * samples) / nullif(sum(samples) FILTER (WHERE {metric}_avg IS NOT NULL), 0)",
+            f"(array_agg({metric}_last ORDER BY window_start DESC) FILTER (WHERE {metric}_last IS NOT NULL))[1]",
+        ])
+    return ', '.join(columns)
+
+
+def _rollup_columns():
+    return ', '.join(SUMMARY_FIELDS)
+
+
+def _rollup_window(cursor, tier, window_start):
+    """Aggregate a single window of the source tier into `tier`"""
+    source = TIER_SOURCES[tier]
+    window_end = window_start + TIERS[tier]
+    if source is None:
+        select = (
+            f"SELECT %s, outlet_id, %s, count(*), {_raw_aggregates()} FROM {_qn(RAW_TABLE)} "
+            f"WHERE {_qn('timestamp')} >= %s AND {_qn('timestamp')} < %s GROUP BY outlet_id"
+        )
+        params = [tier, window_start, window_start, window_end]
+    else:
+        select = (
+            f"SELECT %s, outlet_id, %s, sum(samples), {_rollup_aggregates()} FROM {_qn(ROLLUP_TABLE)} "
+            f"WHERE tier = %s AND window_start >= %s AND window_start < %s GROUP BY outlet_id"
+        )
+        params = [tier, window_start, source, window_start, window_end]
+    cursor.execute(
+        f"INSERT INTO {_qn(ROLLUP_TABLE)} (tier, outlet_id, window_start, samples, {_rollup_columns()}) "
+        f"{select} ON CONFLICT (tier, outlet_id, window_start) DO NOTHING",
+        params
+    )
+    return cursor.rowcount
+
+
+def _next_source_time(tier, after):
+    """Return the earliest source timestamp at or after `after`, or None"""
+    source = TIER_SOURCES[tier]
+    if source is None:
+        queryset = OutletMeasurement.objects.all()
+        field = 'timestamp'
+    else:
+        queryset = OutletMeasurementRollup.objects.filter(tier=source)
+        field = 'window_start'
+    if after is not None:
+        queryset = queryset.filter(**{f'{field}__gte': after})
+    return queryset.aggregate(first=Min(field))['first']
+
+
+def _source_horizon(tier, now):
+    """Return the time up to which the source of `tier` is complete"""
+    source = TIER_SOURCES[tier]
+    if source is None:
+        return now - ROLLUP_DELAY
+    last = OutletMeasurementRollup.objects.filter(tier=source).aggregate(last=Max('window_start'))['last']
+    return last + TIERS[source] if last else None
+
+
+def rollup_tier(tier, now=None, max_windows=120):
+    """
+    Roll up completed windows of the source tier into `tier`, one window at a time,
+    continuing from the last window already stored. Gaps without source data are
+    skipped. Returns the number of windows processed.
+    """
+    now = now or timezone.now()
+    width = TIERS[tier]
+    horizon = _source_horizon(tier, now)
+    if horizon is None:
+        return 0
+
+    last = OutletMeasurementRollup.objects.filter(tier=tier).aggregate(last=Max('window_start'))['last']
+    window_start = last + width if last else None
+
+    processed = 0
+    with connection.cursor() as cursor:
+        while processed < max_windows:
+            first = _next_source_time(tier, window_start)
+            if first is None:
+                break
+            if window_start is None or first >= window_start + width:
+                window_start = _floor(first, width)
+            if window_start + width > horizon:
+                break
+            with transaction.atomic():
+                _rollup_window(cursor, tier, window_start)
+            window_start += width
+            processed += 1
+    return processed
+
+
+def rollup(now=None):
+    """Roll up all tiers. Returns a {tier: windows processed} map."""
+    now = now or timezone.now()
+    return {tier: rollup_tier(tier, now=now) for tier in TIERS}
+
+
+#
+# Blocks
+#
+
+def _block_width(settings=None):
+    return timedelta(minutes=(settings or get_block_settings())['block_size'])
+
+
+def compacted_until(settings=None):
+    """Return the end of the last window compacted into blocks, or None"""
+    last = OutletMeasurementBlock.objects.aggregate(last=Max('window_start'))['last']
+    return last + _block_width(settings) if last else None
+
+
+def _make_block(outlet_id, window_start, offsets, columns, level, block=None):
+    """Encode sorted, unique samples into a new or existing OutletMeasurementBlock"""
+    if block is None:
+        block = OutletMeasurementBlock(outlet_id=outlet_id, window_start=window_start)
+    block.samples = len(offsets)
+    for metric, values in zip(METRICS, columns):
+        for agg, value in zip(('min', 'max', 'avg', 'last'), blocks.summarize(values)):
+            setattr(block, f'{metric}_{agg}', value)
+    block.data = blocks.encode_block(offsets, *columns, level=level)
+    return block
+
+
+def _compact_window(window_start, width, level, chunk_size=2000):
+    """Pack the raw samples of a single window into one block per outlet"""
+    ts = _qn('timestamp')
+    arrays = ', '.join(f"array_agg({_qn(metric)} ORDER BY {ts})" for metric in METRICS)
+    created = 0
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(
+            f"SELECT outlet_id, array_agg((extract(epoch FROM {ts} - %s) * 1000000)::bigint ORDER BY {ts}), "
+            f"{arrays} FROM {_qn(RAW_TABLE)} WHERE {ts} >= %s AND {ts} < %s GROUP BY outlet_id",
+            [window_start, window_start, window_start + width]
+        )
+        while rows := cursor.fetchmany(chunk_size):
+            measurement_blocks = []
+            for outlet_id, offsets, *columns in rows:
+                # Duplicate timestamps keep their first sample
+                offsets, index = np.unique(np.array(offsets, dtype=np.int64), return_index=True)
+                columns = [np.array(values, dtype=np.float64)[index] for values in columns]
+                measurement_blocks.append(_make_block(outlet_id, window_start, offsets, columns, level))
+            OutletMeasurementBlock.objects.bulk_create(measurement_blocks, batch_size=1000, ignore_conflicts=True)
+            created += len(measurement_blocks)
+    return created
+
+
+def compact_blocks(now=None, max_windows=24):
+    """
+    Pack completed windows of raw samples into blocks, one window at a time,
+    continuing from the last window compacted. Gaps without raw samples are
+    skipped. Returns the number of windows processed.
+    """
+    blocks.check_numpy()
+    settings = get_block_settings()
+    now = now or timezone.now()
+    width = _block_width(settings)
+    horizon = now - ROLLUP_DELAY
+    window_start = compacted_until(settings)
+
+    processed = 0
+    while processed < max_windows:
+        queryset = OutletMeasurement.objects.all()
+        if window_start is not None:
+            queryset = queryset.filter(timestamp__gte=window_start)
+        first = queryset.aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            break
+        if window_start is None or first >= window_start + width:
+            window_start = _floor(first, width)
+        if window_start + width > horizon:
+            break
+        _compact_window(window_start, width, settings['compress_level'])
+        window_start += width
+        processed += 1
+    return processed
+
+
+def merge_blocks(rows, settings=None):
+    """
+    Merge late samples given as (outlet_id, timestamp, voltage, current, power)
+    tuples into the blocks of their windows, keeping stored samples with the same
+    timestamp. Returns the number of samples added.
+    """
+    blocks.check_numpy()
+    settings = settings or get_block_settings()
+    width = _block_width(settings)
+    windows = {}
+    for outlet_id, timestamp, *values in rows:
+        windows.setdefault((outlet_id, _floor(timestamp, width)), []).append((timestamp, *values))
+    existing = {
+        (block.outlet_id, block.window_start): block
+        for block in OutletMeasurementBlock.objects.filter(
+            outlet_id__in={outlet_id for outlet_id, _ in windows},
+            window_start__in={window_start for _, window_start in windows},
+        )
+    }
+
+    added = 0
+    changed, created = [], []
+    for (outlet_id, window_start), samples in windows.items():
+        offsets = np.array([(timestamp - window_start) // MICROSECOND for timestamp, *_ in samples], dtype=np.int64)
+        columns = np.array([values for _, *values in samples], dtype=np.float64).T
+        block = existing.get((outlet_id, window_start))
+        stored = 0
+        if block is not None:
+            stored = block.samples
+            old_offsets, *old_columns = blocks.decode_block(block.data)
+            offsets = np.concatenate((old_offsets, offsets))
+            columns = np.concatenate((old_columns, columns), axis=1)
+        # np.unique() keeps the first occurrence, i.e. the stored sample
+        offsets, index = np.unique(offsets, return_index=True)
+        if len(offsets) == stored:
+            continue
+        added += len(offsets) - stored
+        block = _make_block(outlet_id, window_start, offsets, columns[:, index], settings['compress_level'], block)
+        (changed if block.pk else created).append(block)
+
+    bulk_update_rows(changed, ('samples', *SUMMARY_FIELDS, 'data'))
+    OutletMeasurementBlock.objects.bulk_create(created, batch_size=1000, ignore_conflicts=True)
+    return added
+
+
+#
+# Queries
+#
+
+def select_tier(start, end, max_points, now=None):
+    """
+    Pick the finest tier which still holds data for `start` and needs no more than
+    `max_points` windows to cover the range, falling back to the coarsest tier.
+    """
+    now = now or timezone.now()
+    for tier, width in TIERS.items():
+        if start >= now - _retention(tier) and (end - start) / width <= max_points:
+            return tier
+    return MeasurementTierChoices.TIER_1H
+
+
+def _load_samples(outlet_id, start, end, settings):
+    """
+    Return the readings of an outlet between `start` and `end` as a microseconds
+    since EPOCH array and voltage, current and power arrays, decoded from its blocks
+    and followed by the raw samples which are not compacted yet
+    """
+    width = _block_width(settings)
+    until = compacted_until(settings)
+    parts = []
+    for window_start, data in OutletMeasurementBlock.objects.filter(
+        outlet_id=outlet_id,
+        window_start__gt=start - width,
+        window_start__lt=end,
+    ).order_by('window_start').values_list('window_start', 'data'):
+        offsets, *columns = blocks.decode_block(data)
+        parts.append(((window_start - EPOCH) // MICROSECOND + offsets, *columns))
+
+    rows = list(OutletMeasurement.objects.filter(
+        outlet_id=outlet_id,
+        timestamp__gte=max(start, until) if until else start,
+        timestamp__lt=end,
+    ).order_by('timestamp').values_list('timestamp', *METRICS))
+    if rows:
+        times = np.array([(timestamp - EPOCH) // MICROSECOND for timestamp, *_ in rows], dtype=np.int64)
+        parts.append((times, *np.array([values for _, *values in rows], dtype=np.float64).T))
+
+    if not parts:
+        return np.empty(0, dtype=np.int64), *(np.empty(0) for _ in METRICS)
+    times, *columns = (np.concatenate(column) for column in zip(*parts))
+    # Blocks may start before `start` or end after `end`
+    selected = (times >= (start - EPOCH) // MICROSECOND) & (times < (end - EPOCH) // MICROSECOND)
+    return times[selected], *(values[selected] for values in columns)
+
+
+def get_samples(outlet_id, start, end):
+    """
+    Return the readings of an outlet between `start` and `end` as NumPy arrays:
+    times (UTC datetime64[us]), voltage, current and power (NaN for null). Requires
+    measurement_blocks; samples are read from blocks and the raw table.
+    """
+    blocks.check_numpy()
+    times, *columns = _load_samples(outlet_id, start, end, get_block_settings())
+    return np.datetime64(EPOCH.replace(tzinfo=None), 'us') + times.astype('timedelta64[us]'), *columns
+
+
+def _bucket_samples(times, columns, bucket):
+    """Aggregate sorted samples into buckets of `bucket` aligned to EPOCH, like the SQL series"""
+    if not times.size:
+        return []
+    ids = times // (bucket // MICROSECOND)
+    starts = np.flatnonzero(np.diff(ids, prepend=ids[0] - 1))
+    positions = np.arange(times.size)
+    result = [
+        [EPOCH + bucket * int(i) for i in ids[starts]],
+        np.diff(np.append(starts, times.size)).tolist(),
+    ]
+    for values in columns:
+        valid = ~np.isnan(values)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        last = np.maximum.reduceat(np.where(valid, positions, -1), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result.extend([
+                np.fmin.reduceat(values, starts),
+                np.fmax.reduceat(values, starts),
+                np.where(counts > 0, sums / counts, np.nan),
+                np.where(last >= starts, values[last], np.nan),
+            ])
+    result[2:] = [[None if value != value else value for value in column.tolist()] for column in result[2:]]
+    return [dict(zip(('time', 'samples', *SUMMARY_FIELDS), row)) for row in zip(*result)]
+
+
+def _block_series(outlet_id, start, end, max_points, settings):
+    """
+    Series from blocks and the raw samples after them. Buckets narrower than a block
+    are computed from the decoded samples; wider ones from the block headers alone.
+    """
+    width = _block_width(settings)
+    minute = timedelta(minutes=1)
+    bucket = max(minute, minute * -(-(end - start) // (minute * max_points)))
+    if bucket < width:
+        times, *columns = _load_samples(outlet_id, start, end, settings)
+        return _bucket_samples(times, columns, bucket)
+
+    # Whole blocks per bucket, so that the headers can be combined like rollups
+    bucket = width * -(-bucket // width)
+    until = compacted_until(settings)
+    ts = _qn('timestamp')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT date_bin(%s, window_start, %s) AS bucket, sum(samples), {_rollup_aggregates()} FROM ("
+            f"SELECT window_start, samples, {_rollup_columns()} FROM {_qn(BLOCK_TABLE)} "
+            f"WHERE outlet_id = %s AND window_start >= %s AND window_start < %s "
+            f"UNION ALL "
+            f"SELECT date_bin(%s, {ts}, %s), count(*)::integer, {_raw_aggregates()} FROM {_qn(RAW_TABLE)} "
+            f"WHERE outlet_id = %s AND {ts} >= %s AND {ts} < %s GROUP BY 1"
+            f") AS s GROUP BY bucket ORDER BY bucket",
+            [
+                bucket, EPOCH, outlet_id, start, end,
+                width, EPOCH, outlet_id, max(start, until) if until else start, end,
+            ]
+        )
+        return [
+            dict(zip(('time', 'samples', *SUMMARY_FIELDS), row))
+            for row in cursor.fetchall()
+        ]
+
+
+def get_series(outlet_id, start, end, max_points=300):
+    """
+    Return aggregated readings for an outlet between `start` and `end` as a list of
+    dicts, with at most `max_points` rows. With measurement_blocks, ranges within the
+    block retention are read from blocks; otherwise from the coarsest suitable rollup
+    tier, re-bucketed.
+    """
+    settings = get_block_settings()
+    if settings['enabled'] and start >= timezone.now() - timedelta(days=settings['retention']):
+        blocks.check_numpy()
+        return _block_series(outlet_id, start, end, max_points, settings)
+
+    tier = select_tier(start, end, max_points)
+    width = TIERS[tier]
+    bucket = max(width, width * -(-(end - start) // (width * max_points)))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT date_bin(%s, window_start, %s) AS bucket, sum(samples), {_rollup_aggregates()} "
+            f"FROM {_qn(ROLLUP_TABLE)} WHERE tier = %s AND outlet_id = %s "
+            f"AND window_start >= %s AND window_start < %s GROUP BY bucket ORDER BY bucket",
+            [bucket, EPOCH, tier, outlet_id, start, end]
+        )
+        return [
+            dict(zip(('time', 'samples', *SUMMARY_FIELDS), row))
+            for row in cursor.fetchall()
+        ]
@@ -0,0 +1,400 @@
+"""
+Streaming CSV import of PDUs and outlets
+"""
+import csv
+import io
+from itertools import islice
+
+from dcim.models import Device, Rack, Site
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from ipam.models import IPAddress
+from utilities.exceptions import PermissionsViolation
+
+from .models import DevicePowerDependency, PDU, Outlet, refresh_power_summaries
+
+__all__ = (
+    'IMPORTERS',
+    'ImportResult',
+    'OutletImporter',
+    'PDUImporter',
+    'iter_csv',
+)
+
+# Maximum number of rejected rows reported back individually
+MAX_REPORTED_ERRORS = 1000
+
+# Marks a natural key which matches more than one object
+AMBIGUOUS = object()
+
+
+class ImportResult:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, row_number, errors):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def serialize(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'errors': self.errors,
+        }
+
+
+def iter_csv(stream, encoding='utf-8-sig'):
+    """
+    Incrementally parse a CSV byte stream with a header row. Yields (row_number, row)
+    pairs, where row_number is the line of the row in the file.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding=encoding, newline=''))
+    for row in reader:
+        yield reader.line_num, {key.strip(): (value or '').strip() for key, value in row.items() if key}
+
+
+class KeyMap:
+    """
+    Map of natural keys to primary keys for a related model, loaded with a single
+    query the first time it is used. Keys shared by several objects map to AMBIGUOUS.
+    """
+    def __init__(self, loader):
+        self.loader = loader
+        self._keys = None
+
+    def get(self, key):
+        if self._keys is None:
+            self._keys = {}
+            for key_, pk in self.loader():
+                self._keys[key_] = AMBIGUOUS if key_ in self._keys else pk
+        return self._keys.get(key)
+
+    def resolve(self, key, label, value):
+        """Return the primary key for `key`, or raise ValidationError"""
+        pk = self.get(key)
+        if pk is None:
+            raise ValidationError(f"{label} not found: {value}")
+        if pk is AMBIGUOUS:
+            raise ValidationError(f"{label} is ambiguous: {value}")
+        return pk
+
+
+class StreamingImporter:
+    """
+    Import rows in chunks: each chunk is validated without per-row queries (related
+    objects are resolved through KeyMaps and existing objects are fetched with one
+    query), then written with bulk_create() and bulk_update() in one transaction.
+    Like other bulk writes, this creates no change records and fires no signals.
+
+    If a `user` is given, the object permissions of the user apply as in NetBox's bulk
+    import: existing objects are only updated if they are in the user's 'change'
+    queryset, and after the write every created and updated object must be in the
+    user's 'add' or 'change' queryset, or the chunk is rolled back.
+    """
+    model = None
+    # Columns which identify an existing object
+    key_fields = ()
+    # Columns resolved to a related object, mapped to the name of the resolving method
+    related_fields = {}
+
+    def __init__(self, update_existing=True, batch_size=1000, user=None):
+        self.update_existing = update_existing
+        self.batch_size = batch_size
+        self.user = user
+        self.fields = {
+            field.name: field
+            for field in self.model._meta.concrete_fields
+            if field.editable and not field.primary_key and field.name not in ('custom_field_data',)
+        }
+
+    def run(self, rows, progress=None):
+        """Import (row_number, row) pairs. Calls progress(result) after every chunk."""
+        result = ImportResult()
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.batch_size)):
+            result.rows += len(chunk)
+            self.import_chunk(chunk, result)
+            if progress is not None:
+                progress(result)
+        return result
+
+    def parse_row(self, row):
+        """
+        Convert a CSV row to a {field attname: value} dict; related objects are resolved
+        to their primary keys. Raises ValidationError.
+        """
+        values, errors = {}, {}
+        for column, raw in row.items():
+            if column not in self.fields:
+                continue
+            field = self.fields[column]
+            try:
+                if column in self.related_fields:
+                    value = getattr(self, self.related_fields[column])(raw, values) if raw else None
+                elif raw == '' and field.null:
+                    value = None
+                elif raw == '' and field.has_default():
+                    value = field.get_default()
+                else:
+                    value = field.to_python(raw)
+                values[field.attname] = value
+            except ValidationError as e:
+                errors[column] = e.messages
+        for name in self.key_fields:
+            if values.get(self.fields[name].attname) in (None, ''):
+                errors.setdefault(name, ["This field is required."])
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def restrict(self, action):
+        """Return the objects the user may `action` (all objects without a user)"""
+        if self.user is None:
+            return self.model.objects.all()
+        return self.model.objects.restrict(self.user, action)
+
+    def get_key(self, values):
+        return tuple(values[self.fields[name].attname] for name in self.key_fields)
+
+    def get_existing(self, keys):
+        """Return a {key: instance} map of the existing objects for a set of keys"""
+        raise NotImplementedError
+
+    def import_chunk(self, chunk, result):
+        parsed = []
+        for number, row in chunk:
+            try:
+                parsed.append((number, self.parse_row(row)))
+            except ValidationError as e:
+                result.reject(number, e.message_dict)
+        existing = self.get_existing({self.get_key(values) for _, values in parsed})
+        changeable = None
+        if self.user is not None and existing:
+            changeable = set(self.restrict('change').filter(
+                pk__in=[instance.pk for instance in existing.values()]
+            ).values_list('pk', flat=True))
+
+        now = timezone.now()
+        created, updated, numbers, seen = [], [], [], set()
+        rows = {}
+        update_fields = {'search_text', 'last_updated'}
+        for number, values in parsed:
+            key = self.get_key(values)
+            if key in seen:
+                result.reject(number, {'__all__': ["Duplicate of an earlier row in the same batch."]})
+                continue
+            instance = existing.get(key)
+            if instance is not None and not self.update_existing:
+                result.reject(number, {'__all__': ["Object already exists."]})
+                continue
+            if instance is not None and changeable is not None and instance.pk not in changeable:
+                result.reject(number, {'__all__': ["You do not have permission to change this object."]})
+                continue
+            is_new = instance is None
+            if is_new:
+                instance = self.model(**values)
+            else:
+                for name, value in values.items():
+                    setattr(instance, name, value)
+            # Related objects are resolved from KeyMaps, so skip their existence queries
+            exclude = set(self.related_fields)
+            if not is_new:
+                exclude |= {name for name, field in self.fields.items() if field.attname not in values}
+            try:
+                if is_new:
+                    self.check_related(values)
+                instance.clean_fields(exclude=exclude)
+            except ValidationError as e:
+                result.reject(number, e.message_dict)
+                continue
+            instance.search_text = self.get_search_text(instance)
+            instance.last_updated = now
+            seen.add(key)
+            numbers.append(number)
+            rows[id(instance)] = number
+            if is_new:
+                created.append(instance)
+            else:
+                updated.append(instance)
+                update_fields.update(values)
+
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create(created)
+                self.model.objects.bulk_update(updated, sorted(update_fields))
+                self.check_permissions(created, updated)
+                self.post_write(created, updated)
+        except PermissionsViolation as e:
+            violations = {rows[id(instance)] for instance in e.args[0]}
+            for number in numbers:
+                if number in violations:
+                    result.reject(number, {'__all__': ["You do not have permission to write this object."]})
+                else:
+                    result.reject(number, {'__all__': ["Batch rolled back: other rows were not permitted."]})
+            return
+        except DatabaseError as e:
+            for number in numbers:
+                result.reject(number, {'__all__': [f"Batch failed: {e}"]})
+            return
+        result.created += len(created)
+        result.updated += len(updated)
+
+    def check_permissions(self, created, updated):
+        """
+        Raise PermissionsViolation, with the offending instances, if written objects are
+        outside the user's 'add' (created) or 'change' (updated) queryset
+        """
+        if self.user is None:
+            return
+        violations = []
+        for action, instances in (('add', created), ('change', updated)):
+            if instances:
+                permitted = set(self.restrict(action).filter(
+                    pk__in=[instance.pk for instance in instances]
+                ).values_list('pk', flat=True))
+                violations.extend(instance for instance in instances if instance.pk not in permitted)
+        if violations:
+            raise PermissionsViolation(violations)
+
+    def check_related(self, values):
+        """Raise ValidationError if a required related object is missing from a new row"""
+        missing = {
+            name: ["This field is required."]
+            for name in self.related_fields
+            if not self.fields[name].null and values.get(self.fields[name].attname) is None
+        }
+        if missing:
+            raise ValidationError(missing)
+
+    def get_search_text(self, instance):
+        return instance.get_search_text()
+
+    def post_write(self, created, updated):
+        pass
+
+
+class PDUImporter(StreamingImporter):
+    model = PDU
+    key_fields = ('name',)
+    related_fields = {
+        'site': 'resolve_site',
+        'rack': 'resolve_rack',
+        'ip_address': 'resolve_ip_address',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sites = KeyMap(self._load_sites)
+        self.racks = KeyMap(lambda: (((site_id, name), pk) for pk, site_id, name in Rack.objects.values_list(
+            'pk', 'site_id', 'name'
+        )))
+        self.ip_addresses = KeyMap(self._load_ip_addresses)
+
+    @staticmethod
+    def _load_sites():
+        for pk, name, slug in Site.objects.values_list('pk', 'name', 'slug'):
+            yield slug, pk
+            if name != slug:
+                yield name, pk
+
+    @staticmethod
+    def _load_ip_addresses():
+        for pk, address in IPAddress.objects.values_list('pk', 'address'):
+            yield str(address), pk
+            if '/' in str(address):
+                yield str(address).split('/')[0], pk
+
+    def resolve_site(self, value, values):
+        return self.sites.resolve(value, "Site", value)
+
+    def post_write(self, created, updated):
+        # Updated PDUs may have moved from another rack or site
+        locations = {(pdu.rack_id, pdu.site_id) for pdu in (*created, *updated)}
+        locations.update(getattr(pdu, '_loaded_location', (None, None)) for pdu in updated)
+        refresh_power_summaries({rack_id for rack_id, _ in locations}, {site_id for _, site_id in locations})
+        PDU.objects.filter(
+            pk__in=[pdu.pk for pdu in updated if pdu.site_id != getattr(pdu, '_loaded_location', (None, None))[1]]
+        ).refresh_power_dependencies()
+
+    def resolve_rack(self, value, values):
+        site_id = values.get('site_id')
+        if site_id is None:
+            raise ValidationError("A site is required to resolve a rack.")
+        return self.racks.resolve((site_id, value), "Rack", value)
+
+    def resolve_ip_address(self, value, values):
+        return self.ip_addresses.resolve(value, "IP address", value)
+
+    def parse_row(self, row):
+        # Resolve the site before the rack, which is looked up within it
+        if 'site' in row:
+            row = {'site': row['site'], **row}
+        return super().parse_row(row)
+
+    def get_existing(self, keys):
+        return {
+            (pdu.name,): pdu
+            for pdu in PDU.objects.filter(name__in=[name for name, in keys])
+        }
+
+
+class OutletImporter(StreamingImporter):
+    model = Outlet
+    key_fields = ('pdu', 'outlet_number')
+    related_fields = {
+        'pdu': 'resolve_pdu',
+        'connected_device': 'resolve_device',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pdus = KeyMap(lambda: PDU.objects.values_list('name', 'pk'))
+        self.devices = KeyMap(lambda: Device.objects.exclude(name__isnull=True).values_list('name', 'pk'))
+        self._pdu_names = {}
+
+    def resolve_pdu(self, value, values):
+        pk = self.pdus.resolve(value, "PDU", value)
+        self._pdu_names[pk] = value
+        return pk
+
+    def resolve_device(self, value, values):
+        return self.devices.resolve(value, "Device", value)
+
+    def get_existing(self, keys):
+        pdu_ids = {pdu_id for pdu_id, _ in keys}
+        numbers = {number for _, number in keys}
+        return {
+            (outlet.pdu_id, outlet.outlet_number): outlet
+            for outlet in Outlet.objects.filter(pdu_id__in=pdu_ids, outlet_number__in=numbers)
+            if (outlet.pdu_id, outlet.outlet_number) in keys
+        }
+
+    def get_search_text(self, instance):
+        return instance.get_search_text(pdu_name=self._pdu_names.get(instance.pdu_id))
+
+    def post_write(self, created, updated):
+        pdu_ids = {outlet.pdu_id for outlet in created}
+        pdu_ids.update(outlet.pdu_id for outlet in updated)
+        PDU.objects.filter(pk__in=pdu_ids).refresh_outlet_counters()
+        PDU.objects.filter(pk__in=pdu_ids).refresh_power_summaries()
+        # Updated outlets may have been connected to another device
+        devices = {outlet.connected_device_id for outlet in created}
+        devices.update(outlet.connected_device_id for outlet in updated)
+        devices.update(getattr(outlet, '_loaded_device_id', None) for outlet in updated)
+        DevicePowerDependency.objects.refresh(devices)
+
+
+IMPORTERS = {
+    'pdu': PDUImporter,
+    'outlet': OutletImporter,
+}
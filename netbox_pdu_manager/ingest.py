@@ -0,0 +1,326 @@
+"""
+Bulk ingest of outlet readings pushed by external collectors
+"""
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from .energy import accumulate_energy, get_settings as get_energy_settings
+from .history import copy_measurements, get_sample_window, prepare_partitions
+from .livefeed import publish_outlets
+from .models import PDU, Outlet, OutletMeasurement, TELEMETRY_FIELDS, telemetry_updated
+
+__all__ = (
+    'IngestResult',
+    'OutletKeyMap',
+    'ingest_records',
+    'iter_msgpack',
+    'iter_ndjson',
+)
+
+METRICS = ('voltage', 'current', 'power')
+
+# Maximum number of rejected records reported back individually
+MAX_REPORTED_ERRORS = 1000
+
+STAGING_TABLE = 'netbox_pdu_manager_ingest_staging'
+
+
+class OutletKeyMap:
+    """
+    In-memory map of (PDU name or ID, outlet number) to (outlet ID, PDU ID, outlet number), shared by
+    all requests in a process. It is reloaded on a miss, at most once per `max_age` seconds.
+    """
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._keys = {}
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        keys = {}
+        for pk, pdu_id, pdu_name, outlet_number in Outlet.objects.order_by().values_list(
+            'pk', 'pdu_id', 'pdu__name', 'outlet_number'
+        ):
+            keys[(pdu_name, outlet_number)] = keys[(pdu_id, outlet_number)] = (pk, pdu_id, outlet_number)
+        self._keys = keys
+        self._loaded = time.monotonic()
+
+    def get(self, pdu, outlet_number):
+        key = (pdu, outlet_number)
+        if key not in self._keys and time.monotonic() - self._loaded > self.max_age:
+            with self._lock:
+                if time.monotonic() - self._loaded > self.max_age:
+                    self.load()
+        return self._keys.get(key)
+
+
+outlet_keys = OutletKeyMap()
+
+
+class IngestResult:
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, record_number, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'record': record_number, 'error': error})
+
+    def serialize(self):
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'errors': self.errors,
+        }
+
+
+#
+# Parsing
+#
+
+def iter_ndjson(stream, chunk_size=1024 * 1024):
+    """
+    Incrementally parse an NDJSON byte stream. Yields (record_number, record) pairs,
+    where record is a ValueError for lines which are not valid JSON.
+    """
+    buffer = b''
+    number = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (buffer + chunk).split(b'\n')
+        buffer = lines.pop()
+        for line in lines:
+            if line.strip():
+                number += 1
+                yield number, _loads(line)
+    if buffer.strip():
+        yield number + 1, _loads(buffer)
+
+
+def _loads(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ValueError(f"Invalid JSON: {e}")
+
+
+def iter_msgpack(stream, chunk_size=1024 * 1024):
+    """Incrementally parse a stream of concatenated msgpack maps"""
+    try:
+        import msgpack
+    except ImportError:
+        raise ValueError("msgpack is not installed")
+    unpacker = msgpack.Unpacker(raw=False)
+    number = 0
+    while chunk := stream.read(chunk_size):
+        unpacker.feed(chunk)
+        for record in unpacker:
+            number += 1
+            yield number, record
+
+
+def _parse_timestamp(value, default):
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=dt_timezone.utc)
+    return ts
+
+
+def _parse_metric(value):
+    if value is None:
+        return None
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError("not a finite number")
+    return value
+
+
+def _validate(record, keys, now, window, permitted=None):
+    """
+    Return an (outlet_id, pdu_id, outlet_number, ts, voltage, current, power) row for a
+    record. `ts` must be within the `window` of retained raw samples, and the outlet in
+    `permitted` (a set of outlet IDs) unless it is None.
+    """
+    if isinstance(record, Exception):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Record must be an object")
+    pdu, outlet_number = record.get('pdu'), record.get('outlet_number')
+    if pdu is None or outlet_number is None:
+        raise ValueError("pdu and outlet_number are required")
+    # Keys must be hashable scalars: a PDU name or ID, and an outlet number
+    if isinstance(pdu, bool) or not isinstance(pdu, (str, int)):
+        raise ValueError(f"Invalid pdu: {pdu!r}")
+    if isinstance(outlet_number, bool) or not isinstance(outlet_number, int):
+        raise ValueError(f"Invalid outlet_number: {outlet_number!r}")
+    key = keys.get(pdu, outlet_number)
+    if key is None:
+        raise ValueError(f"Unknown outlet {pdu}:{outlet_number}")
+    if permitted is not None and key[0] not in permitted:
+        raise ValueError(f"Not permitted to change outlet {pdu}:{outlet_number}")
+    try:
+        ts = _parse_timestamp(record.get('ts'), now)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid ts: {record.get('ts')!r}")
+    if not window[0] <= ts < window[1]:
+        raise ValueError(f"ts {ts.isoformat()} is outside the retained window")
+    values = []
+    for metric in METRICS:
+        try:
+            values.append(_parse_metric(record.get(metric)))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {metric}: {record.get(metric)!r}")
+    return (*key, ts, *values)
+
+
+#
+# Writing
+#
+
+def _write_batch_postgresql(rows, deadband, history):
+    """
+    COPY a batch into a staging table, then apply it with set-based statements. The
+    updated outlets get the same follow-up as OutletQuerySet.update_telemetry(): power
+    summaries, the live feed and telemetry_updated.
+    """
+    with connection.cursor() as cursor:
+        if history:
+            prepare_partitions({row[3] for row in rows})
+        copy_measurements(
+            cursor, STAGING_TABLE,
+            ((outlet_id, ts, voltage, current, power) for outlet_id, _, _, ts, voltage, current, power in rows),
+            insert=history
+        )
+
+        # Apply the latest reading per outlet if it is newer, writing only the
+        # measurements which moved beyond the deadband
+        conditions, assignments, params = [], [], []
+        for metric, field in TELEMETRY_FIELDS.items():
+            column = connection.ops.quote_name(metric)
+            condition = (
+                f"(s.{column} IS DISTINCT FROM o.{field} AND "
+                f"(s.{column} IS NULL OR o.{field} IS NULL OR abs(s.{column} - o.{field}) > %s))"
+            )
+            conditions.append(condition)
+            assignments.append(f"{field} = CASE WHEN {condition} THEN s.{column} ELSE o.{field} END")
+            params.append(deadband.get(metric, 0))
+        cursor.execute(
+            f"UPDATE {Outlet._meta.db_table} o SET {', '.join(assignments)}, last_update = s.ts "
+            f"FROM (SELECT DISTINCT ON (outlet_id) * FROM {STAGING_TABLE} ORDER BY outlet_id, ts DESC) s "
+            f"WHERE o.id = s.outlet_id AND (o.last_update IS NULL OR o.last_update <= s.ts) "
+            f"AND ({' OR '.join(conditions)}) "
+            f"RETURNING o.id, o.pdu_id, o.status, o.last_measured_power",
+            params * 2
+        )
+        changed = [
+            Outlet(pk=pk, pdu_id=pdu_id, status=status, last_measured_power=power)
+            for pk, pdu_id, status, power in cursor.fetchall()
+        ]
+
+    # Ingest does not write the status, so the outlet counters stay as they are
+    publish_outlets(changed)
+    if changed:
+        changed_pdus = {outlet.pdu_id for outlet in changed}
+        PDU.objects.filter(pk__in=changed_pdus).refresh_power_summaries()
+        telemetry_updated.send(sender=Outlet, pdu_ids=changed_pdus)
+
+
+def _write_batch_generic(rows, deadband, history):
+    """Apply a batch using bulk_create() and the telemetry write path"""
+    if history:
+        prepare_partitions({row[3] for row in rows})
+        OutletMeasurement.objects.bulk_create([
+            OutletMeasurement(outlet_id=outlet_id, timestamp=ts, voltage=voltage, current=current, power=power)
+            for outlet_id, _, _, ts, voltage, current, power in rows
+        ], batch_size=5000)
+
+    latest = {}
+    for row in rows:
+        if row[0] not in latest or latest[row[0]][3] <= row[3]:
+            latest[row[0]] = row
+    readings = defaultdict(dict)
+    for _, pdu_id, outlet_number, ts, *values in latest.values():
+        readings[ts][(pdu_id, outlet_number)] = dict(zip(METRICS, values))
+    for ts, ts_readings in readings.items():
+        Outlet.objects.exclude(last_update__gt=ts).update_telemetry(ts_readings, timestamp=ts, deadband=deadband)
+
+
+def write_batch(rows, deadband=None, history=None):
+    """Write a batch of validated rows in a single transaction"""
+    if deadband is None:
+        deadband = get_plugin_config('netbox_pdu_manager', 'telemetry_deadband')
+    if history is None:
+        history = get_plugin_config('netbox_pdu_manager', 'measurement_history')
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            _write_batch_postgresql(rows, deadband, history)
+        else:
+            _write_batch_generic(rows, deadband, history)
+        # Freshness is kept per PDU, so stable readings write no outlet rows
+        synced = {}
+        for _, pdu_id, _, ts, *_ in rows:
+            synced[pdu_id] = max(ts, synced.get(pdu_id, ts))
+        by_timestamp = defaultdict(list)
+        for pdu_id, ts in synced.items():
+            by_timestamp[ts].append(pdu_id)
+        for ts, pdu_ids in by_timestamp.items():
+            PDU.objects.filter(pk__in=pdu_ids).mark_synced(ts)
+        if get_energy_settings()['enabled']:
+            accumulate_energy([
+                (pdu_id, outlet_number, ts, power) for _, pdu_id, outlet_number, ts, _, _, power in rows
+            ])
+
+
+def ingest_records(records, batch_size=10000, keys=None, permitted=None):
+    """
+    Validate and store a stream of (record_number, record) pairs in batches.
+    Invalid records, and records for outlets not in `permitted` (a set of outlet IDs,
+    default: all), are rejected individually without aborting the batch.
+    Returns an IngestResult.
+    """
+    keys = keys or outlet_keys
+    result = IngestResult()
+    now = timezone.now()
+    window = get_sample_window(now)
+    batch, numbers = [], []
+
+    def flush():
+        try:
+            write_batch(batch)
+            result.accepted += len(batch)
+        except DatabaseError as e:
+            for number in numbers:
+                result.reject(number, f"Batch failed: {e}")
+        batch.clear()
+        numbers.clear()
+
+    for number, record in records:
+        try:
+            batch.append(_validate(record, keys, now, window, permitted))
+            numbers.append(number)
+        except ValueError as e:
+            result.reject(number, str(e))
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    return result
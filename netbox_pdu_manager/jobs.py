@@ -0,0 +1,158 @@
+import os
+import time
+
+from netbox.jobs import JobRunner
+from netbox.plugins import get_plugin_config
+
+from . import history, metrics
+from .collector import run_sweep
+from .discovery import run_discovery
+from .energy import close_periods
+from .importer import IMPORTERS, iter_csv
+from .models import Outlet
+from .scheduler import run_scheduled
+from .sharding import get_live_workers
+from .switching import SwitchResult, switch_outlets
+
+
+class PDUSyncJob(JobRunner):
+    """
+    Poll all PDUs with an API URL (or, with adaptive_polling, those which are due)
+    and store their outlet readings. Registered as a system job when enable_api_sync is set.
+    Skipped while pdu_collector workers are live, as they own the PDUs.
+    """
+    class Meta:
+        name = 'PDU API Sync'
+
+    def run(self, *args, **kwargs):
+        workers = get_live_workers()
+        if workers:
+            self.job.data = {'skipped': True, 'workers': workers}
+            self.logger.info(f"Skipped: {len(workers)} collector workers are polling the PDUs")
+            return
+        if get_plugin_config('netbox_pdu_manager', 'adaptive_polling'):
+            summary = run_scheduled()
+        else:
+            summary = run_sweep()
+        self.job.data = summary
+        self.logger.info(
+            f"Polled {summary['succeeded']}/{summary['pdus']} PDUs and updated "
+            f"{summary['outlets_updated']} outlets in {summary['poll_seconds'] + summary['write_seconds']:.1f}s"
+        )
+
+
+class MeasurementMaintenanceJob(JobRunner):
+    """
+    Maintain the measurement history: create upcoming partitions, roll up completed
+    windows, compact them into blocks (with measurement_blocks) and apply retention.
+    Registered as a system job when measurement_history is set.
+    """
+    class Meta:
+        name = 'PDU Measurement Maintenance'
+
+    def run(self, *args, **kwargs):
+        history.ensure_partitions()
+        windows = history.rollup()
+        if history.get_block_settings()['enabled']:
+            windows['blocks'] = history.compact_blocks()
+        purged = history.purge_expired()
+        self.job.data = {'windows': windows, 'purged': purged}
+
+
+class EnergyPeriodJob(JobRunner):
+    """
+    Close the billing periods which have ended, including those of outlets without
+    recent readings. Registered as a system job when energy accounting is enabled.
+    """
+    class Meta:
+        name = 'PDU Energy Periods'
+
+    def run(self, *args, **kwargs):
+        self.job.data = {'closed': close_periods()}
+
+
+class MetricsRebuildJob(JobRunner):
+    """
+    Render the metrics of every PDU again and rebuild the snapshot. Enqueued when the
+    cache has lost the rendered series.
+    """
+    class Meta:
+        name = 'PDU Metrics Rebuild'
+
+    def run(self, *args, **kwargs):
+        pdus = metrics.rebuild()
+        self.job.data = {'pdus': pdus}
+        self.logger.info(f"Rendered the metrics of {pdus} PDUs")
+
+
+class CSVImportJob(JobRunner):
+    """
+    Import an uploaded CSV file of PDUs or outlets with the streaming importer, with the
+    object permissions of the user who queued it. Progress and rejected rows are reported
+    in the job data; the file is removed afterwards.
+    """
+    class Meta:
+        name = 'PDU Manager CSV Import'
+
+    def run(self, path, model, update_existing=True, *args, **kwargs):
+        # The object permissions of the user who queued the import apply
+        importer = IMPORTERS[model](update_existing=update_existing, user=self.job.user)
+
+        def progress(result):
+            self.job.data = result.serialize()
+            self.job.save(update_fields=['data'])
+
+        try:
+            with open(path, 'rb') as f:
+                result = importer.run(iter_csv(f), progress=progress)
+        finally:
+            os.remove(path)
+        progress(result)
+        self.logger.info(
+            f"Imported {result.rows} rows: {result.created} created, {result.updated} updated, "
+            f"{result.rejected} rejected"
+        )
+
+
+class OutletSwitchJob(JobRunner):
+    """
+    Switch outlets on, off or power cycle them with the bulk switching engine.
+    Progress and failed outlets are reported in the job data as results arrive.
+    """
+    class Meta:
+        name = 'PDU Outlet Switching'
+
+    def run(self, outlets, action, *args, **kwargs):
+        result = SwitchResult()
+        saved = time.monotonic()
+        for item in switch_outlets(Outlet.objects.filter(pk__in=outlets), action):
+            result.add(item)
+            if not item['ok']:
+                self.logger.warning(f"Outlet {item['outlet']}: {item['error']}")
+            if time.monotonic() - saved >= 1:
+                self.job.data = result.serialize()
+                self.job.save(update_fields=['data'])
+                saved = time.monotonic()
+        self.job.data = result.serialize()
+        self.logger.info(f"Switched {result.succeeded}/{result.outlets} outlets {action} ({result.failed} failed)")
+
+
+class PDUDiscoveryJob(JobRunner):
+    """
+    Read the inventory of PDUs and reconcile the stored PDUs and outlets with it.
+    The reconciliation report is stored in the job data.
+    """
+    class Meta:
+        name = 'PDU Discovery'
+
+    def run(self, pdus=None, dry_run=False, *args, **kwargs):
+        result = run_discovery(pdu_ids=pdus, dry_run=dry_run)
+        self.job.data = result.serialize(limit=1000)
+        for error in result.errors[:100]:
+            self.logger.warning(f"PDU {error['pdu']}: {error['error']}")
+        verb = "Would correct" if dry_run else "Corrected"
+        self.logger.info(
+            f"Discovered {result.discovered}/{result.pdus} PDUs. {verb} {result.pdus_changed} PDUs: "
+            f"{result.outlets_updated} outlets updated, {result.outlets_created} created, "
+            f"{result.outlets_extra} extra"
+        )
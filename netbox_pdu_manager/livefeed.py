@@ -0,0 +1,217 @@
+"""
+Change feed of live outlet state for the PDU detail page
+
+Writers (telemetry updates, outlet edits and counter refreshes) publish the outlet
+rows and counters which changed as numbered events in the Django cache, but only for
+PDUs which someone is watching. Viewers poll PDULiveView every few seconds for the
+events since the last one they received; it reads the cache and answers at once. A
+viewer's permission on a PDU is cached too, so polls do not query the database. Cache
+reads are shared by all viewers of a PDU in a process, so the cost of a PDU's feed does
+not grow with the number of viewers.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .choices import OutletStatusChoices
+
+__all__ = (
+    'FeedReader',
+    'allow',
+    'get_feed_reader',
+    'get_sequence',
+    'is_allowed',
+    'poll',
+    'publish',
+    'publish_counters',
+    'publish_outlets',
+    'watch',
+)
+
+SEQUENCE_KEY = 'netbox_pdu_manager:feed:{}:seq'
+EVENT_KEY = 'netbox_pdu_manager:feed:{}:{}'
+WATCH_KEY = 'netbox_pdu_manager:feed:{}:watch'
+ALLOW_KEY = 'netbox_pdu_manager:feed:{}:user:{}'
+
+STATUS_LABELS = {value: label for value, label, *_ in OutletStatusChoices.CHOICES}
+
+
+def get_settings():
+    return {
+        **config.default_settings['live_updates'],
+        **get_plugin_config('netbox_pdu_manager', 'live_updates'),
+    }
+
+
+def serialize_outlet(outlet, deleted=False):
+    """Return the live fields of an Outlet as shown on the PDU page"""
+    if deleted:
+        return {'id': outlet.pk, 'deleted': True}
+    return {
+        'id': outlet.pk,
+        'status': outlet.status,
+        'status_label': STATUS_LABELS.get(outlet.status, outlet.status),
+        'status_color': OutletStatusChoices.colors.get(outlet.status),
+        'power': outlet.last_measured_power,
+    }
+
+
+def _watched(pdu_ids):
+    found = cache.get_many([WATCH_KEY.format(pk) for pk in pdu_ids])
+    return [pk for pk in pdu_ids if WATCH_KEY.format(pk) in found]
+
+
+def _publish(changes, retention):
+    for pdu_id in _watched(list(changes)):
+        key = SEQUENCE_KEY.format(pdu_id)
+        cache.add(key, 0, timeout=None)
+        try:
+            seq = cache.incr(key)
+        except ValueError:
+            # The sequence was evicted in between; viewers resynchronize on the next read
+            cache.set(key, seq := 1, timeout=None)
+        cache.set(EVENT_KEY.format(pdu_id, seq), changes[pdu_id], timeout=retention)
+
+
+def publish(changes):
+    """
+    Publish changes to the feeds of watched PDUs once the current transaction commits.
+    `changes` maps a PDU ID to a dict with the changed `outlets` (a list of serialized
+    outlets) and/or its new `stats`.
+    """
+    settings = get_settings()
+    if not settings['enabled'] or not changes:
+        return
+    transaction.on_commit(lambda: _publish(changes, settings['retention']))
+
+
+def publish_outlets(outlets, deleted=False):
+    changes = {}
+    for outlet in outlets:
+        changes.setdefault(outlet.pdu_id, {'outlets': []})['outlets'].append(serialize_outlet(outlet, deleted))
+    publish(changes)
+
+
+def publish_counters(counters):
+    """Publish the outlet counters of PDUs, as a map of PDU ID to outlet_stats"""
+    publish({pdu_id: {'stats': stats} for pdu_id, stats in counters.items()})
+
+
+def watch(pdu_id):
+    """
+    Ask writers to publish the changes of a PDU for as long as its events are retained,
+    and return the number of the latest event of its feed (0 if none)
+    """
+    cache.set(WATCH_KEY.format(pdu_id), True, timeout=get_settings()['retention'])
+    return get_sequence(pdu_id)
+
+
+def allow(pdu_id, user_id):
+    """
+    Record that a user may view a PDU's feed, for the retention period. A permission
+    revoked meanwhile therefore takes effect on the feed within `retention` seconds.
+    """
+    cache.set(ALLOW_KEY.format(pdu_id, user_id), True, timeout=get_settings()['retention'])
+
+
+def is_allowed(pdu_id, user_id):
+    """Return True if allow() was recorded for the user and PDU within the retention period"""
+    return cache.get(ALLOW_KEY.format(pdu_id, user_id)) is not None
+
+
+def get_sequence(pdu_id):
+    """Return the number of the latest event of a PDU's feed (0 if none)"""
+    return cache.get(SEQUENCE_KEY.format(pdu_id)) or 0
+
+
+def merge_events(events):
+    """Merge consecutive events into one delta: the latest state of each outlet and the latest counters"""
+    outlets, stats = {}, None
+    for event in events:
+        for outlet in event.get('outlets', ()):
+            outlets[outlet['id']] = outlet
+        stats = event.get('stats', stats)
+    delta = {'outlets': list(outlets.values())}
+    if stats is not None:
+        delta['stats'] = stats
+    return delta
+
+
+class FeedReader:
+    """
+    Reads the feeds of PDUs from the cache on behalf of all viewers in a process. Each
+    feed is read at most once per `poll_interval`, and the events read are kept for
+    viewers which are further behind.
+    """
+    def __init__(self, poll_interval=1.0, max_backlog=100):
+        self.poll_interval = poll_interval
+        self.max_backlog = max_backlog
+        self._feeds = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self, pdu_id):
+        checked, seq, events = self._feeds.get(pdu_id, (0, 0, {}))
+        if time.monotonic() - checked < self.poll_interval:
+            return seq, events
+        latest = get_sequence(pdu_id)
+        if latest < seq:
+            # The sequence restarted (e.g. the cache was cleared)
+            events = {}
+        wanted = range(max(seq, latest - self.max_backlog) + 1, latest + 1)
+        if wanted:
+            found = cache.get_many([EVENT_KEY.format(pdu_id, number) for number in wanted])
+            events = {
+                number: event for number, event in events.items() if number > latest - self.max_backlog
+            }
+            for number in wanted:
+                event = found.get(EVENT_KEY.format(pdu_id, number))
+                if event is not None:
+                    events[number] = event
+        self._feeds[pdu_id] = (time.monotonic(), latest, events)
+        return latest, events
+
+    def read(self, pdu_id, after):
+        """
+        Return the latest sequence number of a PDU's feed and the merged delta of the events
+        after `after`: None if there are none, or False if some have expired and the viewer
+        must reload.
+        """
+        with self._lock:
+            seq, events = self._refresh(pdu_id)
+        if seq < after:
+            # The sequence restarted
+            return seq, False
+        if seq == after:
+            return seq, None
+        if any(number not in events for number in range(after + 1, seq + 1)):
+            return seq, False
+        return seq, merge_events(events[number] for number in range(after + 1, seq + 1))
+
+
+_feed_reader = None
+
+
+def get_feed_reader():
+    """Return the process-wide FeedReader"""
+    global _feed_reader
+    if _feed_reader is None:
+        settings = get_settings()
+        _feed_reader = FeedReader(poll_interval=settings['poll_interval'], max_backlog=settings['max_backlog'])
+    return _feed_reader
+
+
+def poll(pdu_id, after):
+    """
+    Renew the watch on a PDU and return its feed after event `after`: the number of the
+    latest event (`seq`) and either the merged `delta` of the events since (None if there
+    are none) or `reset` if some have expired and the viewer must reload
+    """
+    watch(pdu_id)
+    seq, delta = get_feed_reader().read(pdu_id, after)
+    if delta is False:
+        return {'seq': seq, 'reset': True}
+    return {'seq': seq, 'delta': delta}
@@ -0,0 +1,59 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.sharding import Worker
+
+
+class Command(BaseCommand):
+    help = "Run a sharded collector worker which polls its share of the due PDUs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--name',
+            help="Unique worker name (default: hostname:pid)"
+        )
+        parser.add_argument(
+            '--limit', type=int,
+            help="Poll at most this many due PDUs per pass"
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            help="Maximum number of PDUs polled at once (default: sync_concurrency)"
+        )
+        parser.add_argument(
+            '--timeout', type=float,
+            help="Per-request timeout in seconds (default: sync_timeout)"
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help="Seconds to sleep after a pass with nothing due (default: 1)"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Run a single pass and exit"
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            name=options['name'],
+            limit=options['limit'],
+            concurrency=options['concurrency'],
+            timeout=options['timeout'],
+        )
+        if options['once']:
+            try:
+                summary = worker.run_once()
+            finally:
+                worker.deregister()
+            self.stdout.write(
+                f"Polled {summary['succeeded']}/{summary['pdus']} PDUs ({summary['failed']} failed), "
+                f"{summary['backlog']} still due"
+            )
+            return
+
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        self.stdout.write(f"Collector worker {worker.name} started")
+        worker.run(interval=options['interval'])
+        self.stdout.write(f"Collector worker {worker.name} stopped after {worker.polled} polls")
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.discovery import run_discovery
+
+
+class Command(BaseCommand):
+    help = "Read the inventory of PDUs through the Raritan JSON-RPC API and reconcile the stored PDUs and outlets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdu', type=int, action='append', dest='pdu_ids',
+            help="Discover only the PDU with this ID (may be repeated)"
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            help="Maximum number of PDUs queried at once (default: sync_concurrency)"
+        )
+        parser.add_argument(
+            '--timeout', type=float,
+            help="Per-request timeout in seconds (default: sync_timeout)"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report the differences without correcting them"
+        )
+        parser.add_argument(
+            '--verbose-changes', action='store_true',
+            help="Print the differences found on each PDU"
+        )
+
+    def handle(self, *args, **options):
+        result = run_discovery(
+            pdu_ids=options['pdu_ids'],
+            dry_run=options['dry_run'],
+            concurrency=options['concurrency'],
+            timeout=options['timeout'],
+        )
+        if options['verbose_changes']:
+            for change in result.changes:
+                fields = ', '.join(f"{field} {old!r} -> {new!r}" for field, (old, new) in change['fields'].items())
+                outlets = change['outlets']
+                self.stdout.write(
+                    f"{change['name']}: {fields or 'no field changes'}; {len(outlets['updated'])} outlets updated, "
+                    f"{len(outlets['created'])} missing, {len(outlets['extra'])} extra"
+                )
+        for error in result.errors:
+            self.stderr.write(f"PDU {error['pdu']}: {error['error']}")
+
+        verb = "Would correct" if result.dry_run else "Corrected"
+        self.stdout.write(
+            f"Discovered {result.discovered}/{result.pdus} PDUs ({result.failed} failed). {verb} "
+            f"{result.pdus_changed} PDUs: {result.outlets_updated} outlets updated, "
+            f"{result.outlets_created} created, {result.outlets_extra} extra "
+            f"(discover {result.timings['discover']:.1f}s, reconcile {result.timings['reconcile']:.1f}s)"
+        )
@@ -0,0 +1,45 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_pdu_manager import energy
+from netbox_pdu_manager.choices import EnergyScopeChoices
+
+
+class Command(BaseCommand):
+    help = "Close ended billing periods and print the outlet energy report of a period as CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--close', action='store_true',
+            help="Close the periods which have ended before reporting"
+        )
+        parser.add_argument(
+            '--period',
+            help="Billing period as YYYY-MM (default: the current period)"
+        )
+        parser.add_argument(
+            '--scope', choices=EnergyScopeChoices.values(), default=EnergyScopeChoices.SCOPE_TENANT,
+            help="Report energy by tenant, device, outlet, pdu, rack or site (default: tenant)"
+        )
+
+    def handle(self, *args, **options):
+        period_start = None
+        if options['period']:
+            try:
+                period_start = energy.parse_period(options['period'])
+            except ValueError:
+                raise CommandError("Enter the period as YYYY-MM.")
+        if options['close']:
+            closed = energy.close_periods()
+            self.stderr.write(f"Closed {closed} outlet period(s)")
+
+        report = energy.get_energy_report(scope=options['scope'], period_start=period_start)
+        writer = csv.writer(self.stdout, lineterminator='\n')
+        writer.writerow((options['scope'], 'name', 'energy_kwh', 'outlets', 'metered_hours'))
+        for row in report.rows:
+            writer.writerow((row['id'], row['name'], row['energy'], row['outlets'], row['metered_hours']))
+        self.stderr.write(
+            f"{report.period_start:%Y-%m} ({'closed' if report.closed else 'open'}): "
+            f"{sum(row['energy'] for row in report.rows):.3f} kWh"
+        )
@@ -0,0 +1,97 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from dcim.models import Device
+from netbox_pdu_manager.choices import OutletStatusChoices
+from netbox_pdu_manager.filtersets import OutletFilterSet
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.models import PDU, Outlet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Check that the hot outlet filters are served by indexes rather than sequential scans"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdus', type=int, default=2000,
+            help="Number of PDUs to generate (default: 2000)"
+        )
+        parser.add_argument(
+            '--outlets', type=int, default=48,
+            help="Outlets per generated PDU (default: 48)"
+        )
+        parser.add_argument(
+            '--existing', action='store_true',
+            help="Check plans against existing data instead of generating a dataset"
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help="Print the full plan of each query"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("This check requires PostgreSQL.")
+        # Generated data is always rolled back
+        try:
+            with transaction.atomic():
+                if not options['existing']:
+                    generate_dataset(options['pdus'], options['outlets'])
+                with connection.cursor() as cursor:
+                    cursor.execute(f'ANALYZE {PDU._meta.db_table}')
+                    cursor.execute(f'ANALYZE {Outlet._meta.db_table}')
+                failures = self.check_plans(options['verbose_plans'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"Sequential scan on {Outlet._meta.db_table} for: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All outlet filters use an index"))
+
+    def get_filters(self):
+        pdu = PDU.objects.order_by('pk').first()
+        if pdu is None:
+            raise CommandError("No PDUs found.")
+        filters = {
+            'pdu_id': {'pdu_id': [pdu.pk]},
+            'pdu_id + status': {'pdu_id': [pdu.pk], 'status': [OutletStatusChoices.STATUS_OFF]},
+            'status (rare)': {'status': [OutletStatusChoices.STATUS_ERROR]},
+            'has_connected_device': {'has_connected_device': True},
+        }
+        device = Device.objects.order_by('pk').first()
+        if device is not None:
+            filters['connected_device_id'] = {'connected_device_id': [device.pk]}
+        return filters
+
+    def check_plans(self, verbose=False):
+        failures = []
+        for label, params in self.get_filters().items():
+            filterset = OutletFilterSet(params, Outlet.objects.all())
+            if not filterset.is_valid():
+                raise CommandError(f"Invalid filter {label}: {filterset.errors}")
+            queryset = filterset.qs.order_by().values('pk')
+            plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+            scans = list(self.get_scans(plan))
+            if any(node_type == 'Seq Scan' for node_type, _ in scans):
+                failures.append(label)
+                style = self.style.ERROR
+            else:
+                style = self.style.SUCCESS
+            self.stdout.write(style(f"{label}: {', '.join(f'{t} ({i})' for t, i in scans) or 'no scans'}"))
+            if verbose:
+                self.stdout.write(queryset.explain())
+        return failures
+
+    def get_scans(self, plan):
+        """Yield (node type, index name) for every scan of the outlet table in a plan"""
+        if plan.get('Relation Name') == Outlet._meta.db_table:
+            yield plan['Node Type'], plan.get('Index Name', '-')
+        for child in plan.get('Plans', []):
+            yield from self.get_scans(child)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager import history
+
+
+class Command(BaseCommand):
+    help = "Maintain outlet measurement history (partitions, rollups, blocks and retention)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-windows', type=int, default=1440,
+            help="Maximum number of windows rolled up per tier or compacted (default: 1440)"
+        )
+        parser.add_argument(
+            '--no-purge', action='store_true',
+            help="Do not apply retention periods"
+        )
+
+    def handle(self, *args, **options):
+        history.ensure_partitions()
+        for tier in history.TIERS:
+            windows = history.rollup_tier(tier, max_windows=options['max_windows'])
+            self.stdout.write(f"Rolled up {windows} window(s) into tier {tier}")
+        if history.get_block_settings()['enabled']:
+            windows = history.compact_blocks(max_windows=options['max_windows'])
+            self.stdout.write(f"Compacted {windows} window(s) into blocks")
+        if not options['no_purge']:
+            deleted = history.purge_expired()
+            self.stdout.write(f"Purged {deleted} expired rollup row(s) and block(s)")
@@ -0,0 +1,59 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.importer import IMPORTERS, iter_csv
+
+
+class Command(BaseCommand):
+    help = "Import PDUs or outlets from a CSV file with the streaming importer"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model', choices=sorted(IMPORTERS),
+            help="Type of object to import"
+        )
+        parser.add_argument(
+            'path',
+            help="Path of the CSV file"
+        )
+        parser.add_argument(
+            '--no-update', action='store_true',
+            help="Reject rows for objects which already exist instead of updating them"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of rows validated and written per transaction (default: 1000)"
+        )
+        parser.add_argument(
+            '--errors',
+            help="Write the rejected rows to this file as JSON"
+        )
+
+    def handle(self, *args, **options):
+        importer = IMPORTERS[options['model']](
+            update_existing=not options['no_update'],
+            batch_size=options['batch_size'],
+        )
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{result.rows} rows ({result.rows / elapsed:.0f}/s): {result.created} created, "
+                f"{result.updated} updated, {result.rejected} rejected"
+            )
+
+        with open(options['path'], 'rb') as f:
+            result = importer.run(iter_csv(f), progress=progress)
+
+        if options['errors']:
+            with open(options['errors'], 'w') as f:
+                json.dump(result.errors, f, indent=2)
+        for error in result.errors[:20]:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(
+            f"Imported {result.rows} rows in {time.perf_counter() - started:.1f}s: {result.created} created, "
+            f"{result.updated} updated, {result.rejected} rejected"
+        )
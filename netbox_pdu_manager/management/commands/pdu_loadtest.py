@@ -0,0 +1,158 @@
+import math
+import multiprocessing
+import socket
+import time
+
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from netbox_pdu_manager.collector import collect_readings, get_pollable_pdus, get_session_stats, store_readings
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.management.commands.pdu_simulator import Command as SimulatorCommand
+from netbox_pdu_manager.simulator import get_url, run_simulator
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of `values`"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Command(SimulatorCommand):
+    help = (
+        "Load test the collector against simulated PDUs: creates matching PDUs and outlets, runs sweeps "
+        "and reports sweep time, poll latency and database write rate. Generated data is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.set_defaults(pdus=1000, port=18080, ports=64)
+        parser.add_argument(
+            '--sweeps', type=int, default=3,
+            help="Number of sweeps (default: 3)"
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0.0,
+            help="Seconds to wait between sweeps (default: 0)"
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            help="PDUs polled at once (default: sync_concurrency)"
+        )
+        parser.add_argument(
+            '--timeout', type=int,
+            help="Per-request timeout in seconds (default: sync_timeout)"
+        )
+        parser.add_argument(
+            '--external', action='store_true',
+            help="Poll a running pdu_simulator at --host/--port started with the same fleet and --ports "
+                 "options instead of starting one"
+        )
+        parser.add_argument(
+            '--prefix', default='loadtest',
+            help="Name prefix of the generated PDUs (default: loadtest)"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("This load test requires PostgreSQL.")
+        fleet = self.get_fleet(options)
+        simulator = None if options['external'] else self.start_simulator(fleet, options)
+        # Generated data is always rolled back
+        try:
+            with transaction.atomic():
+                self.run(fleet, options)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            if simulator is not None:
+                simulator.terminate()
+                simulator.join()
+
+    def start_simulator(self, fleet, options):
+        """Serve the fleet from a forked process, so that it does not compete with the collector for the GIL"""
+        connections.close_all()
+        process = multiprocessing.get_context('fork').Process(
+            target=run_simulator,
+            args=(fleet,),
+            kwargs=self.get_simulator_options(options),
+            daemon=True,
+        )
+        process.start()
+        last_port = options['port'] + options['ports'] - 1
+        for _ in range(100):
+            try:
+                socket.create_connection((options['host'], last_port), timeout=0.1).close()
+                return process
+            except OSError:
+                time.sleep(0.1)
+        process.terminate()
+        raise CommandError(f"The simulator did not start listening on {options['host']}:{options['port']}")
+
+    def run(self, fleet, options):
+        username, password = options['auth'].split(':', 1) if options['auth'] else ('', '')
+        created = generate_dataset(len(fleet), 0, prefix=options['prefix'], pdu_attrs=lambda i: {
+            'api_url': get_url(options['host'], options['port'], i, options['ports']),
+            'api_username': username,
+            'api_password_ref': password,
+            'outlet_count': fleet[i].outlet_count,
+            'phase_count': fleet[i].phase_count,
+        })
+        pdus = get_pollable_pdus([pdu.pk for pdu in created])
+        self.stdout.write(
+            f"Created {len(pdus)} PDUs with {sum(pdu.outlet_count for pdu in fleet)} outlets "
+            f"({sum(pdu.down for pdu in fleet)} down)"
+        )
+        history = get_plugin_config('netbox_pdu_manager', 'measurement_history')
+
+        sweeps = []
+        for number in range(1, options['sweeps'] + 1):
+            if number > 1 and options['interval']:
+                time.sleep(options['interval'])
+            timings = {}
+            started = time.perf_counter()
+            readings, errors = collect_readings(
+                pdus, concurrency=options['concurrency'], timeout=options['timeout'], timings=timings
+            )
+            polled = time.perf_counter()
+            changed = store_readings(readings, timezone.now())
+            written = time.perf_counter()
+
+            rows = len(changed) + (sum(len(r) for r in readings.values()) if history else 0)
+            latencies = [timings[pk] for pk in readings]
+            sweep = {
+                'seconds': written - started,
+                'write_seconds': written - polled,
+                'failed': len(errors),
+                'latencies': latencies,
+                'rows': rows,
+            }
+            sweeps.append(sweep)
+            self.stdout.write(
+                f"Sweep {number}: {len(readings)}/{len(pdus)} PDUs in {sweep['seconds']:.2f}s, "
+                f"latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms p99 "
+                f"{percentile(latencies, 0.99) * 1000:.0f} ms, {len(changed)} outlets and "
+                f"{rows - len(changed)} measurements written in {sweep['write_seconds']:.2f}s "
+                f"({rows / sweep['write_seconds']:.0f} rows/s)"
+            )
+
+        latencies = [latency for sweep in sweeps for latency in sweep['latencies']]
+        write_seconds = sum(sweep['write_seconds'] for sweep in sweeps)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{len(sweeps)} sweeps: mean {sum(sweep['seconds'] for sweep in sweeps) / len(sweeps):.2f}s, "
+            f"latency p50 {percentile(latencies, 0.5) * 1000:.0f} ms p99 {percentile(latencies, 0.99) * 1000:.0f} ms, "
+            f"{sum(sweep['failed'] for sweep in sweeps)} failed polls, "
+            f"{sum(sweep['rows'] for sweep in sweeps) / write_seconds:.0f} rows/s written"
+        ))
+        sessions = get_session_stats()
+        if sessions:
+            self.stdout.write(f"Sessions: {sessions}")
@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from netbox_pdu_manager.filtersets import OutletFilterSet, PDUFilterSet
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.models import PDU, Outlet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare quick search query plans (legacy icontains vs. trigram index) on a generated dataset"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdus', type=int, default=4000,
+            help="Number of PDUs to generate (default: 4000)"
+        )
+        parser.add_argument(
+            '--outlets', type=int, default=48,
+            help="Outlets per generated PDU (default: 48)"
+        )
+        parser.add_argument(
+            '--query', default='rack-0421',
+            help="Search term (default: rack-0421)"
+        )
+        parser.add_argument(
+            '--existing', action='store_true',
+            help="Benchmark against existing data instead of generating a dataset"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("This benchmark requires PostgreSQL.")
+        # Generated data is always rolled back
+        try:
+            with transaction.atomic():
+                if not options['existing']:
+                    self.generate(options['pdus'], options['outlets'])
+                self.benchmark(options['query'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def generate(self, pdu_count, outlet_count):
+        generate_dataset(pdu_count, outlet_count)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {PDU._meta.db_table}')
+            cursor.execute(f'ANALYZE {Outlet._meta.db_table}')
+        self.stdout.write(f"Generated {pdu_count} PDUs and {pdu_count * outlet_count} outlets")
+
+    def benchmark(self, value):
+        legacy_pdus = PDU.objects.filter(
+            Q(name__icontains=value) |
+            Q(manufacturer__icontains=value) |
+            Q(model__icontains=value) |
+            Q(serial_number__icontains=value) |
+            Q(description__icontains=value)
+        )
+        legacy_outlets = Outlet.objects.filter(
+            Q(name__icontains=value) |
+            Q(label__icontains=value) |
+            Q(description__icontains=value) |
+            Q(pdu__name__icontains=value)
+        )
+        queries = (
+            ('PDU (legacy)', legacy_pdus),
+            ('PDU (trigram)', PDUFilterSet({'q': value}, PDU.objects.all()).qs),
+            ('Outlet (legacy)', legacy_outlets),
+            ('Outlet (trigram)', OutletFilterSet({'q': value}, Outlet.objects.all()).qs),
+        )
+        for label, queryset in queries:
+            queryset = queryset.order_by().values('pk')
+            started = time.perf_counter()
+            count = len(queryset)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{label}: {count} rows in {elapsed:.1f} ms"))
+            self.stdout.write(queryset.explain(analyze=True, buffers=True))
+            self.stdout.write('')
@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_pdu_manager.simulator import build_fleet, run_simulator
+
+
+def int_list(value):
+    try:
+        return tuple(int(v) for v in value.split(','))
+    except ValueError:
+        raise CommandError(f"Invalid list of numbers: {value}")
+
+
+class Command(BaseCommand):
+    help = "Serve simulated Raritan PDUs for local testing of the collector"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdus', type=int, default=100,
+            help="Number of virtual PDUs (default: 100)"
+        )
+        parser.add_argument(
+            '--outlets', default='24',
+            help="Outlets per virtual PDU, or a comma-separated list to pick from at random (default: 24)"
+        )
+        parser.add_argument(
+            '--phases', default='1',
+            help="Phases per virtual PDU, or a comma-separated list to pick from at random (default: 1)"
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Seed of the fleet layout and readings; the same options build the same fleet (default: 0)"
+        )
+        parser.add_argument(
+            '--latency', type=float, default=0.0,
+            help="Delay added to every request in seconds (default: 0)"
+        )
+        parser.add_argument(
+            '--jitter', type=float, default=0.0,
+            help="Random extra delay of up to this multiple of --latency (default: 0)"
+        )
+        parser.add_argument(
+            '--error-rate', type=float, default=0.0,
+            help="Fraction of requests which fail with HTTP 500 (default: 0)"
+        )
+        parser.add_argument(
+            '--timeout-rate', type=float, default=0.0,
+            help="Fraction of requests which never complete (default: 0)"
+        )
+        parser.add_argument(
+            '--down-fraction', type=float, default=0.0,
+            help="Fraction of PDUs which do not respond at all (default: 0)"
+        )
+        parser.add_argument(
+            '--auth',
+            help="Require these credentials (USERNAME:PASSWORD) as basic auth or a session token"
+        )
+        parser.add_argument(
+            '--auth-latency', type=float, default=0.0,
+            help="Delay added to every password check in seconds (default: 0)"
+        )
+        parser.add_argument(
+            '--session-timeout', type=int, default=600,
+            help="Idle timeout of session tokens in seconds (default: 600)"
+        )
+        parser.add_argument(
+            '--host', default='127.0.0.1',
+            help="Address to listen on (default: 127.0.0.1)"
+        )
+        parser.add_argument(
+            '--port', type=int, default=8080,
+            help="Port to listen on (default: 8080)"
+        )
+        parser.add_argument(
+            '--ports', type=int, default=1,
+            help="Listen on this many consecutive ports, spreading the PDUs over them (default: 1)"
+        )
+
+    def get_fleet(self, options):
+        return build_fleet(
+            options['pdus'],
+            outlet_counts=int_list(options['outlets']),
+            phase_counts=int_list(options['phases']),
+            seed=options['seed'],
+            down_fraction=options['down_fraction'],
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            timeout_rate=options['timeout_rate'],
+        )
+
+    def get_simulator_options(self, options):
+        return {
+            'host': options['host'],
+            'port': options['port'],
+            'ports': options['ports'],
+            'credentials': options['auth'].split(':', 1) if options['auth'] else None,
+            'auth_latency': options['auth_latency'],
+            'session_timeout': options['session_timeout'],
+        }
+
+    def handle(self, *args, **options):
+        pdus = self.get_fleet(options)
+        last_port = options['port'] + options['ports'] - 1
+        self.stdout.write(
+            f"Serving {len(pdus)} PDUs at http://{options['host']}:<{options['port']}-{last_port}>/pdu/<n>/; "
+            f"PDU n is expected on port {options['port']} + n % {options['ports']}"
+        )
+        run_simulator(pdus, **self.get_simulator_options(options))
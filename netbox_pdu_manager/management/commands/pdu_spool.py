@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from netbox_pdu_manager.spool import get_spool, replay_spool
+
+
+class Command(BaseCommand):
+    help = "Show the readings spooled while the database was unavailable, and replay them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replay', action='store_true',
+            help="Replay the pending readings into the outlets and the measurement history"
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help="Number of readings replayed per transaction (default: replay_batch)"
+        )
+
+    def handle(self, *args, **options):
+        spool = get_spool()
+        if spool is None:
+            raise CommandError("The spool is not enabled")
+
+        if options['replay']:
+            summary = replay_spool(batch_size=options['batch_size'])
+            if summary is None:
+                raise CommandError("The spool is being replayed by another process")
+            self.stdout.write(
+                f"Replayed {summary['records']} readings: {summary['samples']} history samples, "
+                f"{summary['outlets_updated']} outlets updated"
+            )
+            if summary['error']:
+                raise CommandError(f"Replay stopped: {summary['error']}")
+
+        stats = spool.stats()
+        self.stdout.write(
+            f"{stats['path']}: {stats['pending']}/{stats['capacity']} readings pending, "
+            f"{stats['dropped']} dropped when full"
+        )
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.collector import run_sweep
+from netbox_pdu_manager.scheduler import run_scheduled
+
+
+class Command(BaseCommand):
+    help = "Poll PDUs through the Raritan JSON-RPC API and store outlet readings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdu', type=int, action='append', dest='pdu_ids',
+            help="Poll only the PDU with this ID (may be repeated)"
+        )
+        parser.add_argument(
+            '--concurrency', type=int,
+            help="Maximum number of PDUs polled at once (default: sync_concurrency)"
+        )
+        parser.add_argument(
+            '--timeout', type=float,
+            help="Per-request timeout in seconds (default: sync_timeout)"
+        )
+        parser.add_argument(
+            '--scheduled', action='store_true',
+            help="Poll only the PDUs which are due according to the adaptive scheduler, and reschedule them"
+        )
+        parser.add_argument(
+            '--limit', type=int,
+            help="With --scheduled, poll at most this many due PDUs"
+        )
+
+    def handle(self, *args, **options):
+        if options['scheduled']:
+            summary = run_scheduled(
+                limit=options['limit'],
+                concurrency=options['concurrency'],
+                timeout=options['timeout'],
+            )
+            self.stdout.write(f"Scheduler decisions: {summary['reasons']} ({summary['backlog']} PDUs still due)")
+        else:
+            summary = run_sweep(
+                pdu_ids=options['pdu_ids'],
+                concurrency=options['concurrency'],
+                timeout=options['timeout'],
+            )
+        self.stdout.write(
+            f"Polled {summary['succeeded']}/{summary['pdus']} PDUs ({summary['failed']} failed), "
+            f"updated {summary['outlets_updated']} outlets "
+            f"(poll {summary['poll_seconds']}s, write {summary['write_seconds']}s)"
+        )
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.models import PDU
+from netbox_pdu_manager.provisioning import get_drift, provision_outlets
+
+
+class Command(BaseCommand):
+    help = "Create the missing outlets of PDUs from their configured outlet count"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pdu', type=int, action='append', dest='pdu_ids',
+            help="Provision only the PDU with this ID (may be repeated)"
+        )
+        parser.add_argument(
+            '--site', action='append', dest='sites',
+            help="Provision only PDUs at the site with this slug (may be repeated)"
+        )
+        parser.add_argument(
+            '--no-template', action='store_true',
+            help="Create outlets with their number only, without the name, bank and phase template"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Approximate number of outlets created per transaction (default: 5000)"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Report the outlets which would be created without creating them"
+        )
+        parser.add_argument(
+            '--drift', action='store_true',
+            help="Only report PDUs whose actual outlet count differs from the configured count"
+        )
+
+    def handle(self, *args, **options):
+        pdus = PDU.objects.all()
+        if options['pdu_ids']:
+            pdus = pdus.filter(pk__in=options['pdu_ids'])
+        if options['sites']:
+            pdus = pdus.filter(site__slug__in=options['sites'])
+
+        if options['drift']:
+            count = 0
+            for pdu in get_drift(pdus).order_by('name').only('name', 'outlet_count', 'outlets_total'):
+                self.stdout.write(f"{pdu.name}: {pdu.outlets_total}/{pdu.outlet_count} outlets ({pdu.drift:+d})")
+                count += 1
+            self.stdout.write(f"{count} PDUs with outlet drift")
+            return
+
+        started = time.perf_counter()
+        result = provision_outlets(
+            pdus,
+            use_template=not options['no_template'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(
+            f"{verb} {result.created} outlets on {result.pdus} PDUs in {time.perf_counter() - started:.2f}s"
+        )
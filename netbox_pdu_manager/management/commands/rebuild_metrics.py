@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager import metrics
+
+
+class Command(BaseCommand):
+    help = "Render the Prometheus metrics of every PDU and rebuild the metrics snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Number of PDUs rendered per query (default: 500)"
+        )
+
+    def handle(self, *args, **options):
+        pdus = metrics.rebuild(batch_size=options['batch_size'])
+        snapshot = metrics.get_snapshot()
+        self.stdout.write(
+            f"Rendered metrics for {pdus} PDUs ({len(snapshot['body']) / 1024:.0f} KiB compressed)"
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.models import PDU
+
+
+class Command(BaseCommand):
+    help = "Recalculate the denormalized outlet counters of all PDUs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of PDUs recalculated per query (default: 1000)"
+        )
+
+    def handle(self, *args, **options):
+        pdu_ids = list(PDU.objects.order_by('pk').values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        for i in range(0, len(pdu_ids), batch_size):
+            PDU.objects.filter(pk__in=pdu_ids[i:i + batch_size]).refresh_outlet_counters()
+        self.stdout.write(f"Recalculated outlet counters for {len(pdu_ids)} PDUs")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.models import DevicePowerDependency, Outlet
+
+
+class Command(BaseCommand):
+    help = "Rebuild the power dependencies of all devices connected to outlets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of devices rebuilt per query (default: 1000)"
+        )
+
+    def handle(self, *args, **options):
+        # Include existing dependencies, so that those of devices no longer connected are removed
+        device_ids = sorted(
+            set(Outlet.objects.exclude(connected_device=None).values_list('connected_device_id', flat=True).distinct()) |
+            set(DevicePowerDependency.objects.values_list('pk', flat=True))
+        )
+        batch_size = options['batch_size']
+        for i in range(0, len(device_ids), batch_size):
+            DevicePowerDependency.objects.refresh(device_ids[i:i + batch_size])
+        self.stdout.write(f"Rebuilt power dependencies for {len(device_ids)} devices")
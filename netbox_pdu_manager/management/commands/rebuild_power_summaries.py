@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from netbox_pdu_manager.models import PDU, RackPowerSummary, SitePowerSummary, refresh_power_summaries
+
+
+class Command(BaseCommand):
+    help = "Recalculate the rack and site power capacity summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of racks or sites recalculated per query (default: 1000)"
+        )
+
+    def handle(self, *args, **options):
+        # Include existing summaries, so that those of racks and sites without PDUs are removed
+        rack_ids = sorted(
+            set(PDU.objects.exclude(rack=None).values_list('rack_id', flat=True).distinct()) |
+            set(RackPowerSummary.objects.values_list('pk', flat=True))
+        )
+        site_ids = sorted(
+            set(PDU.objects.values_list('site_id', flat=True).distinct()) |
+            set(SitePowerSummary.objects.values_list('pk', flat=True))
+        )
+        batch_size = options['batch_size']
+        # Racks first, as site summaries are built from them
+        for i in range(0, len(rack_ids), batch_size):
+            refresh_power_summaries(rack_ids=rack_ids[i:i + batch_size])
+        for i in range(0, len(site_ids), batch_size):
+            refresh_power_summaries(site_ids=site_ids[i:i + batch_size])
+        self.stdout.write(f"Recalculated power summaries for {len(rack_ids)} racks and {len(site_ids)} sites")
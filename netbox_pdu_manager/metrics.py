@@ -0,0 +1,285 @@
+"""
+Prometheus exporter for outlet and PDU telemetry
+
+The exposition text of each PDU is rendered when its outlets change and kept in the
+Django cache, one gzip member per metric family, so that a change only re-renders
+the PDUs it touches. The members of all PDUs are then concatenated (gzip allows
+several members in one stream) into a snapshot, which MetricsView serves as it is:
+a scrape costs one cache read, whatever the size of the fleet, and never queries
+the database. If the cache loses the series, every PDU is rendered again by a
+background job.
+"""
+import gzip
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .choices import OutletStatusChoices
+from .models import PDU, Outlet
+
+__all__ = (
+    'CONTENT_TYPE',
+    'build_snapshot',
+    'get_snapshot',
+    'rebuild',
+    'refresh_pdus',
+    'render_pdus',
+    'schedule_rebuild',
+)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+INDEX_KEY = 'netbox_pdu_manager:metrics:index'
+CHUNK_KEY = 'netbox_pdu_manager:metrics:pdu:{}'
+VERSION_KEY = 'netbox_pdu_manager:metrics:version'
+SNAPSHOT_KEY = 'netbox_pdu_manager:metrics:snapshot'
+LOCK_KEY = 'netbox_pdu_manager:metrics:lock'
+REBUILD_KEY = 'netbox_pdu_manager:metrics:rebuild'
+
+# Seconds after which a rebuild which has not completed may be scheduled again
+REBUILD_TIMEOUT = 600
+
+# Metric families as (name, type, help), in the order they are exposed
+OUTLET_METRICS = (
+    ('netbox_pdu_outlet_voltage_volts', 'gauge', "Last measured outlet voltage"),
+    ('netbox_pdu_outlet_current_amperes', 'gauge', "Last measured outlet current"),
+    ('netbox_pdu_outlet_power_watts', 'gauge', "Last measured outlet power"),
+    ('netbox_pdu_outlet_status', 'gauge', "Outlet status (1 for the current status)"),
+)
+PDU_METRICS = (
+    ('netbox_pdu_power_watts', 'gauge', "Total last measured power of the PDU's outlets"),
+    ('netbox_pdu_current_amperes', 'gauge', "Total last measured current of the PDU's outlets"),
+    ('netbox_pdu_rated_current_amperes', 'gauge', "Rated current of the PDU"),
+    ('netbox_pdu_rated_voltage_volts', 'gauge', "Rated voltage of the PDU"),
+    ('netbox_pdu_outlets', 'gauge', "Number of outlets of the PDU by status"),
+)
+FAMILIES = tuple(name for name, _, _ in OUTLET_METRICS + PDU_METRICS)
+
+# Outlet fields mapped to the metric family they are exposed as
+MEASUREMENTS = {
+    'last_measured_voltage': 'netbox_pdu_outlet_voltage_volts',
+    'last_measured_current': 'netbox_pdu_outlet_current_amperes',
+    'last_measured_power': 'netbox_pdu_outlet_power_watts',
+}
+
+# Family headers, compressed once
+HEADERS = {
+    name: gzip.compress(f'# HELP {name} {description}\n# TYPE {name} {kind}\n'.encode(), mtime=0)
+    for name, kind, description in OUTLET_METRICS + PDU_METRICS
+}
+
+_pending = threading.local()
+
+
+def get_settings():
+    return {
+        **config.default_settings['metrics'],
+        **get_plugin_config('netbox_pdu_manager', 'metrics'),
+    }
+
+
+def escape(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _value(value):
+    return repr(float(value))
+
+
+def render_pdus(pdu_ids, compress_level=1):
+    """
+    Render the series of the given PDUs (two queries). Returns a map of PDU ID to
+    {family: gzip member}, with an entry for every given PDU which exists.
+    """
+    pdus = {
+        pk: (name, site or '', rack or '', rated_current, rated_voltage)
+        for pk, name, site, rack, rated_current, rated_voltage in PDU.objects.filter(
+            pk__in=pdu_ids
+        ).values_list('pk', 'name', 'site__name', 'rack__name', 'rated_current', 'rated_voltage')
+    }
+    lines = {pk: {family: [] for family in FAMILIES} for pk in pdus}
+    totals = {pk: [0.0, 0.0, Counter()] for pk in pdus}
+
+    outlets = Outlet.objects.filter(pdu_id__in=pdus.keys()).order_by('pdu_id', 'outlet_number').values_list(
+        'pdu_id', 'outlet_number', 'status', 'connected_device__name', *MEASUREMENTS
+    )
+    for pdu_id, number, status, device, *measurements in outlets.iterator(chunk_size=2000):
+        name, site, rack = pdus[pdu_id][:3]
+        labels = (
+            f'pdu="{escape(name)}",site="{escape(site)}",rack="{escape(rack)}",'
+            f'outlet="{number}",device="{escape(device or "")}"'
+        )
+        series = lines[pdu_id]
+        for family, value in zip(MEASUREMENTS.values(), measurements):
+            if value is not None:
+                series[family].append(f'{family}{{{labels}}} {_value(value)}\n')
+        series['netbox_pdu_outlet_status'].append(
+            f'netbox_pdu_outlet_status{{{labels},status="{escape(status)}"}} 1\n'
+        )
+        total = totals[pdu_id]
+        total[0] += measurements[2] or 0
+        total[1] += measurements[1] or 0
+        total[2][status] += 1
+
+    chunks = {}
+    for pk, (name, site, rack, rated_current, rated_voltage) in pdus.items():
+        labels = f'pdu="{escape(name)}",site="{escape(site)}",rack="{escape(rack)}"'
+        power, current, statuses = totals[pk]
+        series = lines[pk]
+        series['netbox_pdu_power_watts'].append(f'netbox_pdu_power_watts{{{labels}}} {_value(power)}\n')
+        series['netbox_pdu_current_amperes'].append(f'netbox_pdu_current_amperes{{{labels}}} {_value(current)}\n')
+        series['netbox_pdu_rated_current_amperes'].append(
+            f'netbox_pdu_rated_current_amperes{{{labels}}} {_value(rated_current)}\n'
+        )
+        series['netbox_pdu_rated_voltage_volts'].append(
+            f'netbox_pdu_rated_voltage_volts{{{labels}}} {_value(rated_voltage)}\n'
+        )
+        for status, *_ in OutletStatusChoices.CHOICES:
+            series['netbox_pdu_outlets'].append(
+                f'netbox_pdu_outlets{{{labels},status="{status}"}} {statuses[status]}\n'
+            )
+        chunks[pk] = {
+            family: gzip.compress(''.join(text).encode(), compresslevel=compress_level, mtime=0)
+            for family, text in series.items() if text
+        }
+    return chunks
+
+
+def _update_index(add=(), remove=()):
+    """Add PDU IDs to and remove them from the index of rendered PDUs"""
+    for _ in range(50):
+        if cache.add(LOCK_KEY, True, timeout=10):
+            break
+        time.sleep(0.1)
+    try:
+        index = cache.get(INDEX_KEY) or set()
+        cache.set(INDEX_KEY, (index | set(add)) - set(remove), timeout=None)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _bump_version():
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, timeout=None)
+        return 1
+
+
+def _store(chunks, removed=()):
+    settings = get_settings()
+    index = cache.get(INDEX_KEY)
+    if index is None:
+        # The cache was cleared, so the series of the other PDUs are gone too
+        schedule_rebuild()
+        return
+    cache.set_many({CHUNK_KEY.format(pk): chunk for pk, chunk in chunks.items()}, timeout=None)
+    if removed:
+        cache.delete_many([CHUNK_KEY.format(pk) for pk in removed])
+    if not index.issuperset(chunks) or index & set(removed):
+        _update_index(add=chunks, remove=removed)
+    _bump_version()
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None or time.time() - snapshot['generated'] >= settings['min_interval']:
+        build_snapshot()
+
+
+def _refresh():
+    # PDUs queued by several writes in one transaction are rendered once
+    pdu_ids = _pending.__dict__.pop('pdu_ids', None)
+    if pdu_ids:
+        chunks = render_pdus(pdu_ids, get_settings()['compress_level'])
+        _store(chunks, removed=pdu_ids - set(chunks))
+
+
+def refresh_pdus(pdu_ids):
+    """
+    Re-render the series of the given PDUs (dropping those which no longer exist) once
+    the current transaction commits, and rebuild the snapshot unless it was built less
+    than min_interval seconds ago
+    """
+    pdu_ids = set(pdu_ids) - {None}
+    if not get_settings()['enabled'] or not pdu_ids:
+        return
+    _pending.pdu_ids = getattr(_pending, 'pdu_ids', set()) | pdu_ids
+    transaction.on_commit(_refresh)
+
+
+def rebuild(batch_size=500):
+    """Render the series of every PDU and rebuild the snapshot. Returns the number of PDUs."""
+    settings = get_settings()
+    pdu_ids = list(PDU.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(pdu_ids), batch_size):
+        cache.set_many({
+            CHUNK_KEY.format(pk): chunk
+            for pk, chunk in render_pdus(pdu_ids[start:start + batch_size], settings['compress_level']).items()
+        }, timeout=None)
+    stale = (cache.get(INDEX_KEY) or set()) - set(pdu_ids)
+    cache.delete_many([CHUNK_KEY.format(pk) for pk in stale])
+    cache.set(INDEX_KEY, set(pdu_ids), timeout=None)
+    _bump_version()
+    build_snapshot()
+    # A rebuild may be scheduled again as soon as the series are lost again
+    cache.delete(REBUILD_KEY)
+    return len(pdu_ids)
+
+
+def schedule_rebuild():
+    """Enqueue a MetricsRebuildJob unless one was scheduled in the last REBUILD_TIMEOUT seconds"""
+    if not cache.add(REBUILD_KEY, True, timeout=REBUILD_TIMEOUT):
+        return None
+    from .jobs import MetricsRebuildJob
+    return MetricsRebuildJob.enqueue()
+
+
+def build_snapshot():
+    """
+    Concatenate the rendered series of all PDUs, family by family, into the gzip
+    compressed snapshot served to scrapers. Reads only the cache.
+    """
+    started = time.perf_counter()
+    version = cache.get(VERSION_KEY) or 0
+    pdu_ids = sorted(cache.get(INDEX_KEY) or ())
+    found = cache.get_many([CHUNK_KEY.format(pk) for pk in pdu_ids])
+    chunks = [found[key] for key in (CHUNK_KEY.format(pk) for pk in pdu_ids) if key in found]
+    body = b''.join(
+        HEADERS[family] + b''.join(chunk[family] for chunk in chunks if family in chunk)
+        for family in FAMILIES
+    )
+    snapshot = {
+        'body': body,
+        'version': version,
+        'pdus': len(chunks),
+        'missing': len(pdu_ids) - len(chunks),
+        'generated': time.time(),
+        'build_seconds': time.perf_counter() - started,
+    }
+    cache.set(SNAPSHOT_KEY, snapshot, timeout=None)
+    return snapshot
+
+
+def get_snapshot():
+    """
+    Return the current snapshot, a dict with its gzip compressed `body`. A snapshot
+    older than min_interval which misses changes is rebuilt from the cache first. If
+    the cache holds no series at all (e.g. after it was cleared), every PDU is rendered
+    again in a background job and the last snapshot, if any, is returned meanwhile;
+    None if there is none.
+    """
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if cache.get(INDEX_KEY) is None:
+        schedule_rebuild()
+        return snapshot
+    if snapshot is None or (
+        snapshot['version'] != (cache.get(VERSION_KEY) or 0)
+        and time.time() - snapshot['generated'] >= get_settings()['min_interval']
+    ):
+        return build_snapshot()
+    return snapshot
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdu',
+            name='last_sync',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Last successful API sync timestamp', null=True),
+        ),
+    ]
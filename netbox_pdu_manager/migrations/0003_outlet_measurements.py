@@ -0,0 +1,91 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+RAW_TABLE_SQL = """
+CREATE TABLE netbox_pdu_manager_outletmeasurement (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,
+    outlet_id bigint NOT NULL,
+    "timestamp" timestamp with time zone NOT NULL,
+    voltage double precision NULL,
+    "current" double precision NULL,
+    power double precision NULL,
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+CREATE TABLE netbox_pdu_manager_outletmeasurement_default
+    PARTITION OF netbox_pdu_manager_outletmeasurement DEFAULT;
+CREATE INDEX netbox_pdu_meas_outlet_ts ON netbox_pdu_manager_outletmeasurement (outlet_id, "timestamp");
+CREATE INDEX netbox_pdu_meas_ts ON netbox_pdu_manager_outletmeasurement ("timestamp");
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0002_pdu_last_sync'),
+    ]
+
+    operations = [
+        # Django cannot create partitioned tables; the raw table is created with SQL
+        # while the migration state tracks it as a regular model.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=RAW_TABLE_SQL,
+                    reverse_sql='DROP TABLE netbox_pdu_manager_outletmeasurement;'
+                ),
+            ],
+            state_operations=[
+                migrations.CreateModel(
+                    name='OutletMeasurement',
+                    fields=[
+                        ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                        ('timestamp', models.DateTimeField()),
+                        ('voltage', models.FloatField(blank=True, null=True)),
+                        ('current', models.FloatField(blank=True, null=True)),
+                        ('power', models.FloatField(blank=True, null=True)),
+                        ('outlet', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='netbox_pdu_manager.outlet')),
+                    ],
+                    options={
+                        'verbose_name': 'Outlet Measurement',
+                        'verbose_name_plural': 'Outlet Measurements',
+                        'indexes': [
+                            models.Index(fields=['outlet', 'timestamp'], name='netbox_pdu_meas_outlet_ts'),
+                            models.Index(fields=['timestamp'], name='netbox_pdu_meas_ts'),
+                        ],
+                    },
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OutletMeasurementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('tier', models.CharField(max_length=10)),
+                ('window_start', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField()),
+                ('voltage_min', models.FloatField(blank=True, null=True)),
+                ('voltage_max', models.FloatField(blank=True, null=True)),
+                ('voltage_avg', models.FloatField(blank=True, null=True)),
+                ('voltage_last', models.FloatField(blank=True, null=True)),
+                ('current_min', models.FloatField(blank=True, null=True)),
+                ('current_max', models.FloatField(blank=True, null=True)),
+                ('current_avg', models.FloatField(blank=True, null=True)),
+                ('current_last', models.FloatField(blank=True, null=True)),
+                ('power_min', models.FloatField(blank=True, null=True)),
+                ('power_max', models.FloatField(blank=True, null=True)),
+                ('power_avg', models.FloatField(blank=True, null=True)),
+                ('power_last', models.FloatField(blank=True, null=True)),
+                ('outlet', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='netbox_pdu_manager.outlet')),
+            ],
+            options={
+                'verbose_name': 'Outlet Measurement Rollup',
+                'verbose_name_plural': 'Outlet Measurement Rollups',
+                'indexes': [
+                    models.Index(fields=['tier', 'window_start'], name='netbox_pdu_rollup_tier_ws'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=('tier', 'outlet', 'window_start'), name='netbox_pdu_rollup_unique_window'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_outlet_counters(apps, schema_editor):
+    PDU = apps.get_model('netbox_pdu_manager', 'PDU')
+    Outlet = apps.get_model('netbox_pdu_manager', 'Outlet')
+
+    counts = Outlet.objects.order_by().values('pdu').annotate(
+        total=Count('pk'),
+        on=Count('pk', filter=Q(status='on')),
+        off=Count('pk', filter=Q(status='off')),
+        unknown=Count('pk', filter=Q(status='unknown')),
+        error=Count('pk', filter=Q(status='error')),
+        connected=Count('pk', filter=Q(connected_device__isnull=False)),
+    )
+    for row in counts:
+        PDU.objects.filter(pk=row.pop('pdu')).update(
+            **{f'outlets_{name}': value for name, value in row.items()}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0003_outlet_measurements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdu',
+            name='outlets_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pdu',
+            name='outlets_on',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pdu',
+            name='outlets_off',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pdu',
+            name='outlets_unknown',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pdu',
+            name='outlets_error',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='pdu',
+            name='outlets_connected',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            code=populate_outlet_counters,
+            reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+def build_search_text(*values):
+    return '\n'.join(value or '' for value in values).lower()
+
+
+def populate_search_text(apps, schema_editor):
+    PDU = apps.get_model('netbox_pdu_manager', 'PDU')
+    Outlet = apps.get_model('netbox_pdu_manager', 'Outlet')
+
+    pdus = list(PDU.objects.only('pk', 'name', 'manufacturer', 'model', 'serial_number', 'description'))
+    for pdu in pdus:
+        pdu.search_text = build_search_text(pdu.name, pdu.manufacturer, pdu.model, pdu.serial_number, pdu.description)
+    PDU.objects.bulk_update(pdus, ('search_text',), batch_size=1000)
+
+    pdu_names = {pdu.pk: pdu.name for pdu in pdus}
+    outlets = []
+    for outlet in Outlet.objects.only('pk', 'pdu_id', 'name', 'label', 'description').iterator(chunk_size=5000):
+        outlet.search_text = build_search_text(pdu_names[outlet.pdu_id], outlet.name, outlet.label, outlet.description)
+        outlets.append(outlet)
+        if len(outlets) >= 5000:
+            Outlet.objects.bulk_update(outlets, ('search_text',))
+            outlets = []
+    Outlet.objects.bulk_update(outlets, ('search_text',))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0004_pdu_outlet_counters'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='pdu',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='outlet',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(
+            code=populate_search_text,
+            reverse_code=migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='pdu',
+            index=GinIndex(fields=['search_text'], name='netbox_pdu_pdu_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='outlet',
+            index=GinIndex(fields=['search_text'], name='netbox_pdu_outlet_search_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0005_search_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='outlet',
+            index=models.Index(fields=['pdu', 'status'], name='netbox_pdu_outlet_pdu_status'),
+        ),
+        migrations.AddIndex(
+            model_name='outlet',
+            index=models.Index(fields=['status', 'pdu'], name='netbox_pdu_outlet_status_pdu'),
+        ),
+        migrations.AddIndex(
+            model_name='outlet',
+            index=models.Index(
+                condition=models.Q(('connected_device__isnull', False)),
+                fields=['pdu', 'connected_device'],
+                name='netbox_pdu_outlet_connected'
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0006_outlet_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PDUPollState',
+            fields=[
+                ('pdu', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='poll_state', serialize=False, to='netbox_pdu_manager.pdu')),
+                ('next_poll', models.DateTimeField(help_text='Time at which the PDU is next due to be polled')),
+                ('interval', models.PositiveIntegerField(help_text='Current adaptive poll interval (seconds)')),
+                ('priority', models.SmallIntegerField(default=0, help_text='Due PDUs with a higher priority are polled first')),
+                ('reason', models.CharField(default='initial', max_length=20)),
+                ('load', models.FloatField(blank=True, help_text='Total outlet current as a fraction of the rated current at the last poll', null=True)),
+                ('failures', models.PositiveIntegerField(default=0, help_text='Consecutive failed polls')),
+                ('last_poll', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.CharField(blank=True, max_length=200)),
+            ],
+            options={
+                'verbose_name': 'PDU Poll State',
+                'verbose_name_plural': 'PDU Poll States',
+                'indexes': [
+                    models.Index(fields=['next_poll'], name='netbox_pdu_pollstate_next'),
+                ],
+            },
+        ),
+    ]
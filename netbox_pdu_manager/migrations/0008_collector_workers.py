@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0007_pdu_poll_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdupollstate',
+            name='leased_by',
+            field=models.CharField(blank=True, help_text='Collector worker currently polling the PDU', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='pdupollstate',
+            name='lease_expires',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CollectorWorker',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('started', models.DateTimeField()),
+                ('heartbeat', models.DateTimeField(db_index=True)),
+                ('polled', models.PositiveBigIntegerField(default=0, help_text='Number of PDU polls since the worker started')),
+            ],
+            options={
+                'verbose_name': 'Collector Worker',
+                'verbose_name_plural': 'Collector Workers',
+                'ordering': ('name',),
+            },
+        ),
+    ]
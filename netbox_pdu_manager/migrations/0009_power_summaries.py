@@ -0,0 +1,50 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcim', '0001_initial'),
+        ('netbox_pdu_manager', '0008_collector_workers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RackPowerSummary',
+            fields=[
+                ('rated_power', models.PositiveBigIntegerField(default=0, help_text='Total rated power of the PDUs (W)')),
+                ('measured_power', models.FloatField(default=0, help_text='Total last measured power of the outlets (W)')),
+                ('pdu_count', models.PositiveIntegerField(default=0)),
+                ('outlet_count', models.PositiveIntegerField(default=0)),
+                ('phase_power', models.JSONField(default=dict, help_text='Measured power (W) per phase')),
+                ('bank_power', models.JSONField(default=dict, help_text='Measured power (W) per bank number')),
+                ('last_updated', models.DateTimeField()),
+                ('rack', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='power_summary', serialize=False, to='dcim.rack')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rack_power_summaries', to='dcim.site')),
+            ],
+            options={
+                'verbose_name': 'Rack Power Summary',
+                'verbose_name_plural': 'Rack Power Summaries',
+                'ordering': ('site', 'rack'),
+            },
+        ),
+        migrations.CreateModel(
+            name='SitePowerSummary',
+            fields=[
+                ('rated_power', models.PositiveBigIntegerField(default=0, help_text='Total rated power of the PDUs (W)')),
+                ('measured_power', models.FloatField(default=0, help_text='Total last measured power of the outlets (W)')),
+                ('pdu_count', models.PositiveIntegerField(default=0)),
+                ('outlet_count', models.PositiveIntegerField(default=0)),
+                ('phase_power', models.JSONField(default=dict, help_text='Measured power (W) per phase')),
+                ('bank_power', models.JSONField(default=dict, help_text='Measured power (W) per bank number')),
+                ('last_updated', models.DateTimeField()),
+                ('site', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='power_summary', serialize=False, to='dcim.site')),
+            ],
+            options={
+                'verbose_name': 'Site Power Summary',
+                'verbose_name_plural': 'Site Power Summaries',
+                'ordering': ('site',),
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcim', '0001_initial'),
+        ('netbox_pdu_manager', '0009_power_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DevicePowerDependency',
+            fields=[
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='power_dependency', serialize=False, to='dcim.device')),
+                ('pdus', django.contrib.postgres.fields.ArrayField(base_field=models.PositiveIntegerField(), default=list, help_text='IDs of the PDUs feeding the device', size=None)),
+                ('feeds', models.JSONField(default=list, help_text='Feeding outlets as [outlet ID, PDU ID, line index, bank number]')),
+                ('outlet_count', models.PositiveSmallIntegerField(default=0)),
+                ('pdu_count', models.PositiveSmallIntegerField(default=0)),
+                ('line_count', models.PositiveSmallIntegerField(default=0, help_text='Number of distinct site lines (phases) feeding the device')),
+                ('redundancy', models.CharField(max_length=20)),
+                ('last_updated', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Device Power Dependency',
+                'verbose_name_plural': 'Device Power Dependencies',
+                'ordering': ('device',),
+                'indexes': [
+                    django.contrib.postgres.indexes.GinIndex(fields=['pdus'], name='netbox_pdu_dependency_pdus'),
+                    models.Index(fields=['redundancy'], name='netbox_pdu_dependency_red'),
+                ],
+            },
+        ),
+    ]
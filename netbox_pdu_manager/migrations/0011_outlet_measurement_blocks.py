@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0010_device_power_dependencies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutletMeasurementBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('window_start', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField()),
+                ('voltage_min', models.FloatField(blank=True, null=True)),
+                ('voltage_max', models.FloatField(blank=True, null=True)),
+                ('voltage_avg', models.FloatField(blank=True, null=True)),
+                ('voltage_last', models.FloatField(blank=True, null=True)),
+                ('current_min', models.FloatField(blank=True, null=True)),
+                ('current_max', models.FloatField(blank=True, null=True)),
+                ('current_avg', models.FloatField(blank=True, null=True)),
+                ('current_last', models.FloatField(blank=True, null=True)),
+                ('power_min', models.FloatField(blank=True, null=True)),
+                ('power_max', models.FloatField(blank=True, null=True)),
+                ('power_avg', models.FloatField(blank=True, null=True)),
+                ('power_last', models.FloatField(blank=True, null=True)),
+                ('data', models.BinaryField()),
+                ('outlet', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='netbox_pdu_manager.outlet')),
+            ],
+            options={
+                'verbose_name': 'Outlet Measurement Block',
+                'verbose_name_plural': 'Outlet Measurement Blocks',
+                'indexes': [
+                    models.Index(fields=['window_start'], name='netbox_pdu_block_ws'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=('outlet', 'window_start'), name='netbox_pdu_block_unique_window'),
+                ],
+            },
+        ),
+    ]
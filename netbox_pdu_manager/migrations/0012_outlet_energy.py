@@ -0,0 +1,57 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcim', '0001_initial'),
+        ('tenancy', '0001_initial'),
+        ('netbox_pdu_manager', '0011_outlet_measurement_blocks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutletEnergy',
+            fields=[
+                ('outlet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='energy', serialize=False, to='netbox_pdu_manager.outlet')),
+                ('period_start', models.DateTimeField()),
+                ('energy', models.FloatField(default=0, help_text='Energy drawn in the open period (Wh)')),
+                ('metered', models.FloatField(default=0, help_text='Seconds of the open period covered by readings')),
+                ('last_power', models.FloatField(blank=True, null=True)),
+                ('last_reading', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Outlet Energy',
+                'verbose_name_plural': 'Outlet Energy',
+            },
+        ),
+        # Every poll rewrites every row; free space on each page keeps the new
+        # versions on their page (HOT updates), without touching the index
+        migrations.RunSQL(
+            sql='ALTER TABLE netbox_pdu_manager_outletenergy SET (fillfactor = 50);',
+            reverse_sql='ALTER TABLE netbox_pdu_manager_outletenergy RESET (fillfactor);'
+        ),
+        migrations.CreateModel(
+            name='OutletEnergyPeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False)),
+                ('period_start', models.DateTimeField()),
+                ('energy', models.FloatField(help_text='Energy drawn in the period (Wh)')),
+                ('metered', models.FloatField(help_text='Seconds of the period covered by readings')),
+                ('outlet', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='netbox_pdu_manager.outlet')),
+                ('pdu', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='netbox_pdu_manager.pdu')),
+                ('device', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='dcim.device')),
+                ('rack', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='dcim.rack')),
+                ('site', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='dcim.site')),
+                ('tenant', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tenancy.tenant')),
+            ],
+            options={
+                'verbose_name': 'Outlet Energy Period',
+                'verbose_name_plural': 'Outlet Energy Periods',
+                'constraints': [
+                    models.UniqueConstraint(fields=('period_start', 'outlet'), name='netbox_pdu_energy_unique_period'),
+                ],
+            },
+        ),
+    ]
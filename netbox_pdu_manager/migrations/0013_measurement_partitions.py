@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import migrations
+
+RAW_TABLE = 'netbox_pdu_manager_outletmeasurement'
+DEFAULT_PARTITION = f'{RAW_TABLE}_default'
+
+
+def create_partition(cursor, day):
+    name = f'{RAW_TABLE}_p{day:%Y%m%d}'
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return
+    start = datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+    end = start + timedelta(days=1)
+    cursor.execute(f'CREATE TABLE {name} (LIKE {RAW_TABLE} INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+        f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        [start, end]
+    )
+    cursor.execute(
+        f"ALTER TABLE {RAW_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    )
+
+
+def create_partitions(apps, schema_editor):
+    """
+    Create the daily partitions for the next days, and move samples which landed in the
+    default partition into daily partitions of their own
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    today = datetime.now(dt_timezone.utc).date()
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT (\"timestamp\" AT TIME ZONE 'UTC')::date FROM {DEFAULT_PARTITION}"
+        )
+        days = {row[0] for row in cursor.fetchall()}
+        days.update(today + timedelta(days=offset) for offset in range(3))
+        for day in sorted(days):
+            create_partition(cursor, day)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('netbox_pdu_manager', '0012_outlet_energy'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=create_partitions,
+            reverse_code=migrations.RunPython.noop
+        ),
+    ]
@@ -1,8 +1,251 @@
-from django.db import models
+from datetime import timedelta
+
+from dcim.models import Rack
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.db import connection, models
+from django.db.models import Count, F, Q, Sum
+from django.dispatch import Signal
 from django.urls import reverse
+from django.utils import timezone
 from netbox.models import NetBoxModel
+from netbox.plugins import get_plugin_config
+from utilities.querysets import RestrictedQuerySet
+
+from .choices import (
+    PHASE_INDEX, MeasurementTierChoices, OutletStatusChoices, PDUTypeChoices, PhaseChoices, PollReasonChoices,
+    RedundancyChoices,
+)
+from .livefeed import publish_counters, publish_outlets
+
+# Reading keys mapped to the Outlet fields which store them
+TELEMETRY_FIELDS = {
+    'voltage': 'last_measured_voltage',
+    'current': 'last_measured_current',
+    'power': 'last_measured_power',
+}
+
+# Sent with the `pdu_ids` whose outlets were written by OutletQuerySet.update_telemetry()
+telemetry_updated = Signal()
+
+# Separates fields in the normalized search text so that matches cannot span two fields
+SEARCH_SEPARATOR = '\n'
+
+
+def build_search_text(*values):
+    """Return the normalized (lower-cased) quick search text for a set of field values"""
+    return SEARCH_SEPARATOR.join(value or '' for value in values).lower()
+
+
+def bulk_update_rows(objs, fields, batch_size=1000):
+    """
+    Write `fields` of the given instances like bulk_update(). On PostgreSQL each batch
+    is a single UPDATE joined against a VALUES list, which avoids the per-field CASE
+    expressions of bulk_update() whose cost grows quadratically with the batch size.
+    """
+    if not objs:
+        return
+    model = type(objs[0])
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+        return
+
+    qn = connection.ops.quote_name
+    opts = model._meta
+    columns = [opts.pk, *(opts.get_field(name) for name in fields)]
+    placeholder = '({})'.format(', '.join(f'%s::{field.db_type(connection)}' for field in columns))
+    assignments = ', '.join(f'{qn(field.column)} = v.{qn(field.column)}' for field in columns[1:])
+    with connection.cursor() as cursor:
+        for i in range(0, len(objs), batch_size):
+            batch = objs[i:i + batch_size]
+            params = [
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+                for obj in batch
+                for field in columns
+            ]
+            cursor.execute(
+                f"UPDATE {qn(opts.db_table)} AS t SET {assignments} "
+                f"FROM (VALUES {', '.join([placeholder] * len(batch))}) "
+                f"AS v({', '.join(qn(field.column) for field in columns)}) "
+                f"WHERE t.{qn(opts.pk.column)} = v.{qn(opts.pk.column)}",
+                params
+            )
+
+
+# Conditional aggregates for the per-PDU outlet counters, keyed by counter name
+OUTLET_COUNTERS = {
+    'total': Count('pk'),
+    'on': Count('pk', filter=Q(status=OutletStatusChoices.STATUS_ON)),
+    'off': Count('pk', filter=Q(status=OutletStatusChoices.STATUS_OFF)),
+    'unknown': Count('pk', filter=Q(status=OutletStatusChoices.STATUS_UNKNOWN)),
+    'error': Count('pk', filter=Q(status=OutletStatusChoices.STATUS_ERROR)),
+    'connected': Count('pk', filter=Q(connected_device__isnull=False)),
+}
+
+
+# Numeric totals of a capacity summary
+POWER_TOTALS = ('rated_power', 'measured_power', 'pdu_count', 'outlet_count')
+
+
+def _empty_totals():
+    return {**dict.fromkeys(POWER_TOTALS, 0), 'phase_power': {}, 'bank_power': {}}
+
+
+def _add_totals(totals, other):
+    for name in POWER_TOTALS:
+        totals[name] += other[name]
+    for name in ('phase_power', 'bank_power'):
+        for key, power in other[name].items():
+            totals[name][key] = totals[name].get(key, 0) + power
+
+
+def aggregate_power(field, keys, **filters):
+    """
+    Total the rated power of the PDUs whose `field` (rack_id or site_id) is in `keys`, and
+    the measured load of their outlets overall, per phase and per bank number. `filters`
+    further restrict the PDUs. Returns the totals of each key which has any PDUs.
+    """
+    totals = {}
+    pdus = PDU.objects.filter(**{f'{field}__in': keys}, **filters).order_by()
+    for row in pdus.values(field).annotate(rated=Sum(F('rated_voltage') * F('rated_current')), pdus=Count('pk')):
+        totals[row[field]] = {**_empty_totals(), 'rated_power': row['rated'], 'pdu_count': row['pdus']}
+
+    outlets = Outlet.objects.filter(
+        **{f'pdu__{field}__in': keys}, **{f'pdu__{name}': value for name, value in filters.items()}
+    ).order_by()
+    for row in outlets.values(f'pdu__{field}', 'phase', 'bank_number').annotate(
+        power=Sum('last_measured_power'), outlets=Count('pk')
+    ):
+        item = totals[row[f'pdu__{field}']]
+        power = row['power'] or 0.0
+        item['measured_power'] += power
+        item['outlet_count'] += row['outlets']
+        # Outlets without a phase or bank only count towards the total
+        if row['phase']:
+            item['phase_power'][row['phase']] = item['phase_power'].get(row['phase'], 0.0) + power
+        if row['bank_number']:
+            bank = str(row['bank_number'])
+            item['bank_power'][bank] = item['bank_power'].get(bank, 0.0) + power
+    return totals
+
+
+def refresh_power_summaries(rack_ids=(), site_ids=()):
+    """Recalculate the capacity summaries of the given racks, and then of the given sites"""
+    RackPowerSummary.objects.refresh(rack_ids)
+    SitePowerSummary.objects.refresh(site_ids)
+
+
+def get_stale_cutoff(now=None):
+    """Return the time before which a PDU's last sync is stale (two sync intervals ago)"""
+    now = now or timezone.now()
+    return now - timedelta(seconds=2 * get_plugin_config('netbox_pdu_manager', 'sync_interval'))
+
+
+class PDUQuerySet(RestrictedQuerySet):
+
+    def stale(self, now=None):
+        """Return the PDUs in this queryset which have not been synced for two sync intervals"""
+        return self.filter(Q(last_sync__isnull=True) | Q(last_sync__lt=get_stale_cutoff(now)))
+
+    def mark_synced(self, timestamp):
+        """Advance last_sync of the PDUs in this queryset to `timestamp`, never moving it back"""
+        return self.exclude(last_sync__gte=timestamp).update(last_sync=timestamp)
+
+    def refresh_outlet_counters(self, batch_size=1000):
+        """
+        Recalculate the denormalized outlet counters of all PDUs in this queryset
+        with a single grouped aggregate over their outlets.
+        """
+        pdu_ids = list(self.order_by().values_list('pk', flat=True))
+        counts = {
+            row.pop('pdu'): row
+            for row in Outlet.objects.filter(pdu_id__in=pdu_ids).order_by().values('pdu').annotate(
+                **OUTLET_COUNTERS
+            )
+        }
+        empty = dict.fromkeys(OUTLET_COUNTERS, 0)
+        pdus = [
+            PDU(pk=pk, **{f'outlets_{name}': value for name, value in counts.get(pk, empty).items()})
+            for pk in pdu_ids
+        ]
+        bulk_update_rows(pdus, [f'outlets_{name}' for name in OUTLET_COUNTERS], batch_size=batch_size)
+        publish_counters({pdu.pk: pdu.outlet_stats for pdu in pdus})
+
+    def refresh_power_summaries(self):
+        """Recalculate the capacity summaries of the racks and sites of the PDUs in this queryset"""
+        locations = set(self.order_by().values_list('rack_id', 'site_id'))
+        refresh_power_summaries({rack_id for rack_id, _ in locations}, {site_id for _, site_id in locations})
+
+    def refresh_power_dependencies(self):
+        """Rebuild the power dependencies of the devices connected to the PDUs in this queryset"""
+        DevicePowerDependency.objects.refresh(
+            Outlet.objects.filter(pdu__in=self.values('pk'), connected_device__isnull=False).order_by().values_list(
+                'connected_device_id', flat=True
+            ).distinct()
+        )
+
+    def update_telemetry(self, readings, timestamp=None, deadband=None):
+        """
+        Store polled readings for PDUs in this queryset. `readings` maps a PDU ID to a
+        list of reading dicts, each with an outlet_number. Marks the PDUs as synced and
+        returns the Outlets which were updated.
+        """
+        timestamp = timestamp or timezone.now()
+        pdu_ids = self.filter(pk__in=readings.keys()).values_list('pk', flat=True)
+        outlets = Outlet.objects.filter(pdu_id__in=pdu_ids).update_telemetry(
+            {
+                (pdu_id, reading['outlet_number']): reading
+                for pdu_id, pdu_readings in readings.items()
+                for reading in pdu_readings
+            },
+            timestamp=timestamp,
+            deadband=deadband
+        )
+        self.filter(pk__in=readings.keys()).mark_synced(timestamp)
+        return outlets
 
-from .choices import PDUTypeChoices, OutletStatusChoices, PhaseChoices
+
+class OutletQuerySet(RestrictedQuerySet):
+
+    def update_telemetry(self, readings, timestamp=None, deadband=None, batch_size=1000):
+        """
+        Write live readings to the Outlets in this queryset. `readings` maps
+        (pdu_id, outlet_number) to a dict with any of status, voltage, current and power.
+
+        Only outlets whose status changed, or whose measurements moved beyond the
+        deadband, are written; freshness is recorded per PDU (PDU.last_sync). Rows are
+        updated in bulk (bulk_update_rows()), so no change records are created and no
+        signals (webhooks, event rules, search indexing) are fired. The counters and
+        capacity summaries affected are then recalculated. Returns the updated Outlets.
+        """
+        timestamp = timestamp or timezone.now()
+        if deadband is None:
+            deadband = get_plugin_config('netbox_pdu_manager', 'telemetry_deadband')
+        pdu_ids = {pdu_id for pdu_id, _ in readings}
+        outlets = self.filter(pdu_id__in=pdu_ids).order_by().only(
+            'pk', 'pdu_id', 'outlet_number', 'status', *TELEMETRY_FIELDS.values()
+        )
+
+        changed = []
+        status_changed = set()
+        for outlet in outlets.iterator(chunk_size=batch_size):
+            reading = readings.get((outlet.pdu_id, outlet.outlet_number))
+            status = outlet.status
+            if reading is not None and outlet.apply_telemetry(reading, deadband):
+                outlet.last_update = timestamp
+                changed.append(outlet)
+                if outlet.status != status:
+                    status_changed.add(outlet.pdu_id)
+
+        bulk_update_rows(changed, ('status', 'last_update', *TELEMETRY_FIELDS.values()), batch_size=batch_size)
+        publish_outlets(changed)
+        if status_changed:
+            PDU.objects.filter(pk__in=status_changed).refresh_outlet_counters()
+        if changed:
+            changed_pdus = {outlet.pdu_id for outlet in changed}
+            PDU.objects.filter(pk__in=changed_pdus).refresh_power_summaries()
+            telemetry_updated.send(sender=Outlet, pdu_ids=changed_pdus)
+        return changed
 
 
 class PDU(NetBoxModel):
@@ -116,6 +359,44 @@ class PDU(NetBoxModel):
         blank=True,
         help_text="Firmware version"
     )
+    last_sync = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        help_text="Last successful API sync timestamp"
+    )
+
+    # Denormalized outlet counters (maintained by signals and the telemetry write path)
+    outlets_total = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    outlets_on = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    outlets_off = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    outlets_unknown = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    outlets_error = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    outlets_connected = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+
+    # Normalized quick search text (trigram indexed)
+    search_text = models.TextField(
+        blank=True,
+        editable=False
+    )
 
     # Metadata
     description = models.CharField(
@@ -126,14 +407,35 @@ class PDU(NetBoxModel):
         blank=True
     )
 
+    objects = PDUQuerySet.as_manager()
+
     class Meta:
         ordering = ('site', 'name')
+        indexes = (
+            GinIndex(fields=('search_text',), opclasses=('gin_trgm_ops',), name='netbox_pdu_pdu_search_trgm'),
+        )
         verbose_name = 'PDU'
         verbose_name_plural = 'PDUs'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the original name so that outlet search text can be updated on rename
+        instance._loaded_name = instance.__dict__.get('name')
+        # and the original rack and site, whose capacity summaries change if the PDU is moved
+        instance._loaded_location = (instance.__dict__.get('rack_id'), instance.__dict__.get('site_id'))
+        return instance
+
     def __str__(self):
         return f"{self.name} ({self.site})"
 
+    def save(self, *args, **kwargs):
+        self.search_text = self.get_search_text()
+        super().save(*args, **kwargs)
+
+    def get_search_text(self):
+        return build_search_text(self.name, self.manufacturer, self.model, self.serial_number, self.description)
+
     def get_absolute_url(self):
         return reverse('plugins:netbox_pdu_manager:pdu', args=[self.pk])
 
@@ -146,6 +448,16 @@ class PDU(NetBoxModel):
         """Calculate rated power (W)"""
         return self.rated_voltage * self.rated_current
 
+    @property
+    def is_stale(self):
+        """True if the PDU has not been synced for two sync intervals"""
+        return self.last_sync is None or self.last_sync < get_stale_cutoff()
+
+    @property
+    def outlet_stats(self):
+        """Return the denormalized outlet counters as a dict"""
+        return {name: getattr(self, f'outlets_{name}') for name in OUTLET_COUNTERS}
+
 
 class Outlet(NetBoxModel):
     """
@@ -236,12 +548,39 @@ class Outlet(NetBoxModel):
         help_text="Connected phase"
     )
 
+    # Normalized quick search text including the PDU name (trigram indexed)
+    search_text = models.TextField(
+        blank=True,
+        editable=False
+    )
+
+    objects = OutletQuerySet.as_manager()
+
     class Meta:
         ordering = ('pdu', 'outlet_number')
         unique_together = ('pdu', 'outlet_number')
+        indexes = (
+            GinIndex(fields=('search_text',), opclasses=('gin_trgm_ops',), name='netbox_pdu_outlet_search_trgm'),
+            models.Index(fields=('pdu', 'status'), name='netbox_pdu_outlet_pdu_status'),
+            models.Index(fields=('status', 'pdu'), name='netbox_pdu_outlet_status_pdu'),
+            models.Index(
+                fields=('pdu', 'connected_device'),
+                condition=Q(connected_device__isnull=False),
+                name='netbox_pdu_outlet_connected'
+            ),
+        )
         verbose_name = 'Outlet'
         verbose_name_plural = 'Outlets'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the original PDU so that its counters can be updated if the outlet is moved
+        instance._loaded_pdu_id = instance.__dict__.get('pdu_id')
+        # and the original device, whose power dependencies change if the outlet is reconnected
+        instance._loaded_device_id = instance.__dict__.get('connected_device_id')
+        return instance
+
     def __str__(self):
         if self.name:
             return f"{self.pdu.name} - Port {self.outlet_number} ({self.name})"
@@ -250,11 +589,663 @@ class Outlet(NetBoxModel):
     def get_absolute_url(self):
         return reverse('plugins:netbox_pdu_manager:outlet', args=[self.pk])
 
+    def save(self, *args, **kwargs):
+        self.search_text = self.get_search_text()
+        super().save(*args, **kwargs)
+
+    def get_search_text(self, pdu_name=None):
+        return build_search_text(pdu_name or self.pdu.name, self.name, self.label, self.description)
+
     def get_status_color(self):
         """Get color for status badge"""
         return OutletStatusChoices.colors.get(self.status)
 
+    def apply_telemetry(self, reading, deadband):
+        """
+        Copy a reading onto this outlet. Returns True if the status changed or any
+        measurement moved by more than its deadband.
+        """
+        changed = False
+        if 'status' in reading and reading['status'] != self.status:
+            self.status = reading['status']
+            changed = True
+        for key, field in TELEMETRY_FIELDS.items():
+            if key not in reading:
+                continue
+            old, new = getattr(self, field), reading[key]
+            if old is None or new is None:
+                if old is new:
+                    continue
+            elif abs(new - old) <= deadband.get(key, 0):
+                continue
+            setattr(self, field, new)
+            changed = True
+        return changed
+
     @property
     def display_name(self):
         """Return display name"""
         return self.name or f"Port {self.outlet_number}"
+
+
+class OutletMeasurement(models.Model):
+    """
+    Raw outlet reading. Append-only; the table is range-partitioned by day on
+    timestamp (see history.ensure_partitions()) so that expired data is dropped
+    a partition at a time.
+    """
+    id = models.BigAutoField(
+        primary_key=True
+    )
+    outlet = models.ForeignKey(
+        to=Outlet,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    timestamp = models.DateTimeField()
+    voltage = models.FloatField(
+        blank=True,
+        null=True
+    )
+    current = models.FloatField(
+        blank=True,
+        null=True
+    )
+    power = models.FloatField(
+        blank=True,
+        null=True
+    )
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('outlet', 'timestamp'), name='netbox_pdu_meas_outlet_ts'),
+            models.Index(fields=('timestamp',), name='netbox_pdu_meas_ts'),
+        )
+        verbose_name = 'Outlet Measurement'
+        verbose_name_plural = 'Outlet Measurements'
+
+    def __str__(self):
+        return f"{self.outlet_id} @ {self.timestamp}"
+
+
+class OutletMeasurementRollup(models.Model):
+    """
+    Aggregated outlet readings (min/max/avg/last) for one window of a rollup tier
+    """
+    outlet = models.ForeignKey(
+        to=Outlet,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    tier = models.CharField(
+        max_length=10,
+        choices=MeasurementTierChoices
+    )
+    window_start = models.DateTimeField()
+    samples = models.PositiveIntegerField()
+
+    voltage_min = models.FloatField(blank=True, null=True)
+    voltage_max = models.FloatField(blank=True, null=True)
+    voltage_avg = models.FloatField(blank=True, null=True)
+    voltage_last = models.FloatField(blank=True, null=True)
+    current_min = models.FloatField(blank=True, null=True)
+    current_max = models.FloatField(blank=True, null=True)
+    current_avg = models.FloatField(blank=True, null=True)
+    current_last = models.FloatField(blank=True, null=True)
+    power_min = models.FloatField(blank=True, null=True)
+    power_max = models.FloatField(blank=True, null=True)
+    power_avg = models.FloatField(blank=True, null=True)
+    power_last = models.FloatField(blank=True, null=True)
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('tier', 'outlet', 'window_start'),
+                name='netbox_pdu_rollup_unique_window'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('tier', 'window_start'), name='netbox_pdu_rollup_tier_ws'),
+        )
+        verbose_name = 'Outlet Measurement Rollup'
+        verbose_name_plural = 'Outlet Measurement Rollups'
+
+    def __str__(self):
+        return f"{self.outlet_id} {self.tier} @ {self.window_start}"
+
+
+class OutletMeasurementBlock(models.Model):
+    """
+    The raw readings of one outlet for one window, packed into a compressed columnar
+    blob (see blocks.py), with min/max/avg/last headers like a rollup
+    """
+    outlet = models.ForeignKey(
+        to=Outlet,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    window_start = models.DateTimeField()
+    samples = models.PositiveIntegerField()
+
+    voltage_min = models.FloatField(blank=True, null=True)
+    voltage_max = models.FloatField(blank=True, null=True)
+    voltage_avg = models.FloatField(blank=True, null=True)
+    voltage_last = models.FloatField(blank=True, null=True)
+    current_min = models.FloatField(blank=True, null=True)
+    current_max = models.FloatField(blank=True, null=True)
+    current_avg = models.FloatField(blank=True, null=True)
+    current_last = models.FloatField(blank=True, null=True)
+    power_min = models.FloatField(blank=True, null=True)
+    power_max = models.FloatField(blank=True, null=True)
+    power_avg = models.FloatField(blank=True, null=True)
+    power_last = models.FloatField(blank=True, null=True)
+
+    data = models.BinaryField()
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('outlet', 'window_start'),
+                name='netbox_pdu_block_unique_window'
+            ),
+        )
+        indexes = (
+            models.Index(fields=('window_start',), name='netbox_pdu_block_ws'),
+        )
+        verbose_name = 'Outlet Measurement Block'
+        verbose_name_plural = 'Outlet Measurement Blocks'
+
+    def __str__(self):
+        return f"{self.outlet_id} block @ {self.window_start}"
+
+
+class OutletEnergy(models.Model):
+    """
+    Running energy total of an outlet in the open billing period, advanced with every
+    power reading (see energy.py)
+    """
+    outlet = models.OneToOneField(
+        to=Outlet,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='energy'
+    )
+    period_start = models.DateTimeField()
+    energy = models.FloatField(
+        default=0,
+        help_text="Energy drawn in the open period (Wh)"
+    )
+    metered = models.FloatField(
+        default=0,
+        help_text="Seconds of the open period covered by readings"
+    )
+    last_power = models.FloatField(
+        blank=True,
+        null=True
+    )
+    last_reading = models.DateTimeField(
+        blank=True,
+        null=True
+    )
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        # No secondary indexes and a fillfactor of 50 (see migration 0012): every poll
+        # rewrites every row, and its new version stays on its page
+        verbose_name = 'Outlet Energy'
+        verbose_name_plural = 'Outlet Energy'
+
+    def __str__(self):
+        return f"{self.outlet_id} since {self.period_start}"
+
+
+class OutletEnergyPeriod(models.Model):
+    """
+    Energy drawn by an outlet in a closed billing period, with the PDU, device, rack,
+    site and tenant it was attributed to when the period was closed
+    """
+    outlet = models.ForeignKey(
+        to=Outlet,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+'
+    )
+    period_start = models.DateTimeField()
+    energy = models.FloatField(
+        help_text="Energy drawn in the period (Wh)"
+    )
+    metered = models.FloatField(
+        help_text="Seconds of the period covered by readings"
+    )
+    pdu = models.ForeignKey(
+        to=PDU,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name='+'
+    )
+    device = models.ForeignKey(
+        to='dcim.Device',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name='+'
+    )
+    rack = models.ForeignKey(
+        to='dcim.Rack',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name='+'
+    )
+    site = models.ForeignKey(
+        to='dcim.Site',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name='+'
+    )
+    tenant = models.ForeignKey(
+        to='tenancy.Tenant',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name='+'
+    )
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('period_start', 'outlet'),
+                name='netbox_pdu_energy_unique_period'
+            ),
+        )
+        verbose_name = 'Outlet Energy Period'
+        verbose_name_plural = 'Outlet Energy Periods'
+
+    def __str__(self):
+        return f"{self.outlet_id} for {self.period_start}"
+
+
+class PDUPollState(models.Model):
+    """
+    Polling scheduler state of a PDU: when it is next due, the adaptive interval and
+    the reason it was chosen, and the consecutive failure count used for backoff.
+    """
+    pdu = models.OneToOneField(
+        to=PDU,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='poll_state'
+    )
+    next_poll = models.DateTimeField(
+        help_text="Time at which the PDU is next due to be polled"
+    )
+    interval = models.PositiveIntegerField(
+        help_text="Current adaptive poll interval (seconds)"
+    )
+    priority = models.SmallIntegerField(
+        default=0,
+        help_text="Due PDUs with a higher priority are polled first"
+    )
+    reason = models.CharField(
+        max_length=20,
+        choices=PollReasonChoices,
+        default=PollReasonChoices.REASON_INITIAL
+    )
+    load = models.FloatField(
+        blank=True,
+        null=True,
+        help_text="Total outlet current as a fraction of the rated current at the last poll"
+    )
+    failures = models.PositiveIntegerField(
+        default=0,
+        help_text="Consecutive failed polls"
+    )
+    last_poll = models.DateTimeField(
+        blank=True,
+        null=True
+    )
+    last_error = models.CharField(
+        max_length=200,
+        blank=True
+    )
+    leased_by = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Collector worker currently polling the PDU"
+    )
+    lease_expires = models.DateTimeField(
+        blank=True,
+        null=True
+    )
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('next_poll',), name='netbox_pdu_pollstate_next'),
+        )
+        verbose_name = 'PDU Poll State'
+        verbose_name_plural = 'PDU Poll States'
+
+    def __str__(self):
+        return f"{self.pdu_id} @ {self.next_poll}"
+
+    def get_reason_color(self):
+        return PollReasonChoices.colors.get(self.reason)
+
+
+class CollectorWorker(models.Model):
+    """
+    A running collector worker. Workers with a recent heartbeat form the hash ring
+    which assigns PDUs to workers.
+    """
+    name = models.CharField(
+        max_length=100,
+        unique=True
+    )
+    started = models.DateTimeField()
+    heartbeat = models.DateTimeField(
+        db_index=True
+    )
+    polled = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Number of PDU polls since the worker started"
+    )
+
+    objects = RestrictedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('name',)
+        verbose_name = 'Collector Worker'
+        verbose_name_plural = 'Collector Workers'
+
+    def __str__(self):
+        return self.name
+
+
+class PowerSummaryQuerySet(RestrictedQuerySet):
+
+    def refresh(self, keys):
+        """
+        Recalculate the summaries of the given racks or sites (by ID) with one grouped
+        aggregate, and delete those of racks or sites which no longer have any PDUs
+        """
+        keys = set(keys) - {None}
+        if not keys:
+            return
+        model = self.model
+        totals = model.calculate(keys)
+        now = timezone.now()
+        summaries = [model(pk=key, last_updated=now, **values) for key, values in totals.items()]
+        for summary in summaries:
+            summary.measured_power = round(summary.measured_power, 1)
+            summary.phase_power = {key: round(power, 1) for key, power in summary.phase_power.items()}
+            summary.bank_power = {key: round(power, 1) for key, power in summary.bank_power.items()}
+        model.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=[field.name for field in model._meta.concrete_fields if not field.primary_key],
+        )
+        model.objects.filter(pk__in=keys - totals.keys()).delete()
+
+
+class PowerSummary(models.Model):
+    """
+    Materialized power capacity of a group of PDUs: their total rated power and the
+    measured load of their outlets, overall and per phase and bank number. Summaries
+    are recalculated for the affected racks and sites whenever outlet measurements or
+    PDUs change, so capacity views do not aggregate over outlets.
+    """
+    rated_power = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Total rated power of the PDUs (W)"
+    )
+    measured_power = models.FloatField(
+        default=0,
+        help_text="Total last measured power of the outlets (W)"
+    )
+    pdu_count = models.PositiveIntegerField(
+        default=0
+    )
+    outlet_count = models.PositiveIntegerField(
+        default=0
+    )
+    phase_power = models.JSONField(
+        default=dict,
+        help_text="Measured power (W) per phase"
+    )
+    bank_power = models.JSONField(
+        default=dict,
+        help_text="Measured power (W) per bank number"
+    )
+    last_updated = models.DateTimeField()
+
+    objects = PowerSummaryQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def headroom(self):
+        """Rated power not yet drawn (W)"""
+        return round(self.rated_power - self.measured_power, 1)
+
+    @property
+    def utilization(self):
+        """Measured load as a percentage of the rated power"""
+        if not self.rated_power:
+            return None
+        return round(self.measured_power / self.rated_power * 100, 1)
+
+    def get_phase_loads(self):
+        """Return (phase, measured power) pairs in phase order"""
+        labels = dict(PhaseChoices.CHOICES)
+        return [(labels.get(phase, phase), self.phase_power[phase]) for phase in sorted(self.phase_power)]
+
+    def get_bank_loads(self):
+        """Return (bank, measured power) pairs in bank order"""
+        return [(f"Bank {bank}", self.bank_power[bank]) for bank in sorted(self.bank_power, key=int)]
+
+    def totals(self):
+        return {
+            **{name: getattr(self, name) for name in POWER_TOTALS},
+            'phase_power': self.phase_power,
+            'bank_power': self.bank_power,
+        }
+
+
+class RackPowerSummary(PowerSummary):
+    """Power capacity of the PDUs in a rack"""
+    rack = models.OneToOneField(
+        to='dcim.Rack',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='power_summary'
+    )
+    site = models.ForeignKey(
+        to='dcim.Site',
+        on_delete=models.CASCADE,
+        related_name='rack_power_summaries'
+    )
+
+    class Meta:
+        ordering = ('site', 'rack')
+        verbose_name = 'Rack Power Summary'
+        verbose_name_plural = 'Rack Power Summaries'
+
+    def __str__(self):
+        return str(self.rack)
+
+    def get_absolute_url(self):
+        return reverse('dcim:rack_power', args=[self.pk])
+
+    @classmethod
+    def calculate(cls, rack_ids):
+        totals = aggregate_power('rack_id', rack_ids)
+        sites = dict(Rack.objects.filter(pk__in=totals.keys()).values_list('pk', 'site_id'))
+        for rack_id, item in totals.items():
+            item['site_id'] = sites[rack_id]
+        return totals
+
+
+class SitePowerSummary(PowerSummary):
+    """Power capacity of the PDUs at a site, whether racked or not"""
+    site = models.OneToOneField(
+        to='dcim.Site',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='power_summary'
+    )
+
+    class Meta:
+        ordering = ('site',)
+        verbose_name = 'Site Power Summary'
+        verbose_name_plural = 'Site Power Summaries'
+
+    def __str__(self):
+        return str(self.site)
+
+    def get_absolute_url(self):
+        return reverse('dcim:site_power', args=[self.pk])
+
+    @classmethod
+    def calculate(cls, site_ids):
+        # Racked PDUs are taken from the (already refreshed) rack summaries
+        totals = aggregate_power('site_id', site_ids, rack__isnull=True)
+        for summary in RackPowerSummary.objects.filter(site_id__in=site_ids):
+            _add_totals(totals.setdefault(summary.site_id, _empty_totals()), summary.totals())
+        return totals
+
+
+class DevicePowerDependencyQuerySet(RestrictedQuerySet):
+
+    def refresh(self, device_ids):
+        """
+        Rebuild the dependencies of the given devices (by ID) from their outlets with one
+        query, and delete those of devices which are no longer connected to any outlet
+        """
+        device_ids = set(device_ids) - {None}
+        if not device_ids:
+            return
+        feeds, sites = {}, {}
+        for device_id, outlet_id, pdu_id, site_id, phase, bank in Outlet.objects.filter(
+            connected_device_id__in=device_ids
+        ).order_by('connected_device_id', 'pdu_id', 'outlet_number').values_list(
+            'connected_device_id', 'pk', 'pdu_id', 'pdu__site_id', 'phase', 'bank_number'
+        ):
+            feeds.setdefault(device_id, []).append([outlet_id, pdu_id, PHASE_INDEX.get(phase), bank])
+            sites[pdu_id] = site_id
+
+        model = self.model
+        now = timezone.now()
+        model.objects.bulk_create(
+            [model.from_feeds(device_id, items, sites, last_updated=now) for device_id, items in feeds.items()],
+            update_conflicts=True,
+            unique_fields=['device'],
+            update_fields=[field.name for field in model._meta.concrete_fields if not field.primary_key],
+        )
+        model.objects.filter(pk__in=device_ids - feeds.keys()).delete()
+
+
+class DevicePowerDependency(models.Model):
+    """
+    The outlets feeding a device, with the PDUs, lines and banks they depend on. Kept
+    up to date whenever outlets are connected, disconnected or moved, so that single
+    fed devices and the impact of PDU, phase or bank failures are found without
+    querying outlets.
+    """
+    device = models.OneToOneField(
+        to='dcim.Device',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='power_dependency'
+    )
+    pdus = ArrayField(
+        base_field=models.PositiveIntegerField(),
+        default=list,
+        help_text="IDs of the PDUs feeding the device"
+    )
+    feeds = models.JSONField(
+        default=list,
+        help_text="Feeding outlets as [outlet ID, PDU ID, line index, bank number]"
+    )
+    outlet_count = models.PositiveSmallIntegerField(
+        default=0
+    )
+    pdu_count = models.PositiveSmallIntegerField(
+        default=0
+    )
+    line_count = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Number of distinct site lines (phases) feeding the device"
+    )
+    redundancy = models.CharField(
+        max_length=20,
+        choices=RedundancyChoices
+    )
+    last_updated = models.DateTimeField()
+
+    objects = DevicePowerDependencyQuerySet.as_manager()
+
+    class Meta:
+        ordering = ('device',)
+        indexes = (
+            GinIndex(fields=('pdus',), name='netbox_pdu_dependency_pdus'),
+            models.Index(fields=('redundancy',), name='netbox_pdu_dependency_red'),
+        )
+        verbose_name = 'Device Power Dependency'
+        verbose_name_plural = 'Device Power Dependencies'
+
+    def __str__(self):
+        return str(self.device)
+
+    def get_absolute_url(self):
+        return self.device.get_absolute_url()
+
+    def get_redundancy_color(self):
+        return RedundancyChoices.colors.get(self.redundancy)
+
+    @classmethod
+    def from_feeds(cls, device_id, feeds, sites, **kwargs):
+        """
+        Return the dependency of a device on the given feeds. `sites` maps the ID of
+        each PDU to its site ID; lines are only shared by PDUs at the same site.
+        """
+        pdus = sorted({pdu_id for _, pdu_id, _, _ in feeds})
+        lines = {(sites[pdu_id], line) for _, pdu_id, line, _ in feeds}
+        if len(pdus) == 1:
+            redundancy = RedundancyChoices.REDUNDANCY_SINGLE_PDU
+        elif len(lines) == 1 and next(iter(lines))[1] is not None:
+            redundancy = RedundancyChoices.REDUNDANCY_SINGLE_PHASE
+        else:
+            redundancy = RedundancyChoices.REDUNDANCY_REDUNDANT
+        return cls(
+            device_id=device_id,
+            pdus=pdus,
+            feeds=feeds,
+            outlet_count=len(feeds),
+            pdu_count=len(pdus),
+            line_count=len({line for line in lines if line[1] is not None}),
+            redundancy=redundancy,
+            **kwargs
+        )
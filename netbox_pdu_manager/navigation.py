@@ -12,6 +12,12 @@ menu_items = (
                 icon_class='mdi mdi-plus-thick',
                 color=ButtonColorChoices.GREEN
             ),
+            PluginMenuButton(
+                link='plugins:netbox_pdu_manager:pdu_streaming_import',
+                title='Import',
+                icon_class='mdi mdi-upload',
+                color=ButtonColorChoices.CYAN
+            ),
         )
     ),
     PluginMenuItem(
@@ -24,6 +30,42 @@ menu_items = (
                 icon_class='mdi mdi-plus-thick',
                 color=ButtonColorChoices.GREEN
             ),
+            PluginMenuButton(
+                link='plugins:netbox_pdu_manager:outlet_streaming_import',
+                title='Import',
+                icon_class='mdi mdi-upload',
+                color=ButtonColorChoices.CYAN
+            ),
         )
     ),
+    PluginMenuItem(
+        link='plugins:netbox_pdu_manager:rackpowersummary_list',
+        link_text='Rack Power',
+        permissions=['netbox_pdu_manager.view_rackpowersummary']
+    ),
+    PluginMenuItem(
+        link='plugins:netbox_pdu_manager:sitepowersummary_list',
+        link_text='Site Power',
+        permissions=['netbox_pdu_manager.view_sitepowersummary']
+    ),
+    PluginMenuItem(
+        link='plugins:netbox_pdu_manager:power_analysis',
+        link_text='Phase Balance',
+        permissions=['netbox_pdu_manager.view_pdu']
+    ),
+    PluginMenuItem(
+        link='plugins:netbox_pdu_manager:devicepowerdependency_list',
+        link_text='Power Dependencies',
+        permissions=['netbox_pdu_manager.view_devicepowerdependency']
+    ),
+    PluginMenuItem(
+        link='plugins:netbox_pdu_manager:failure_impact',
+        link_text='Failure Impact',
+        permissions=['netbox_pdu_manager.view_pdu']
+    ),
+    PluginMenuItem(
+        link='plugins:netbox_pdu_manager:energy_report',
+        link_text='Energy',
+        permissions=['netbox_pdu_manager.view_outlet']
+    ),
 )
@@ -0,0 +1,139 @@
+"""
+Create missing outlets from PDU.outlet_count
+"""
+from django.db import transaction
+from django.db.models import F
+from netbox.plugins import get_plugin_config
+
+from .choices import PDUTypeChoices, PhaseChoices
+from .models import PDU, Outlet
+
+__all__ = (
+    'ProvisionResult',
+    'build_outlets',
+    'get_drift',
+    'get_outlet_template',
+    'provision_outlets',
+)
+
+# Default outlet layout per PDU type, overridable with the `outlet_templates` setting.
+#   name, label: str.format() templates ({number}, {bank}, {pdu})
+#   bank_size:   outlets per bank, or None for PDUs without banks
+#   phases:      phases assigned to consecutive banks (or outlets) of three-phase PDUs
+DEFAULT_OUTLET_TEMPLATE = {
+    'name': '',
+    'label': '{number}',
+    'bank_size': None,
+    'phases': (PhaseChoices.LINE_1, PhaseChoices.LINE_2, PhaseChoices.LINE_3),
+}
+OUTLET_TEMPLATES = {
+    PDUTypeChoices.TYPE_RARITAN_PX2: {'bank_size': 8},
+    PDUTypeChoices.TYPE_RARITAN_PX3: {'bank_size': 8},
+    PDUTypeChoices.TYPE_RARITAN_PX4: {'bank_size': 6},
+}
+
+
+class ProvisionResult:
+
+    def __init__(self):
+        self.pdus = 0
+        self.created = 0
+
+    def serialize(self):
+        return {
+            'pdus': self.pdus,
+            'created': self.created,
+        }
+
+
+def get_outlet_template(pdu_type):
+    """Return the outlet template for a PDU type, merged with the configured overrides"""
+    overrides = get_plugin_config('netbox_pdu_manager', 'outlet_templates') or {}
+    return {
+        **DEFAULT_OUTLET_TEMPLATE,
+        **OUTLET_TEMPLATES.get(pdu_type, {}),
+        **overrides.get(pdu_type, {}),
+    }
+
+
+def build_outlets(pdu, existing=(), template=None):
+    """
+    Return unsaved Outlets for every number from 1 to pdu.outlet_count which is not in
+    `existing`. If `template` is None, outlets are created with their number only.
+    """
+    outlets = []
+    for number in range(1, pdu.outlet_count + 1):
+        if number in existing:
+            continue
+        outlet = Outlet(pdu=pdu, outlet_number=number)
+        if template is not None:
+            bank_size = template['bank_size']
+            bank = (number - 1) // bank_size + 1 if bank_size else None
+            context = {'number': number, 'bank': bank or '', 'pdu': pdu.name}
+            outlet.name = template['name'].format(**context)
+            outlet.label = template['label'].format(**context)
+            outlet.bank_number = bank
+            if pdu.phase_count == 3 and template['phases']:
+                phases = template['phases']
+                outlet.phase = phases[((bank or number) - 1) % len(phases)]
+        outlet.search_text = outlet.get_search_text(pdu_name=pdu.name)
+        outlets.append(outlet)
+    return outlets
+
+
+def provision_outlets(pdus, use_template=True, batch_size=5000, dry_run=False):
+    """
+    Create the missing outlets of every PDU in the `pdus` queryset. Each batch of PDUs
+    is handled in its own transaction with one query for the existing outlet numbers,
+    one bulk_create() and one counter refresh. Like other bulk writes, this creates no
+    change records and fires no signals. Returns a ProvisionResult.
+    """
+    result = ProvisionResult()
+    pdus = pdus.order_by('pk').only('pk', 'name', 'pdu_type', 'outlet_count', 'phase_count')
+    templates = {}
+    batch, outlet_total = [], 0
+
+    def flush():
+        existing = {}
+        for pdu_id, number in Outlet.objects.filter(pdu__in=batch).order_by().values_list('pdu_id', 'outlet_number'):
+            existing.setdefault(pdu_id, set()).add(number)
+        outlets = []
+        for pdu in batch:
+            template = None
+            if use_template:
+                if pdu.pdu_type not in templates:
+                    templates[pdu.pdu_type] = get_outlet_template(pdu.pdu_type)
+                template = templates[pdu.pdu_type]
+            created = build_outlets(pdu, existing.get(pdu.pk, ()), template)
+            if created:
+                result.pdus += 1
+                outlets.extend(created)
+        result.created += len(outlets)
+        if outlets and not dry_run:
+            with transaction.atomic():
+                # Outlets created concurrently for the same PDU are skipped
+                Outlet.objects.bulk_create(outlets, batch_size=batch_size, ignore_conflicts=True)
+                pdus = PDU.objects.filter(pk__in={outlet.pdu_id for outlet in outlets})
+                pdus.refresh_outlet_counters()
+                pdus.refresh_power_summaries()
+
+    for pdu in pdus.iterator(chunk_size=1000):
+        batch.append(pdu)
+        outlet_total += pdu.outlet_count
+        if outlet_total >= batch_size:
+            flush()
+            batch, outlet_total = [], 0
+    if batch:
+        flush()
+
+    return result
+
+
+def get_drift(pdus):
+    """
+    Return the PDUs in the `pdus` queryset whose actual outlet count (from the
+    denormalized counters) differs from outlet_count, annotated with `drift`.
+    """
+    return pdus.exclude(outlets_total=F('outlet_count')).annotate(
+        drift=F('outlets_total') - F('outlet_count')
+    )
@@ -0,0 +1,352 @@
+"""
+Asynchronous client for the Raritan JSON-RPC API (PX2/PX3/PX4)
+"""
+import itertools
+import os
+import re
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from .choices import OutletStatusChoices, PhaseChoices
+from .sessions import fingerprint
+
+__all__ = (
+    'AuthenticationError',
+    'RaritanClient',
+    'RaritanError',
+    'SessionUnsupportedError',
+    'create_session',
+    'resolve_password',
+)
+
+PDU_RID = '/model/pdu/0'
+BULK_RID = '/bulk'
+SESSION_RID = '/session'
+SESSION_HEADER = 'X-SessionToken'
+
+# JSON-RPC error code for an unknown method
+METHOD_NOT_FOUND = -32601
+
+# Sensor names returned by Outlet.getSensors() mapped to reading keys
+OUTLET_SENSORS = {
+    'voltage': 'voltage',
+    'current': 'current',
+    'activePower': 'power',
+}
+
+# Phase names reported in outlet metadata mapped to PhaseChoices
+PHASES = {
+    'L1': PhaseChoices.LINE_1,
+    'L2': PhaseChoices.LINE_2,
+    'L3': PhaseChoices.LINE_3,
+    'A': PhaseChoices.PHASE_A,
+    'B': PhaseChoices.PHASE_B,
+    'C': PhaseChoices.PHASE_C,
+}
+
+# Outlet.PowerState enumeration
+POWER_STATES = {
+    0: OutletStatusChoices.STATUS_OFF,
+    1: OutletStatusChoices.STATUS_ON,
+}
+
+
+class RaritanError(Exception):
+    """Raised when a PDU returns an error or an unexpected response"""
+    pass
+
+
+class AuthenticationError(RaritanError):
+    """Raised when a PDU rejects the configured credentials"""
+    pass
+
+
+class SessionUnsupportedError(RaritanError):
+    """Raised when a PDU's firmware has no session API"""
+    pass
+
+
+def resolve_password(ref):
+    """
+    Resolve PDU.api_password_ref to a password.
+    Supports "env:VARIABLE" and "file:/path" references; any other value is used as-is.
+    """
+    if ref.startswith('env:'):
+        return os.environ.get(ref[4:], '')
+    if ref.startswith('file:'):
+        with open(ref[5:]) as f:
+            return f.read().strip()
+    return ref
+
+
+def create_session(concurrency, timeout, verify_ssl=True, keepalive_timeout=60):
+    """
+    Create an aiohttp session backed by a bounded pool of keep-alive connections.
+    One session should be shared by every client polled during a sweep, or kept
+    open across sweeps to reuse connections (see collector.Poller).
+    """
+    if aiohttp is None:
+        raise RaritanError("aiohttp is required for Raritan API sync (pip install netbox-pdu-manager[sync])")
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=4,
+        keepalive_timeout=keepalive_timeout,
+        ssl=verify_ssl,
+        ttl_dns_cache=3600,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        raise_for_status=False,
+    )
+
+
+class RaritanClient:
+    """
+    JSON-RPC client for a single PDU. Per-outlet calls are batched through the /bulk
+    endpoint, so polling a PDU costs three round trips regardless of its outlet count.
+
+    If a SessionCache is given as `tokens`, the client logs in once and sends the
+    cached session token instead of basic auth credentials, logging in again if the
+    PDU rejects the token.
+    """
+    def __init__(self, session, base_url, username='', password='', tokens=None, key=None):
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.auth = aiohttp.BasicAuth(username, password) if username else None
+        self.tokens = tokens if username else None
+        self.key = key if key is not None else self.base_url
+        self.fingerprint = fingerprint(self.base_url, username, password) if self.tokens is not None else None
+        self._ids = itertools.count(1)
+
+    async def _post(self, rid, payload, headers=None, auth=None):
+        for attempt in (1, 2):
+            try:
+                async with self.session.post(
+                    f'{self.base_url}{rid}', json=payload, headers=headers, auth=auth
+                ) as response:
+                    if response.status != 200:
+                        return response.status, None
+                    return response.status, await response.json(content_type=None)
+            except aiohttp.ServerDisconnectedError:
+                # A keep-alive connection closed by the PDU while idle in the pool
+                if attempt == 2:
+                    raise
+
+    async def login(self):
+        """Open a session with SessionManager.newSession() and return its token"""
+        payload = {
+            'jsonrpc': '2.0',
+            'method': 'newSession',
+            'id': next(self._ids),
+            'params': {'username': self.username, 'password': self.password},
+        }
+        status, data = await self._post(SESSION_RID, payload)
+        if status == 401:
+            raise AuthenticationError("Authentication failed")
+        if status == 404 or (
+            status == 200 and isinstance(data, dict) and (data.get('error') or {}).get('code') == METHOD_NOT_FOUND
+        ):
+            raise SessionUnsupportedError(f"newSession on {SESSION_RID} is not supported")
+        if status != 200:
+            raise RaritanError(f"newSession on {SESSION_RID} returned HTTP {status}")
+        token = self._result(data, 'newSession').get('token')
+        if not token:
+            raise RaritanError("newSession returned no token")
+        return token
+
+    async def _credentials(self):
+        """Return the (headers, auth) of the next request"""
+        if self.tokens is None:
+            return None, self.auth
+        token = self.tokens.get(self.key, self.fingerprint)
+        if token is None:
+            try:
+                token = await self.login()
+            except SessionUnsupportedError:
+                # Firmware without session support; remember to use basic auth. Any other
+                # login failure fails the poll, and the next poll logs in again.
+                token = ''
+            self.tokens.put(self.key, self.fingerprint, token)
+        if not token:
+            return None, self.auth
+        return {SESSION_HEADER: token}, None
+
+    async def call(self, rid, method, params=None):
+        """Invoke a single JSON-RPC method and return its result"""
+        payload = {'jsonrpc': '2.0', 'method': method, 'id': next(self._ids)}
+        if params is not None:
+            payload['params'] = params
+        headers, auth = await self._credentials()
+        status, data = await self._post(rid, payload, headers, auth)
+        if status == 401 and headers:
+            # The PDU closed the session (timeout, reboot or logout); log in again once
+            self.tokens.discard(self.key, reauth=True)
+            headers, auth = await self._credentials()
+            status, data = await self._post(rid, payload, headers, auth)
+        if status != 200:
+            raise RaritanError(f"{method} on {rid} returned HTTP {status}")
+        return self._result(data, method)
+
+    async def bulk(self, requests):
+        """
+        Invoke several (rid, method) or (rid, method, params) requests in one round trip
+        through the bulk endpoint. Returns the results in request order; failed
+        sub-requests yield None.
+        """
+        if not requests:
+            return []
+        subrequests = []
+        for i, (rid, method, *params) in enumerate(requests):
+            payload = {'jsonrpc': '2.0', 'method': method, 'id': i}
+            if params:
+                payload['params'] = params[0]
+            subrequests.append({'rid': rid, 'json': payload})
+        result = await self.call(BULK_RID, 'performRequest', {'requests': subrequests})
+        results = []
+        for response in result.get('responses', []):
+            if response.get('statcode') != 200:
+                results.append(None)
+                continue
+            try:
+                results.append(self._result(response['json'], 'performRequest'))
+            except (RaritanError, KeyError):
+                results.append(None)
+        return results
+
+    @staticmethod
+    def _result(data, method):
+        if 'error' in data:
+            raise RaritanError(f"{method} failed: {data['error'].get('message', data['error'])}")
+        try:
+            return data['result']
+        except (KeyError, TypeError):
+            raise RaritanError(f"{method} returned a malformed response")
+
+    async def get_outlet_rids(self):
+        """Return the resource IDs of all outlets, ordered by outlet number"""
+        result = await self.call(PDU_RID, 'getOutlets')
+        return [outlet['rid'] for outlet in result['_ret_']]
+
+    async def set_power_states(self, outlet_numbers, state, outlet_rids=None):
+        """
+        Switch the given outlets on (1) or off (0), in one bulk request unless the
+        firmware rejects it. Returns a {outlet_number: error} map of the failures.
+        """
+        outlet_rids = outlet_rids or await self.get_outlet_rids()
+        errors = {}
+        requests = []
+        for number in outlet_numbers:
+            if 1 <= number <= len(outlet_rids):
+                requests.append((number, outlet_rids[number - 1]))
+            else:
+                errors[number] = "No such outlet on the PDU"
+        try:
+            results = await self.bulk([(rid, 'setPowerState', {'pstate': state}) for _, rid in requests])
+        except RaritanError:
+            # Firmware without the bulk endpoint; switch one outlet per request
+            results = []
+            for _, rid in requests:
+                try:
+                    results.append(await self.call(rid, 'setPowerState', {'pstate': state}))
+                except RaritanError:
+                    results.append(None)
+        results += [None] * (len(requests) - len(results))
+        for (number, _), result in zip(requests, results):
+            if result is None:
+                errors[number] = "setPowerState failed"
+            elif (result.get('_ret_') or 0) != 0:
+                errors[number] = f"setPowerState returned {result['_ret_']}"
+        return errors
+
+    async def get_sensor_rids(self, outlet_rids):
+        """Return a {sensor: rid} map for each outlet"""
+        results = await self.bulk([(rid, 'getSensors') for rid in outlet_rids])
+        sensor_rids = []
+        for result in results:
+            sensors = (result or {}).get('_ret_') or {}
+            sensor_rids.append({
+                key: sensors[name]['rid']
+                for name, key in OUTLET_SENSORS.items()
+                if sensors.get(name)
+            })
+        return sensor_rids
+
+    async def get_outlet_readings(self):
+        """
+        Poll the state and sensor readings of every outlet.
+        Returns a list of dicts keyed by outlet number.
+        """
+        outlet_rids = await self.get_outlet_rids()
+        sensor_rids = await self.get_sensor_rids(outlet_rids)
+
+        requests = []
+        for outlet_rid, sensors in zip(outlet_rids, sensor_rids):
+            requests.append((outlet_rid, 'getState'))
+            requests.extend((rid, 'getReading') for rid in sensors.values())
+        results = iter(await self.bulk(requests))
+
+        readings = []
+        for number, sensors in enumerate(sensor_rids, start=1):
+            state = (next(results, None) or {}).get('_ret_') or {}
+            reading = {
+                'outlet_number': number,
+                'status': POWER_STATES.get(state.get('powerState'), OutletStatusChoices.STATUS_UNKNOWN),
+            }
+            for key in sensors:
+                value = (next(results, None) or {}).get('_ret_') or {}
+                reading[key] = value['value'] if value.get('valid') else None
+            readings.append(reading)
+        return readings
+
+    async def get_inventory(self):
+        """
+        Return the nameplate, firmware and outlet layout of the PDU in two round trips:
+        a dict with serial_number, manufacturer, model, firmware_version, api_version,
+        outlet_count, phase_count (None if unknown) and `outlets`, a list of
+        {outlet_number, name, label, phase} dicts.
+        """
+        metadata, outlets = await self.bulk([
+            (PDU_RID, 'getMetaData'),
+            (PDU_RID, 'getOutlets'),
+        ])
+        if metadata is None or outlets is None:
+            raise RaritanError("getMetaData or getOutlets failed")
+        metadata = metadata.get('_ret_') or {}
+        nameplate = metadata.get('nameplate') or {}
+        outlet_rids = [outlet['rid'] for outlet in outlets.get('_ret_') or ()]
+
+        results = iter(await self.bulk([
+            request for rid in outlet_rids for request in ((rid, 'getMetaData'), (rid, 'getSettings'))
+        ]))
+        inventory_outlets = []
+        for number in range(1, len(outlet_rids) + 1):
+            outlet_metadata = (next(results, None) or {}).get('_ret_') or {}
+            outlet_settings = (next(results, None) or {}).get('_ret_') or {}
+            inventory_outlets.append({
+                'outlet_number': number,
+                'name': outlet_settings.get('name') or '',
+                'label': outlet_metadata.get('label') or '',
+                'phase': PHASES.get(outlet_metadata.get('phase') or '', ''),
+            })
+
+        firmware = metadata.get('fwRevision') or ''
+        # The JSON-RPC API is versioned with the firmware (major.minor.patch)
+        api_version = re.match(r'\d+(\.\d+){0,2}', firmware)
+        phases = {outlet['phase'] for outlet in inventory_outlets} - {''}
+        return {
+            'serial_number': nameplate.get('serialNumber') or '',
+            'manufacturer': nameplate.get('manufacturer') or '',
+            'model': nameplate.get('model') or '',
+            'firmware_version': firmware,
+            'api_version': api_version.group() if api_version else '',
+            'outlet_count': len(outlet_rids),
+            # Left as None if the PDU reports no outlet phases
+            'phase_count': (3 if len(phases) > 1 else 1) if phases else None,
+            'outlets': inventory_outlets,
+        }
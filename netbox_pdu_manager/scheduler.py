@@ -0,0 +1,251 @@
+"""
+Adaptive per-PDU polling scheduler
+
+Each pollable PDU has a PDUPollState holding its next poll time. A PDU is polled
+more often while its readings change or its load approaches the rated current, and
+less often while it is stable. Failed polls back off exponentially. Every next poll
+time is jittered so that PDUs do not fall into lockstep.
+"""
+import logging
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .choices import PHASE_INDEX, PollReasonChoices
+from .collector import collect_readings, get_session_stats, store_readings
+from .models import PDU, Outlet, PDUPollState, bulk_update_rows
+
+__all__ = (
+    'claim_pdus',
+    'ensure_poll_states',
+    'get_due_pdus',
+    'get_line_load',
+    'next_state',
+    'run_scheduled',
+)
+
+logger = logging.getLogger('netbox.netbox_pdu_manager.scheduler')
+
+# Fraction of changed outlets above which a PDU counts as changing quickly
+CHANGING_FRACTION = 0.25
+
+# Priority of due PDUs by reason; higher is polled first when capacity is short
+PRIORITIES = {
+    PollReasonChoices.REASON_NEAR_LIMIT: 3,
+    PollReasonChoices.REASON_CHANGING: 2,
+    PollReasonChoices.REASON_INITIAL: 1,
+    PollReasonChoices.REASON_STEADY: 1,
+    PollReasonChoices.REASON_STABLE: 0,
+    PollReasonChoices.REASON_BACKOFF: -1,
+}
+
+
+def get_settings():
+    """Return the poll_scheduler settings, with any keys not configured taken from the defaults"""
+    return {
+        'base_interval': get_plugin_config('netbox_pdu_manager', 'sync_interval'),
+        **config.default_settings['poll_scheduler'],
+        **get_plugin_config('netbox_pdu_manager', 'poll_scheduler'),
+    }
+
+
+def _jitter(seconds, jitter):
+    return timedelta(seconds=seconds * (1 + random.uniform(-jitter, jitter)))
+
+
+def ensure_poll_states(now=None, settings=None):
+    """
+    Create the poll state of pollable PDUs which have none. Their first polls are
+    spread evenly over one base interval. Returns the number of states created.
+    """
+    now = now or timezone.now()
+    settings = settings or get_settings()
+    base = settings['base_interval']
+    pdu_ids = PDU.objects.exclude(api_url='').filter(poll_state__isnull=True).values_list('pk', flat=True)
+    states = [
+        PDUPollState(
+            pdu_id=pk,
+            next_poll=now + timedelta(seconds=random.uniform(0, base)),
+            interval=base,
+            priority=PRIORITIES[PollReasonChoices.REASON_INITIAL],
+        )
+        for pk in pdu_ids
+    ]
+    PDUPollState.objects.bulk_create(states, batch_size=1000, ignore_conflicts=True)
+    return len(states)
+
+
+def get_due_pdus(now=None, limit=None):
+    """Return the pollable PDUs due at `now`, by descending priority and then by due time"""
+    now = now or timezone.now()
+    queryset = PDU.objects.exclude(api_url='').filter(poll_state__next_poll__lte=now).order_by(
+        '-poll_state__priority', 'poll_state__next_poll'
+    ).select_related('poll_state').only(
+        'pk', 'name', 'site', 'api_url', 'api_username', 'api_password_ref', 'rated_current', 'phase_count',
+        'poll_state'
+    )
+    if limit:
+        queryset = queryset[:limit]
+    return list(queryset)
+
+
+def claim_pdus(pdus, worker, now, ttl):
+    """
+    Lease the given PDUs to `worker` for `ttl` seconds and return those which were
+    claimed. PDUs holding an unexpired lease, locked by a concurrent claim or no
+    longer due (rescheduled by a worker which polled them since they were read) are
+    skipped, so no PDU is polled by two workers at once.
+    """
+    pdus = {pdu.pk: pdu for pdu in pdus}
+    with transaction.atomic():
+        claimed = set(
+            PDUPollState.objects.select_for_update(skip_locked=True).filter(
+                Q(lease_expires__isnull=True) | Q(lease_expires__lt=now),
+                pk__in=pdus.keys(),
+                next_poll__lte=now
+            ).values_list('pk', flat=True)
+        )
+        PDUPollState.objects.filter(pk__in=claimed).update(
+            leased_by=worker,
+            lease_expires=now + timedelta(seconds=ttl)
+        )
+    return [pdu for pk, pdu in pdus.items() if pk in claimed]
+
+
+def get_line_load(pdu, readings, phases=None):
+    """
+    Return the current of the PDU's most loaded line relative to its rated current,
+    with outlets on lines as in analysis.py. `phases` maps outlet numbers of a three
+    phase PDU to line indexes; the current of outlets without a phase is spread evenly
+    over the lines.
+    """
+    currents = [
+        (reading['outlet_number'], reading['current'])
+        for reading in readings or () if reading.get('current') is not None
+    ]
+    if not currents or not pdu.rated_current:
+        return None
+    line_count = 3 if pdu.phase_count == 3 else 1
+    # Every outlet of a single phase PDU is on its one line
+    phases = (phases or {}) if line_count == 3 else {}
+    lines = [0.0] * line_count
+    unassigned = 0.0
+    for number, current in currents:
+        line = phases.get(number, 0 if line_count == 1 else None)
+        if line is None:
+            unassigned += current
+        else:
+            lines[line] += current
+    return (max(lines) + unassigned / line_count) / pdu.rated_current
+
+
+def _get_outlet_phases(pdu_ids):
+    """Return {pdu_id: {outlet_number: line index}} for the phased outlets of three phase PDUs"""
+    phases = {}
+    outlets = Outlet.objects.filter(pdu_id__in=pdu_ids, pdu__phase_count=3).exclude(phase='')
+    for pdu_id, number, phase in outlets.values_list('pdu_id', 'outlet_number', 'phase'):
+        if phase in PHASE_INDEX:
+            phases.setdefault(pdu_id, {})[number] = PHASE_INDEX[phase]
+    return phases
+
+
+def next_state(state, pdu, now, settings, readings=None, changed=0, error=None, phases=None):
+    """
+    Update a PDUPollState after a poll: readings is the PDU's list of outlet readings
+    and changed the number of outlets updated from them, or error the failure. The
+    load is that of the PDU's most loaded line (see get_line_load()).
+    """
+    state.last_poll = now
+    if error is not None:
+        state.failures += 1
+        state.last_error = str(error)[:200]
+        state.reason = PollReasonChoices.REASON_BACKOFF
+        delay = min(settings['max_backoff'], state.interval * 2 ** state.failures)
+    else:
+        state.failures = 0
+        state.last_error = ''
+        state.load = get_line_load(pdu, readings, phases)
+        if state.load is not None and state.load >= settings['load_threshold']:
+            state.reason = PollReasonChoices.REASON_NEAR_LIMIT
+            state.interval = settings['min_interval']
+        elif readings and changed / len(readings) > CHANGING_FRACTION:
+            state.reason = PollReasonChoices.REASON_CHANGING
+            state.interval = state.interval // 2
+        elif not changed:
+            state.reason = PollReasonChoices.REASON_STABLE
+            state.interval = int(state.interval * 1.5)
+        else:
+            state.reason = PollReasonChoices.REASON_STEADY
+        state.interval = max(settings['min_interval'], min(settings['max_interval'], state.interval))
+        delay = state.interval
+    state.priority = PRIORITIES[state.reason]
+    state.next_poll = now + _jitter(delay, settings['jitter'])
+    state.leased_by = ''
+    state.lease_expires = None
+    return state
+
+
+def run_scheduled(now=None, limit=None, concurrency=None, timeout=None, worker='', shard=None):
+    """
+    Poll the PDUs which are due (and, if `shard` is given, for which shard(pdu) is
+    true), store their readings and reschedule them. The PDUs are leased to `worker`
+    while they are polled. Returns a summary dict suitable for job data.
+    """
+    started = time.monotonic()
+    now = now or timezone.now()
+    settings = get_settings()
+    ensure_poll_states(now, settings)
+
+    pdus = get_due_pdus(now)
+    if shard is not None:
+        pdus = [pdu for pdu in pdus if shard(pdu)]
+    if limit:
+        pdus = pdus[:limit]
+    pdus = claim_pdus(pdus, worker, now, settings['lease_ttl'])
+    readings, errors = collect_readings(pdus, concurrency=concurrency, timeout=timeout)
+    polled = time.monotonic()
+    changed = Counter(outlet.pdu_id for outlet in store_readings(readings, timezone.now()))
+    phases = _get_outlet_phases([pdu.pk for pdu in pdus if pdu.pk in readings and pdu.phase_count == 3])
+
+    states = []
+    for pdu in pdus:
+        state = next_state(
+            pdu.poll_state, pdu, now, settings,
+            readings=readings.get(pdu.pk),
+            changed=changed[pdu.pk],
+            error=errors.get(pdu.pk),
+            phases=phases.get(pdu.pk),
+        )
+        logger.debug(f"PDU {pdu.pk}: {state.reason}, next poll in {(state.next_poll - now).total_seconds():.0f}s")
+        states.append(state)
+    bulk_update_rows(
+        states,
+        (
+            'next_poll', 'interval', 'priority', 'reason', 'load', 'failures', 'last_poll', 'last_error',
+            'leased_by', 'lease_expires',
+        ),
+        batch_size=1000
+    )
+
+    for pk, error in errors.items():
+        logger.warning(f"Polling PDU {pk} failed: {error!r}")
+
+    return {
+        'pdus': len(pdus),
+        'succeeded': len(readings),
+        'failed': len(errors),
+        'outlets_updated': sum(changed.values()),
+        'reasons': dict(Counter(state.reason for state in states)),
+        'sessions': get_session_stats(),
+        # PDUs left due because of `limit` or held by other workers
+        'backlog': PDUPollState.objects.filter(next_poll__lte=now).exclude(pdu__api_url='').count(),
+        'poll_seconds': round(polled - started, 3),
+        'write_seconds': round(time.monotonic() - polled, 3),
+    }
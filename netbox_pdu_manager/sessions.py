@@ -0,0 +1,234 @@
+"""
+Cache of Raritan session tokens
+
+Authenticating with HTTP basic auth makes the PDU verify the password on every
+request. Instead, each PDU is logged in once with SessionManager.newSession() and
+the returned token is sent in the X-SessionToken header of later requests, across
+poll cycles. Tokens are kept in a per-process LRU cache keyed by PDU and, if
+enabled, shared with other processes through the Django cache, encrypted with a
+key derived from SECRET_KEY.
+"""
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+from netbox.plugins import get_plugin_config
+
+from . import config
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # pragma: no cover
+    Fernet = None
+
+__all__ = (
+    'SessionCache',
+    'get_session_cache',
+)
+
+logger = logging.getLogger('netbox.netbox_pdu_manager.sessions')
+
+CACHE_KEY = 'netbox_pdu_manager:session:{}'
+
+
+def get_settings():
+    return {
+        **config.default_settings['sessions'],
+        **get_plugin_config('netbox_pdu_manager', 'sessions'),
+    }
+
+
+def fingerprint(*credentials):
+    """Return a digest identifying the URL and credentials a token was issued for"""
+    return hashlib.blake2b('\0'.join(credentials).encode(), digest_size=16).hexdigest()
+
+
+def get_cipher():
+    """Return the Fernet cipher for tokens in the shared cache, keyed from SECRET_KEY"""
+    key = salted_hmac('netbox_pdu_manager.sessions', 'shared-tokens', algorithm='sha256').digest()
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+class SessionToken:
+    __slots__ = ('token', 'fingerprint', 'created', 'last_used')
+
+    def __init__(self, token, fingerprint, created, last_used=None):
+        self.token = token
+        self.fingerprint = fingerprint
+        self.created = created
+        self.last_used = last_used or created
+
+    def serialize(self):
+        return (self.token, self.fingerprint, self.created, self.last_used)
+
+
+class SessionCache:
+    """
+    LRU cache of session tokens keyed by PDU ID. A token is treated as expired
+    `refresh_margin` seconds before the PDU would drop it for being idle, so a
+    poll never starts with a token which could expire part way through.
+    """
+    def __init__(self, max_sessions=10000, idle_timeout=600, refresh_margin=60, shared=False):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.refresh_margin = refresh_margin
+        if shared and Fernet is None:
+            logger.warning("Session tokens are not shared: the cryptography package is not installed")
+            shared = False
+        self.shared = shared
+        self._cipher = get_cipher() if shared else None
+        self._tokens = OrderedDict()
+        self._dirty = set()
+        self._discarded = set()
+        self._lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ('hits', 'misses', 'refreshes', 'reauths', 'evictions', 'fallbacks'), 0
+        )
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def _expired(self, entry, now):
+        return now >= entry.last_used + self.idle_timeout - self.refresh_margin
+
+    def get(self, key, fingerprint, now=None):
+        """
+        Return the cached token for `key`, an empty string if the PDU does not support
+        sessions, or None if it must log in (again)
+        """
+        now = now or time.time()
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            if entry.fingerprint != fingerprint or self._expired(entry, now):
+                self.counters['refreshes'] += 1
+                self._remove(key)
+                return None
+            self.counters['hits' if entry.token else 'fallbacks'] += 1
+            entry.last_used = now
+            self._tokens.move_to_end(key)
+            self._dirty.add(key)
+            return entry.token
+
+    def put(self, key, fingerprint, token, now=None):
+        """
+        Store a newly issued token (or an empty string for a PDU without session support,
+        so that it is not asked to log in on every poll), evicting the least recently used
+        tokens beyond max_sessions
+        """
+        now = now or time.time()
+        with self._lock:
+            self._tokens[key] = SessionToken(token, fingerprint, now)
+            self._tokens.move_to_end(key)
+            self._dirty.add(key)
+            self._discarded.discard(key)
+            while len(self._tokens) > self.max_sessions:
+                evicted, _ = self._tokens.popitem(last=False)
+                self._dirty.discard(evicted)
+                self.counters['evictions'] += 1
+
+    def discard(self, key, reauth=False):
+        """Drop the token for `key`, e.g. after the PDU rejected it with HTTP 401"""
+        with self._lock:
+            if reauth:
+                self.counters['reauths'] += 1
+            self._remove(key)
+
+    def _remove(self, key):
+        self._tokens.pop(key, None)
+        self._dirty.discard(key)
+        self._discarded.add(key)
+
+    def prune(self, now=None):
+        """Drop every token which has been idle for too long. Returns the number dropped."""
+        now = now or time.time()
+        with self._lock:
+            expired = [key for key, entry in self._tokens.items() if self._expired(entry, now)]
+            for key in expired:
+                self._tokens.pop(key)
+                self._dirty.discard(key)
+            return len(expired)
+
+    #
+    # Sharing through the Django cache
+    #
+
+    def _encrypt(self, entry):
+        return self._cipher.encrypt(json.dumps(entry.serialize()).encode())
+
+    def _decrypt(self, value):
+        """Return the SessionToken in a shared cache value, or None if it cannot be decrypted"""
+        try:
+            return SessionToken(*json.loads(self._cipher.decrypt(value, ttl=self.idle_timeout)))
+        except (InvalidToken, TypeError, ValueError):
+            # Written with another SECRET_KEY, or not by this version
+            return None
+
+    def load(self, keys):
+        """Fetch the tokens for `keys` which are not cached in this process from the shared cache"""
+        if not self.shared:
+            return
+        with self._lock:
+            missing = {CACHE_KEY.format(key): key for key in keys if key not in self._tokens}
+        if not missing:
+            return
+        found = cache.get_many(missing.keys())
+        with self._lock:
+            for cache_key, value in found.items():
+                key = missing[cache_key]
+                entry = self._decrypt(value)
+                if entry is not None and key not in self._tokens:
+                    self._tokens[key] = entry
+                    self._tokens.move_to_end(key, last=False)
+
+    def save(self):
+        """Write tokens issued or used since the last save to the shared cache, encrypted"""
+        if not self.shared:
+            return
+        with self._lock:
+            changed = {
+                CACHE_KEY.format(key): self._encrypt(self._tokens[key])
+                for key in self._dirty if key in self._tokens
+            }
+            discarded = [CACHE_KEY.format(key) for key in self._discarded]
+            self._dirty.clear()
+            self._discarded.clear()
+        if discarded:
+            cache.delete_many(discarded)
+        if changed:
+            cache.set_many(changed, timeout=self.idle_timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['sessions'] = sum(1 for entry in self._tokens.values() if entry.token)
+        lookups = stats['hits'] + stats['misses'] + stats['refreshes']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+
+_session_cache = None
+
+
+def get_session_cache():
+    """Return the process-wide SessionCache, or None if session tokens are disabled"""
+    global _session_cache
+    if _session_cache is None:
+        settings = get_settings()
+        if not settings['enabled']:
+            return None
+        _session_cache = SessionCache(
+            max_sessions=settings['max_sessions'],
+            idle_timeout=settings['idle_timeout'],
+            refresh_margin=settings['refresh_margin'],
+            shared=settings['shared'],
+        )
+    return _session_cache
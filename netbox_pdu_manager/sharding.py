@@ -0,0 +1,234 @@
+"""
+Sharded collector workers
+
+Each worker registers a heartbeat in CollectorWorker. The workers with a recent
+heartbeat form a consistent hash ring, and every worker polls only the due PDUs
+which hash to it (by PDU or by site). When a worker joins or leaves, only the
+PDUs on its arcs of the ring move. Leases on PDUPollState (see
+scheduler.claim_pdus()) keep a PDU from being polled twice while the ring
+changes.
+
+With the spool enabled, a worker which loses the database keeps polling the PDUs
+of its last known shard every sync_interval and spools their readings, and replays
+the spool in a background thread once the database is back.
+"""
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.db import DatabaseError, close_old_connections, connection
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .models import PDU, CollectorWorker
+from .collector import close_poller, collect_readings
+from .scheduler import run_scheduled
+from .spool import get_spool, replay_spool, spool_readings
+
+__all__ = (
+    'HashRing',
+    'Worker',
+    'default_worker_name',
+    'get_live_workers',
+)
+
+logger = logging.getLogger('netbox.netbox_pdu_manager.sharding')
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring with `replicas` virtual nodes per member"""
+
+    def __init__(self, nodes=(), replicas=128):
+        self.nodes = sorted(nodes)
+        self._ring = sorted(
+            (_hash(f'{node}#{i}'), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self._keys = [key for key, _ in self._ring]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, key):
+        """Return the node which owns `key`, or None if the ring is empty"""
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+def default_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def get_settings():
+    return {
+        **config.default_settings['collector'],
+        **get_plugin_config('netbox_pdu_manager', 'collector'),
+    }
+
+
+def get_live_workers(now=None, settings=None):
+    """Return the names of the workers with a heartbeat newer than heartbeat_ttl, sorted"""
+    now = now or timezone.now()
+    settings = settings or get_settings()
+    cutoff = now - timedelta(seconds=settings['heartbeat_ttl'])
+    return sorted(CollectorWorker.objects.filter(heartbeat__gte=cutoff).values_list('name', flat=True))
+
+
+class Worker:
+    """
+    A collector worker process. Each pass renews the heartbeat, rebuilds the ring
+    from the live workers and polls the due PDUs of this worker's shard.
+    """
+    def __init__(self, name=None, limit=None, concurrency=None, timeout=None):
+        self.name = name or default_worker_name()
+        self.limit = limit
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.settings = get_settings()
+        self.started = timezone.now()
+        self.polled = 0
+        self.ring = HashRing()
+        self.stopping = False
+        # The PDUs of this worker's shard, polled while the database is unavailable
+        self.offline_pdus = []
+        self.offline_refreshed = None
+        self.offline_polled = None
+        self.replayer = None
+
+    def shard_key(self, pdu):
+        if self.settings['shard_key'] == 'site':
+            return f'site:{pdu.site_id}'
+        return f'pdu:{pdu.pk}'
+
+    def owns(self, pdu):
+        return self.ring.get(self.shard_key(pdu)) == self.name
+
+    def heartbeat(self, now):
+        """Renew this worker's heartbeat and rebuild the ring from the live workers"""
+        CollectorWorker.objects.update_or_create(
+            name=self.name,
+            defaults={'heartbeat': now, 'polled': self.polled},
+            create_defaults={'heartbeat': now, 'started': self.started},
+        )
+        nodes = get_live_workers(now, self.settings)
+        if nodes != self.ring.nodes:
+            logger.info(f"Worker {self.name}: ring changed to {len(nodes)} workers")
+            self.ring = HashRing(nodes, replicas=self.settings['replicas'])
+
+    def run_once(self):
+        """Run a single pass. Returns the scheduler summary."""
+        close_old_connections()
+        now = timezone.now()
+        self.heartbeat(now)
+        summary = run_scheduled(
+            now=now,
+            limit=self.limit,
+            concurrency=self.concurrency,
+            timeout=self.timeout,
+            worker=self.name,
+            shard=self.owns,
+        )
+        self.polled += summary['pdus']
+        if get_spool() is not None:
+            self.refresh_offline_pdus()
+            self.start_replay()
+        return summary
+
+    def refresh_offline_pdus(self):
+        """Remember the PDUs of this worker's shard, at most once per sync_interval"""
+        interval = get_plugin_config('netbox_pdu_manager', 'sync_interval')
+        if self.offline_refreshed is not None and time.monotonic() - self.offline_refreshed < interval:
+            return
+        pdus = PDU.objects.exclude(api_url='').order_by('pk').only(
+            'pk', 'name', 'site', 'api_url', 'api_username', 'api_password_ref'
+        )
+        self.offline_pdus = [pdu for pdu in pdus if self.owns(pdu)]
+        self.offline_refreshed = time.monotonic()
+
+    def poll_offline(self):
+        """
+        Poll the remembered PDUs of this worker's shard every sync_interval while the
+        database is unavailable; their readings end up in the spool. Returns the number
+        of PDUs polled.
+        """
+        interval = get_plugin_config('netbox_pdu_manager', 'sync_interval')
+        if not self.offline_pdus or (
+            self.offline_polled is not None and time.monotonic() - self.offline_polled < interval
+        ):
+            return 0
+        self.offline_polled = time.monotonic()
+        readings, _ = collect_readings(self.offline_pdus, concurrency=self.concurrency, timeout=self.timeout)
+        # Spooled directly rather than after another failed write
+        spool_readings(readings, timezone.now())
+        logger.info(
+            f"Worker {self.name}: polled {len(readings)}/{len(self.offline_pdus)} PDUs while the database "
+            f"is unavailable"
+        )
+        return len(self.offline_pdus)
+
+    def start_replay(self):
+        """Replay the spool in a background thread, so that polling is not held up"""
+        if self.replayer is not None and self.replayer.is_alive():
+            return
+        if not len(get_spool()):
+            return
+
+        def replay():
+            try:
+                replay_spool(stop=lambda: self.stopping)
+            finally:
+                connection.close()
+
+        self.replayer = threading.Thread(target=replay, name=f'{self.name}-replay', daemon=True)
+        self.replayer.start()
+
+    def run(self, interval=1.0):
+        """Run passes until stop() is called, sleeping `interval` seconds between idle passes"""
+        try:
+            while not self.stopping:
+                try:
+                    summary = self.run_once()
+                except DatabaseError as e:
+                    if get_spool() is None:
+                        raise
+                    logger.warning(f"Worker {self.name}: database unavailable: {e}")
+                    self.poll_offline()
+                    time.sleep(interval)
+                    continue
+                if summary['pdus']:
+                    logger.info(
+                        f"Worker {self.name}: polled {summary['succeeded']}/{summary['pdus']} PDUs "
+                        f"({summary['failed']} failed) in {summary['poll_seconds'] + summary['write_seconds']:.1f}s, "
+                        f"session hit rate {(summary['sessions'] or {}).get('hit_rate')}"
+                    )
+                else:
+                    time.sleep(interval)
+        finally:
+            self.deregister()
+            close_poller()
+            if self.replayer is not None:
+                self.replayer.join()
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def deregister(self):
+        """Leave the ring so that the other workers take over this worker's shard at once"""
+        try:
+            CollectorWorker.objects.filter(name=self.name).delete()
+        except DatabaseError as e:
+            # The heartbeat expires instead
+            logger.warning(f"Worker {self.name}: deregistering failed: {e}")
@@ -0,0 +1,121 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import metrics
+from .livefeed import get_settings as get_live_settings, publish_outlets
+from .models import DevicePowerDependency, PDU, Outlet, refresh_power_summaries, telemetry_updated
+
+# Outlet changes are collected per thread and applied once the transaction commits, so
+# that saving or deleting many outlets (bulk edit or delete, or a PDU's cascade delete)
+# refreshes each PDU and device once
+_pending = threading.local()
+
+
+def _queue(pdu_ids=(), device_ids=(), outlets=(), deleted=()):
+    if not hasattr(_pending, 'pdu_ids'):
+        _pending.pdu_ids, _pending.device_ids, _pending.outlets, _pending.deleted = set(), set(), set(), {}
+    _pending.pdu_ids.update(pdu_ids)
+    _pending.device_ids.update(device_ids)
+    _pending.outlets.update(outlet.pk for outlet in outlets)
+    _pending.deleted.update((outlet.pk, outlet) for outlet in deleted)
+    # Callbacks queued by later changes find nothing left to do
+    transaction.on_commit(_refresh)
+
+
+def _refresh():
+    if not hasattr(_pending, 'pdu_ids'):
+        return
+    pdu_ids, device_ids = _pending.pdu_ids - {None}, _pending.device_ids - {None}
+    outlets, deleted = _pending.outlets, _pending.deleted
+    del _pending.pdu_ids, _pending.device_ids, _pending.outlets, _pending.deleted
+    if pdu_ids:
+        PDU.objects.filter(pk__in=pdu_ids).refresh_outlet_counters()
+        PDU.objects.filter(pk__in=pdu_ids).refresh_power_summaries()
+        metrics.refresh_pdus(pdu_ids)
+    # Saved outlets are read back in one query, as committed
+    if outlets - set(deleted) and get_live_settings()['enabled']:
+        publish_outlets(Outlet.objects.filter(pk__in=outlets - set(deleted)).only(
+            'pk', 'pdu_id', 'status', 'last_measured_power'
+        ))
+    publish_outlets(deleted.values(), deleted=True)
+    DevicePowerDependency.objects.refresh(device_ids)
+
+
+def _deleting_pdus():
+    if not hasattr(_pending, 'deleting_pdus'):
+        _pending.deleting_pdus = set()
+    return _pending.deleting_pdus
+
+
+@receiver((post_save, post_delete), sender=Outlet)
+def update_outlet_counters(instance, signal, **kwargs):
+    """
+    Queue the refresh of the outlet counters, summaries, live feed and metrics of the
+    PDU(s) affected by an outlet change. Outlets deleted along with their PDU are skipped;
+    the PDU's own handlers cover it.
+    """
+    if signal is post_delete and instance.pdu_id in _deleting_pdus():
+        return
+    pdu_ids = {instance.pdu_id, getattr(instance, '_loaded_pdu_id', None)}
+    if signal is post_delete:
+        _queue(pdu_ids=pdu_ids, deleted=[instance])
+    else:
+        _queue(pdu_ids=pdu_ids, outlets=[instance])
+    instance._loaded_pdu_id = instance.pdu_id
+
+
+@receiver((post_save, post_delete), sender=Outlet)
+def update_power_dependencies(instance, **kwargs):
+    """Queue the rebuild of the power dependencies of the device(s) connected to a changed outlet"""
+    _queue(device_ids={instance.connected_device_id, getattr(instance, '_loaded_device_id', None)})
+    instance._loaded_device_id = instance.connected_device_id
+
+
+@receiver(pre_delete, sender=PDU)
+def mark_pdu_deleting(instance, **kwargs):
+    """Mark a PDU being deleted, so that the cascade delete of its outlets skips per-outlet work"""
+    _deleting_pdus().add(instance.pk)
+
+
+@receiver(post_save, sender=PDU)
+def update_outlet_search_text(instance, created, **kwargs):
+    """Rebuild the search text of a PDU's outlets when the PDU is renamed"""
+    if not created and instance.name != getattr(instance, '_loaded_name', instance.name):
+        outlets = list(instance.outlets.only('pk', 'name', 'label', 'description'))
+        for outlet in outlets:
+            outlet.search_text = outlet.get_search_text(pdu_name=instance.name)
+        Outlet.objects.bulk_update(outlets, ('search_text',), batch_size=1000)
+    instance._loaded_name = instance.name
+
+
+@receiver(post_save, sender=PDU)
+def update_device_dependencies(instance, created, **kwargs):
+    """Rebuild the power dependencies of the devices fed by a PDU which moved to another site"""
+    if not created and instance.site_id != getattr(instance, '_loaded_location', (None, instance.site_id))[1]:
+        PDU.objects.filter(pk=instance.pk).refresh_power_dependencies()
+
+
+# Connected after update_device_dependencies(), which reads the original location
+@receiver((post_save, post_delete), sender=PDU)
+def update_power_summaries(instance, **kwargs):
+    """Recalculate the capacity summaries of the rack(s) and site(s) of a changed PDU"""
+    rack_id, site_id = getattr(instance, '_loaded_location', (None, None))
+    refresh_power_summaries({instance.rack_id, rack_id}, {instance.site_id, site_id})
+    instance._loaded_location = (instance.rack_id, instance.site_id)
+
+
+@receiver((post_save, post_delete), sender=PDU)
+def update_pdu_metrics(instance, signal, **kwargs):
+    """Re-render the metrics of a changed PDU (e.g. renamed or moved), or drop those of a deleted one"""
+    metrics.refresh_pdus([instance.pk])
+    if signal is post_delete:
+        _deleting_pdus().discard(instance.pk)
+
+
+@receiver(telemetry_updated)
+def update_telemetry_metrics(pdu_ids, **kwargs):
+    """Re-render the metrics of the PDUs whose outlet readings changed"""
+    metrics.refresh_pdus(pdu_ids)
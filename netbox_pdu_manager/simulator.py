@@ -0,0 +1,279 @@
+"""
+Simulated Raritan PDUs serving the JSON-RPC endpoints used by the plugin
+
+Each virtual PDU is served under /pdu/<n>/, so a PDU with the API URL
+http://host:port/pdu/<n>/ talks to virtual PDU n (see get_url()). If credentials
+are given, every request must carry them as basic auth or a session token from
+newSession().
+
+Virtual PDUs cover inventory (getMetaData/getSettings), outlet state and sensor
+readings, and outlet switching (setPowerState/cyclePowerState). Each has its own
+outlet and phase count, latency, and injected failures: HTTP 500 errors, requests
+which never complete, and PDUs which are down altogether.
+"""
+import asyncio
+import base64
+import random
+import secrets
+import socket
+import time
+
+try:
+    from aiohttp import web
+except ImportError:  # pragma: no cover
+    web = None
+
+__all__ = (
+    'SimulatedPDU',
+    'build_fleet',
+    'create_app',
+    'get_url',
+    'run_simulator',
+)
+
+SENSORS = ('voltage', 'current', 'activePower')
+
+# Outlets per bank; three-phase PDUs rotate L1/L2/L3 across banks
+BANK_SIZE = 8
+
+# Seconds a request hangs for when a timeout is injected (longer than any client timeout)
+HANG_SECONDS = 300
+
+
+class SimulatedPDU:
+    """
+    In-memory state of one virtual PDU. Each request is delayed by `latency` seconds,
+    plus up to `jitter` times that at random. `error_rate` and `timeout_rate` are the
+    fractions of requests which fail with HTTP 500 or hang; a `down` PDU hangs on every
+    request.
+    """
+    def __init__(self, outlet_count=24, seed=None, phase_count=1, latency=0.0, jitter=0.0,
+                 error_rate=0.0, timeout_rate=0.0, down=False):
+        self.rng = random.Random(seed)
+        self.outlet_count = outlet_count
+        self.phase_count = phase_count
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.down = down
+        self.serial_number = f'SIM{self.rng.randrange(10 ** 8):08d}'
+        self.power_states = [1] * outlet_count
+        self.currents = [round(self.rng.uniform(0.1, 2.0), 2) for _ in range(outlet_count)]
+        self.voltage = 230.0
+
+    def phase(self, index):
+        """Return the phase (1-3) feeding an outlet"""
+        if self.phase_count != 3:
+            return 1
+        return index // BANK_SIZE % 3 + 1
+
+    def delay(self):
+        return self.latency * (1 + self.rng.uniform(0, self.jitter))
+
+    def fault(self):
+        """Return 'timeout', 'error' or None for the next request"""
+        if self.down:
+            return 'timeout'
+        roll = self.rng.random()
+        if roll < self.timeout_rate:
+            return 'timeout'
+        if roll < self.timeout_rate + self.error_rate:
+            return 'error'
+        return None
+
+    def step(self):
+        """Let outlet loads drift between polls"""
+        for i, current in enumerate(self.currents):
+            self.currents[i] = round(min(16.0, max(0.05, current * self.rng.uniform(0.9, 1.1))), 3)
+
+    def reading(self, index, sensor):
+        if sensor == 'voltage':
+            value = self.voltage + self.rng.uniform(-0.5, 0.5)
+        elif sensor == 'current':
+            value = self.currents[index] * self.power_states[index] * self.rng.uniform(0.97, 1.03)
+        else:
+            value = self.currents[index] * self.power_states[index] * self.voltage * self.rng.uniform(0.97, 1.03)
+        return {'valid': True, 'value': round(value, 3)}
+
+    def call(self, rid, method, params=None):
+        """Dispatch a JSON-RPC call and return its result, or raise KeyError for an unknown method"""
+        parts = rid.strip('/').split('/')
+        if parts == ['model', 'pdu', '0']:
+            if method == 'getOutlets':
+                self.step()
+                return {'_ret_': [{'rid': f'/model/pdu/0/outlet/{i}'} for i in range(self.outlet_count)]}
+            if method == 'getMetaData':
+                return {'_ret_': {
+                    'nameplate': {
+                        'manufacturer': 'Raritan',
+                        'model': 'PX3-5000' if self.phase_count == 1 else 'PX3-5000-3P',
+                        'serialNumber': self.serial_number,
+                        'rating': {'voltage': '230V' if self.phase_count == 1 else '400V', 'current': '32A'},
+                    },
+                    'fwRevision': '4.0.20.5-49038',
+                }}
+            if method == 'getSettings':
+                return {'_ret_': {'name': self.serial_number}}
+        if len(parts) >= 5 and parts[:4] == ['model', 'pdu', '0', 'outlet']:
+            index = int(parts[4])
+            if not 0 <= index < self.outlet_count:
+                raise IndexError(index)
+            if len(parts) == 5:
+                if method == 'getSensors':
+                    return {'_ret_': {sensor: {'rid': f'{rid}/{sensor}'} for sensor in SENSORS}}
+                if method == 'getState':
+                    return {'_ret_': {'powerState': self.power_states[index]}}
+                if method == 'setPowerState':
+                    self.power_states[index] = 1 if (params or {}).get('pstate') else 0
+                    return {'_ret_': 0}
+                if method == 'cyclePowerState':
+                    self.power_states[index] = 1
+                    return {'_ret_': 0}
+                if method == 'getMetaData':
+                    return {'_ret_': {'label': str(index + 1), 'phase': f'L{self.phase(index)}'}}
+                if method == 'getSettings':
+                    return {'_ret_': {'name': ''}}
+            if len(parts) == 6 and method == 'getReading':
+                return {'_ret_': self.reading(index, parts[5])}
+        raise KeyError(method)
+
+
+def build_fleet(count, outlet_counts=(24,), phase_counts=(1,), seed=0, down_fraction=0.0, **kwargs):
+    """
+    Return `count` SimulatedPDUs whose outlet and phase counts are drawn from the given
+    choices, a `down_fraction` of them down. The same arguments always build the same
+    fleet. Keyword arguments are passed to SimulatedPDU.
+    """
+    rng = random.Random(seed)
+    return [
+        SimulatedPDU(
+            outlet_count=rng.choice(outlet_counts),
+            phase_count=rng.choice(phase_counts),
+            seed=seed * 1000003 + i,
+            down=rng.random() < down_fraction,
+            **kwargs
+        )
+        for i in range(count)
+    ]
+
+
+def _response(request_id, call):
+    try:
+        return {'jsonrpc': '2.0', 'id': request_id, 'result': call()}
+    except (KeyError, IndexError, ValueError):
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': -32601, 'message': 'Method not found'}}
+
+
+def create_app(pdus, latency=0.0, credentials=None, auth_latency=0.0, session_timeout=600):
+    """
+    Return an aiohttp application serving the given list of SimulatedPDUs.
+    `latency` is added to the latency of every PDU. `credentials` is a (username,
+    password) pair; checking a password costs `auth_latency` seconds, like the
+    password hashing done by real PDUs. Request counts are kept in app['stats'].
+    """
+    if web is None:
+        raise RuntimeError("aiohttp is required for the simulator (pip install netbox-pdu-manager[sync])")
+    sessions = {}
+    stats = dict.fromkeys(
+        ('requests', 'basic_auth', 'token_auth', 'logins', 'rejected', 'errors', 'timeouts'), 0
+    )
+
+    async def check_password(username, password):
+        if auth_latency:
+            await asyncio.sleep(auth_latency)
+        return (username, password) == tuple(credentials)
+
+    async def authenticate(request, pdu_index):
+        token = request.headers.get('X-SessionToken')
+        if token:
+            session = sessions.get(token)
+            if session and session[0] == pdu_index and time.monotonic() - session[1] < session_timeout:
+                sessions[token] = (pdu_index, time.monotonic())
+                stats['token_auth'] += 1
+                return True
+            sessions.pop(token, None)
+            return False
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Basic '):
+            username, _, password = base64.b64decode(header[6:]).decode().partition(':')
+            stats['basic_auth'] += 1
+            return await check_password(username, password)
+        return False
+
+    async def handle(request):
+        try:
+            index = int(request.match_info['pdu'])
+            pdu = pdus[index]
+        except (ValueError, IndexError):
+            raise web.HTTPNotFound()
+        rid = '/' + request.match_info['rid']
+        payload = await request.json()
+        stats['requests'] += 1
+        delay = latency + pdu.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        fault = pdu.fault()
+        if fault == 'timeout':
+            stats['timeouts'] += 1
+            await asyncio.sleep(HANG_SECONDS)
+        if fault == 'error':
+            stats['errors'] += 1
+            raise web.HTTPInternalServerError()
+
+        if credentials and rid == '/session' and payload.get('method') == 'newSession':
+            params = payload.get('params') or {}
+            if not await check_password(params.get('username'), params.get('password')):
+                stats['rejected'] += 1
+                raise web.HTTPUnauthorized()
+            token = secrets.token_hex(16)
+            sessions[token] = (index, time.monotonic())
+            stats['logins'] += 1
+            return web.json_response(_response(payload.get('id'), lambda: {'_ret_': 0, 'token': token}))
+        if credentials and not await authenticate(request, index):
+            stats['rejected'] += 1
+            raise web.HTTPUnauthorized()
+
+        if rid == '/bulk' and payload.get('method') == 'performRequest':
+            responses = [
+                {
+                    'statcode': 200,
+                    'json': _response(
+                        sub['json'].get('id'),
+                        lambda sub=sub: pdu.call(sub['rid'], sub['json']['method'], sub['json'].get('params'))
+                    ),
+                }
+                for sub in payload['params']['requests']
+            ]
+            return web.json_response(_response(payload.get('id'), lambda: {'responses': responses}))
+        return web.json_response(_response(
+            payload.get('id'),
+            lambda: pdu.call(rid, payload['method'], payload.get('params'))
+        ))
+
+    app = web.Application()
+    app['stats'] = stats
+    app.router.add_post('/pdu/{pdu}/{rid:.*}', handle)
+    return app
+
+
+def get_url(host, port, index, ports=1):
+    """
+    Return the API URL of virtual PDU `index`. With several listening ports, PDUs are
+    spread over them, because the collector limits connections per host and port.
+    """
+    return f'http://{host}:{port + index % ports}/pdu/{index}/'
+
+
+def run_simulator(pdus, host='127.0.0.1', port=8080, ports=1, **kwargs):
+    """
+    Serve the simulated PDUs on `ports` consecutive ports from `port` until interrupted.
+    Every port serves every PDU. Keyword arguments are passed to create_app().
+    """
+    sockets = []
+    for offset in range(ports):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port + offset))
+        sockets.append(sock)
+    web.run_app(create_app(pdus, **kwargs), sock=sockets, print=None)
@@ -0,0 +1,349 @@
+"""
+Local spool of outlet readings which could not be written to the database
+
+While the database is unavailable (maintenance, failover), the collector appends
+polled readings to a memory-mapped ring file of fixed-size binary records instead of
+dropping them. Appending only copies bytes into the mapping, so it never waits on
+the database or the disk. Once the database is back, the spool is replayed oldest
+first in large batches into the outlets and the measurement history.
+
+The file has a fixed size: when it is full, the oldest records are overwritten and
+counted as dropped. Several processes on one host may share it; a lock on the file
+is held only while records are copied in or out.
+"""
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import DatabaseError, transaction
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .choices import OutletStatusChoices
+from .energy import accumulate_energy, get_settings as get_energy_settings
+from .history import replay_measurements
+from .models import PDU
+
+__all__ = (
+    'Spool',
+    'get_spool',
+    'replay_spool',
+    'spool_readings',
+)
+
+logger = logging.getLogger('netbox.netbox_pdu_manager.spool')
+
+MAGIC = b'PDUSPOOL'
+VERSION = 1
+# magic, version, record size, capacity, write sequence, read sequence, dropped records
+HEADER = struct.Struct('<8sIIQQQQ')
+HEADER_SIZE = 64
+# pdu_id, outlet_number, status, timestamp (microseconds since the epoch), voltage, current, power
+RECORD = struct.Struct('<IHBxqddd')
+
+# Status codes; 0 is a reading without a status
+STATUSES = (None, *(status for status, *_ in OutletStatusChoices.CHOICES))
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+NAN = float('nan')
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def get_settings():
+    return {
+        **config.default_settings['spool'],
+        **get_plugin_config('netbox_pdu_manager', 'spool'),
+    }
+
+
+def _encode(value):
+    return NAN if value is None else value
+
+
+def _decode(value):
+    return None if value != value else value
+
+
+class Spool:
+    """
+    Ring file of RECORD entries after a HEADER. Records are addressed by sequence
+    numbers which only grow; record n is stored in slot n % capacity, and the
+    records between the read and write sequences are pending.
+    """
+    def __init__(self, path, max_size=64 * 1024 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._file_lock():
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) == HEADER.size and header[:len(MAGIC)] == MAGIC:
+                _, version, record_size, capacity, write, read, _ = HEADER.unpack(header)
+                if version != VERSION or record_size != RECORD.size:
+                    raise ValueError(f"{path} is not a compatible spool file")
+                if write == read:
+                    # Nothing is pending, so the file can be resized
+                    capacity = self._capacity(max_size)
+                    self._init(capacity)
+            else:
+                capacity = self._capacity(max_size)
+                self._init(capacity)
+            self.capacity = capacity
+            self._map = mmap.mmap(self._fd, HEADER_SIZE + capacity * RECORD.size)
+        # Only one process replays at a time
+        self._replay_fd = os.open(f'{path}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+
+    @staticmethod
+    def _capacity(max_size):
+        return max(1, (max_size - HEADER_SIZE) // RECORD.size)
+
+    def _init(self, capacity):
+        os.ftruncate(self._fd, HEADER_SIZE + capacity * RECORD.size)
+        os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, 0, 0, 0), 0)
+
+    @contextmanager
+    def _file_lock(self):
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _header(self):
+        _, _, _, _, write, read, dropped = HEADER.unpack_from(self._map, 0)
+        return write, read, dropped
+
+    def _set_header(self, write, read, dropped):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, self.capacity, write, read, dropped)
+
+    def _slot(self, seq):
+        return HEADER_SIZE + seq % self.capacity * RECORD.size
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+        os.close(self._replay_fd)
+
+    def stats(self):
+        with self._file_lock():
+            write, read, dropped = self._header()
+        return {
+            'pending': write - read,
+            'capacity': self.capacity,
+            'dropped': dropped,
+            'path': self.path,
+        }
+
+    def __len__(self):
+        with self._file_lock():
+            write, read, _ = self._header()
+        return write - read
+
+    def append(self, readings, timestamp):
+        """
+        Append polled readings ({pdu_id: [reading, ...]}) taken at `timestamp`.
+        Returns the number of records written.
+        """
+        ts = (timestamp - EPOCH) // MICROSECOND
+        data = b''.join(
+            RECORD.pack(
+                pdu_id,
+                reading['outlet_number'],
+                STATUS_CODES.get(reading.get('status'), 0),
+                ts,
+                _encode(reading.get('voltage')),
+                _encode(reading.get('current')),
+                _encode(reading.get('power')),
+            )
+            for pdu_id, pdu_readings in readings.items()
+            for reading in pdu_readings
+        )
+        count = len(data) // RECORD.size
+        skipped = max(0, count - self.capacity)
+        if skipped:
+            # Only the newest records fit
+            data = data[skipped * RECORD.size:]
+        with self._file_lock():
+            write, read, dropped = self._header()
+            self._copy_in(write + skipped, data)
+            write += count
+            if write - read > self.capacity:
+                dropped += write - read - self.capacity
+                read = write - self.capacity
+            self._set_header(write, read, dropped)
+        return count
+
+    def _copy_in(self, seq, data):
+        # The records may wrap around the end of the file
+        start = self._slot(seq)
+        first = min(len(data), HEADER_SIZE + self.capacity * RECORD.size - start)
+        self._map[start:start + first] = data[:first]
+        if first < len(data):
+            self._map[HEADER_SIZE:HEADER_SIZE + len(data) - first] = data[first:]
+
+    def _copy_out(self, seq, count):
+        start = self._slot(seq)
+        first = min(count * RECORD.size, HEADER_SIZE + self.capacity * RECORD.size - start)
+        data = self._map[start:start + first]
+        if first < count * RECORD.size:
+            data += self._map[HEADER_SIZE:HEADER_SIZE + count * RECORD.size - first]
+        return data
+
+    def peek(self, limit):
+        """Return the sequence of the oldest pending record and up to `limit` pending records"""
+        with self._file_lock():
+            write, read, _ = self._header()
+            data = self._copy_out(read, min(limit, write - read))
+        return read, [
+            (pdu_id, number, STATUSES[status] if status < len(STATUSES) else None, ts, *map(_decode, values))
+            for pdu_id, number, status, ts, *values in RECORD.iter_unpack(data)
+        ]
+
+    def consume(self, seq, count):
+        """Mark `count` records from sequence `seq` as replayed"""
+        with self._file_lock():
+            write, read, dropped = self._header()
+            # Records overwritten in the meantime were already counted as dropped
+            self._set_header(write, max(read, min(seq + count, write)), dropped)
+
+    @contextmanager
+    def replaying(self):
+        """Yield whether this process may replay, i.e. no other process is replaying"""
+        try:
+            fcntl.flock(self._replay_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(self._replay_fd, fcntl.LOCK_UN)
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    """Return the process-wide Spool, or None if spooling is disabled"""
+    global _spool
+    if _spool is None:
+        settings = get_settings()
+        if not settings['enabled']:
+            return None
+        with _spool_lock:
+            if _spool is None:
+                path = settings['path'] or os.path.join(tempfile.gettempdir(), 'netbox_pdu_manager.spool')
+                _spool = Spool(path, max_size=settings['max_size'] * 1024 * 1024)
+    return _spool
+
+
+def spool_readings(readings, timestamp):
+    """Spool polled readings. Returns the number of records spooled, or None if spooling is disabled."""
+    spool = get_spool()
+    if spool is None:
+        return None
+    return spool.append(readings, timestamp)
+
+
+def _collect_latest(records, latest):
+    """Keep the newest readings of each PDU ({pdu_id: (ts, {outlet_number: reading})}) in `latest`"""
+    for pdu_id, number, status, ts, voltage, current, power in records:
+        newest = latest.get(pdu_id)
+        if newest is None or ts > newest[0]:
+            newest = latest[pdu_id] = (ts, {})
+        elif ts < newest[0]:
+            continue
+        reading = {'outlet_number': number, 'voltage': voltage, 'current': current, 'power': power}
+        if status is not None:
+            reading['status'] = status
+        newest[1][number] = reading
+
+
+def _replay_batch(records):
+    """
+    Add a batch of records to the measurement history and the energy totals in one
+    transaction. Returns the number of samples added to the history.
+    """
+    samples = 0
+    with transaction.atomic():
+        if get_plugin_config('netbox_pdu_manager', 'measurement_history'):
+            samples = replay_measurements([
+                (pdu_id, number, EPOCH + ts * MICROSECOND, voltage, current, power)
+                for pdu_id, number, _, ts, voltage, current, power in records
+            ])
+        if get_energy_settings()['enabled']:
+            accumulate_energy([
+                (pdu_id, number, EPOCH + ts * MICROSECOND, power)
+                for pdu_id, number, _, ts, _, _, power in records
+            ])
+    return samples
+
+
+def _replay_outlets(latest):
+    """
+    Write the newest spooled readings of each PDU through the telemetry write path,
+    skipping PDUs which have been synced since
+    """
+    polls = {}
+    for pdu_id, (ts, readings) in latest.items():
+        polls.setdefault(ts, {})[pdu_id] = list(readings.values())
+    updated = 0
+    with transaction.atomic():
+        for ts, readings in sorted(polls.items()):
+            timestamp = EPOCH + ts * MICROSECOND
+            updated += len(
+                PDU.objects.exclude(last_sync__gte=timestamp).update_telemetry(readings, timestamp=timestamp)
+            )
+    return updated
+
+
+def replay_spool(batch_size=None, stop=None):
+    """
+    Replay the pending records of the spool, oldest first. Each batch of records is
+    added to the measurement history and applied to the energy totals in one
+    transaction, and then consumed. A batch replayed again after a failure before it
+    was consumed changes nothing: samples already stored for the same outlet and
+    timestamp are skipped, and so are readings not newer than the last energy reading
+    applied. Outlets only keep the last reading, so they are written once at the end
+    with the newest readings of each PDU, unless the PDU was synced after them.
+
+    Stops at the first database error (leaving the remaining records pending), when
+    the spool is empty or when `stop()` returns true. Returns a summary dict, or None
+    if spooling is disabled or another process is replaying.
+    """
+    spool = get_spool()
+    if spool is None:
+        return None
+    batch_size = batch_size or get_settings()['replay_batch']
+    summary = {'records': 0, 'samples': 0, 'outlets_updated': 0, 'error': None}
+    latest = {}
+    with spool.replaying() as allowed:
+        if not allowed:
+            return None
+        try:
+            while not (stop and stop()):
+                seq, records = spool.peek(batch_size)
+                if not records:
+                    break
+                summary['samples'] += _replay_batch(records)
+                spool.consume(seq, len(records))
+                _collect_latest(records, latest)
+                summary['records'] += len(records)
+            # If this fails, the outlets keep older readings until their next poll
+            if latest:
+                summary['outlets_updated'] = _replay_outlets(latest)
+        except DatabaseError as e:
+            summary['error'] = str(e)
+            logger.warning(f"Replaying spooled readings failed: {e}")
+    summary['pending'] = len(spool)
+    if summary['records']:
+        logger.info(f"Replayed {summary['records']} spooled readings ({summary['pending']} pending)")
+    return summary
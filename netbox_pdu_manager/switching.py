@@ -0,0 +1,288 @@
+"""
+Bulk remote switching of outlets
+
+Outlet operations are grouped by PDU, so that each PDU receives one bulk request
+per step, and PDUs are switched in parallel up to a global limit. Outlets are
+powered on in waves: each wave is sized so that its estimated inrush current, on
+top of the load already drawn, stays within the rated current of every phase and
+bank. Results are yielded per outlet as they arrive, and the new statuses are
+stored in one bulk write at the end.
+"""
+import asyncio
+import queue
+import threading
+from collections import defaultdict
+
+from django.utils import timezone
+from netbox.plugins import get_plugin_config
+
+from . import config
+from .choices import OutletStatusChoices, PowerActionChoices
+from .models import Outlet
+from .raritan import RaritanClient, create_session, resolve_password
+from .sessions import get_session_cache
+
+__all__ = (
+    'SwitchPlan',
+    'SwitchResult',
+    'plan_waves',
+    'switch_outlets',
+)
+
+# Marks the end of the result stream
+_DONE = object()
+
+
+def get_settings():
+    return {
+        **config.default_settings['switching'],
+        **get_plugin_config('netbox_pdu_manager', 'switching'),
+    }
+
+
+class SwitchResult:
+
+    def __init__(self):
+        self.outlets = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.errors = []
+
+    def add(self, result):
+        self.outlets += 1
+        if result['ok']:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            self.errors.append(result)
+
+    def serialize(self):
+        return {
+            'outlets': self.outlets,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+class SwitchPlan:
+    """The outlets of one PDU to switch, split into power-on waves"""
+
+    def __init__(self, pdu, waves):
+        self.pdu = pdu
+        self.waves = waves
+
+    @property
+    def outlets(self):
+        return [outlet for wave in self.waves for outlet in wave]
+
+
+def _limits(pdu, outlet, settings):
+    """Return the (load key, rated current) pairs which an outlet draws from"""
+    limits = [(('phase', outlet.phase or ''), pdu.rated_current)]
+    if outlet.bank_number:
+        limits.append((('bank', outlet.bank_number), settings['bank_rated_current']))
+    return limits
+
+
+def _steady_current(outlet, settings):
+    return outlet.last_measured_current or settings['default_current']
+
+
+def plan_waves(pdu, outlets, others, settings, powered=()):
+    """
+    Split the outlets of a PDU which are to be powered on into waves. `others` are the
+    outlets of the PDU which stay on, and `powered` the PKs of outlets to switch which
+    are already on (these cause no inrush). Returns the waves and the outlets which
+    cannot be powered on without exceeding a rated current.
+    """
+    load = defaultdict(float)
+    for outlet in others:
+        for key, _ in _limits(pdu, outlet, settings):
+            load[key] += _steady_current(outlet, settings)
+    for outlet in outlets:
+        if outlet.pk in powered:
+            for key, _ in _limits(pdu, outlet, settings):
+                load[key] += _steady_current(outlet, settings)
+
+    waves = []
+    remaining = sorted(outlets, key=lambda outlet: outlet.outlet_number)
+    while remaining:
+        wave, deferred = [], []
+        surge = defaultdict(float)
+        for outlet in remaining:
+            limits = _limits(pdu, outlet, settings)
+            inrush = 0 if outlet.pk in powered else _steady_current(outlet, settings) * settings['inrush_factor']
+            if all(load[key] + surge[key] + inrush <= rated for key, rated in limits):
+                wave.append(outlet)
+                for key, _ in limits:
+                    surge[key] += inrush
+            else:
+                deferred.append(outlet)
+        if not wave:
+            return waves, deferred
+        waves.append(wave)
+        # Once its inrush has passed, a wave draws its steady current
+        for outlet in wave:
+            if outlet.pk not in powered:
+                for key, _ in _limits(pdu, outlet, settings):
+                    load[key] += _steady_current(outlet, settings)
+        remaining = deferred
+    return waves, []
+
+
+def _result(outlet, action, error=None, status=None, wave=None):
+    return {
+        'outlet': outlet.pk,
+        'pdu': outlet.pdu_id,
+        'outlet_number': outlet.outlet_number,
+        'action': action,
+        'ok': error is None,
+        'status': status if error is None else None,
+        'wave': wave,
+        'error': error,
+    }
+
+
+async def _switch_pdu(session, semaphore, plan, action, settings, tokens, emit):
+    pdu = plan.pdu
+    reported = set()
+
+    def report(outlets, errors=None, status=None, wave=None, error=None):
+        for outlet in outlets:
+            emit(_result(outlet, action, error or (errors or {}).get(outlet.outlet_number), status, wave))
+            reported.add(outlet.pk)
+
+    async with semaphore:
+        client = RaritanClient(
+            session,
+            pdu.api_url,
+            username=pdu.api_username,
+            password=resolve_password(pdu.api_password_ref) if pdu.api_password_ref else '',
+            tokens=tokens,
+            key=pdu.pk,
+        )
+        waves = plan.waves
+        try:
+            outlet_rids = await client.get_outlet_rids()
+            if action in (PowerActionChoices.ACTION_OFF, PowerActionChoices.ACTION_CYCLE):
+                outlets = plan.outlets
+                errors = await client.set_power_states([o.outlet_number for o in outlets], 0, outlet_rids)
+                if action == PowerActionChoices.ACTION_OFF:
+                    report(outlets, errors, OutletStatusChoices.STATUS_OFF)
+                    return
+                # Outlets which did not switch off are not switched on again
+                report([outlet for outlet in outlets if outlet.outlet_number in errors], errors)
+                waves = [[outlet for outlet in wave if outlet.pk not in reported] for wave in waves]
+                await asyncio.sleep(settings['cycle_delay'])
+            for number, wave in enumerate(filter(None, waves), start=1):
+                if number > 1:
+                    await asyncio.sleep(settings['stagger_delay'])
+                errors = await client.set_power_states([o.outlet_number for o in wave], 1, outlet_rids)
+                report(wave, errors, OutletStatusChoices.STATUS_ON, wave=number)
+        except Exception as e:
+            # Connection failures, timeouts and API errors fail the outlets not yet switched
+            report([outlet for outlet in plan.outlets if outlet.pk not in reported], error=str(e) or repr(e))
+
+
+async def _switch_plans(plans, action, settings, concurrency, timeout, verify_ssl, tokens, emit):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with create_session(concurrency, timeout, verify_ssl=verify_ssl) as session:
+        await asyncio.gather(*(
+            _switch_pdu(session, semaphore, plan, action, settings, tokens, emit) for plan in plans
+        ))
+
+
+def _plan(outlets, action, settings):
+    """Return the SwitchPlans for the given outlets and the results of outlets which cannot be switched"""
+    by_pdu = defaultdict(list)
+    for outlet in outlets:
+        by_pdu[outlet.pdu_id].append(outlet)
+    targets = {outlet.pk for outlet in outlets}
+    others = defaultdict(list)
+    if action != PowerActionChoices.ACTION_OFF:
+        for outlet in Outlet.objects.filter(
+            pdu_id__in=by_pdu.keys(), status=OutletStatusChoices.STATUS_ON
+        ).order_by().only('pk', 'pdu_id', 'phase', 'bank_number', 'last_measured_current'):
+            if outlet.pk not in targets:
+                others[outlet.pdu_id].append(outlet)
+
+    plans, rejected = [], []
+    for pdu_outlets in by_pdu.values():
+        pdu = pdu_outlets[0].pdu
+        if not pdu.api_url:
+            rejected.extend(_result(outlet, action, "PDU has no API URL") for outlet in pdu_outlets)
+            continue
+        if action == PowerActionChoices.ACTION_OFF:
+            plans.append(SwitchPlan(pdu, [pdu_outlets]))
+            continue
+        powered = {
+            outlet.pk for outlet in pdu_outlets
+            if action == PowerActionChoices.ACTION_ON and outlet.status == OutletStatusChoices.STATUS_ON
+        }
+        waves, exceeding = plan_waves(pdu, pdu_outlets, others[pdu.pk], settings, powered)
+        rejected.extend(
+            _result(outlet, action, "Powering on would exceed the rated current") for outlet in exceeding
+        )
+        if waves:
+            plans.append(SwitchPlan(pdu, waves))
+    return plans, rejected
+
+
+def switch_outlets(outlets, action, concurrency=None):
+    """
+    Switch the given Outlets on, off or power cycle them (see PowerActionChoices).
+    Yields a result dict per outlet as its operation completes, and once all have
+    completed writes the new outlet statuses in one bulk write. Closing the generator
+    early does not abort the operations in progress.
+    """
+    settings = get_settings()
+    outlets = list(outlets.select_related('pdu').order_by('pdu_id', 'outlet_number'))
+    plans, rejected = _plan(outlets, action, settings)
+    yield from rejected
+
+    tokens = get_session_cache()
+    if tokens is not None:
+        tokens.load(plan.pdu.pk for plan in plans)
+    results = queue.Queue()
+
+    def run():
+        try:
+            asyncio.run(_switch_plans(
+                plans, action, settings,
+                concurrency=concurrency or settings['concurrency'],
+                timeout=get_plugin_config('netbox_pdu_manager', 'sync_timeout'),
+                verify_ssl=get_plugin_config('netbox_pdu_manager', 'sync_verify_ssl'),
+                tokens=tokens,
+                emit=results.put,
+            ))
+        except Exception as e:
+            results.put(e)
+        results.put(_DONE)
+
+    # The event loop runs in its own thread, so that results can be consumed (and the
+    # database used) synchronously while PDUs are being switched
+    thread = threading.Thread(target=run, name='outlet-switching', daemon=True)
+    thread.start()
+    statuses = {}
+
+    def collect(item):
+        if isinstance(item, BaseException):
+            raise item
+        if item['ok']:
+            statuses[(item['pdu'], item['outlet_number'])] = {'status': item['status']}
+        return item
+
+    try:
+        while (item := results.get()) is not _DONE:
+            yield collect(item)
+    finally:
+        thread.join()
+        while not results.empty():
+            item = results.get_nowait()
+            if isinstance(item, dict):
+                collect(item)
+        if statuses:
+            Outlet.objects.update_telemetry(statuses, timestamp=timezone.now())
+        if tokens is not None:
+            tokens.save()
@@ -1,7 +1,7 @@
 import django_tables2 as tables
-from netbox.tables import NetBoxTable, ChoiceFieldColumn
+from netbox.tables import NetBoxTable, ChoiceFieldColumn, columns
 
-from .models import PDU, Outlet
+from .models import PDU, DevicePowerDependency, Outlet, RackPowerSummary, SitePowerSummary
 
 
 class PDUTable(NetBoxTable):
@@ -20,9 +20,8 @@ class PDUTable(NetBoxTable):
         linkify=True
     )
     outlet_count_actual = tables.Column(
-        verbose_name='Outlets (Configured)',
-        empty_values=(),
-        orderable=False
+        accessor='outlets_total',
+        verbose_name='Outlets (Actual)'
     )
 
     class Meta(NetBoxTable.Meta):
@@ -38,10 +37,6 @@ class PDUTable(NetBoxTable):
             'actions'
         )
 
-    def render_outlet_count_actual(self, record):
-        """Render actual outlet count from related outlets"""
-        return record.outlets.count()
-
 
 class OutletTable(NetBoxTable):
     """Table for displaying Outlet list"""
@@ -54,13 +49,22 @@ class OutletTable(NetBoxTable):
     name = tables.Column(
         linkify=True
     )
-    status = ChoiceFieldColumn()
+    status = ChoiceFieldColumn(
+        attrs={'td': {'data-field': 'status'}}
+    )
     connected_device = tables.Column(
         linkify=True
     )
+    last_measured_power = tables.Column(
+        attrs={'td': {'data-field': 'power'}}
+    )
 
     class Meta(NetBoxTable.Meta):
         model = Outlet
+        # Lets the PDU page apply live updates to the outlet rows
+        row_attrs = {
+            'data-outlet': lambda record: record.pk
+        }
         fields = (
             'pk', 'id', 'pdu', 'outlet_number', 'name', 'label',
             'status', 'phase', 'connected_device',
@@ -70,3 +74,126 @@ class OutletTable(NetBoxTable):
             'pdu', 'outlet_number', 'name', 'status',
             'connected_device', 'actions'
         )
+
+
+class PowerSummaryTable(NetBoxTable):
+    """Base table for rack and site power capacity summaries"""
+    # The rack or site is the primary key; there is no id attribute
+    id = tables.Column(
+        accessor='pk',
+        linkify=True,
+        verbose_name='ID'
+    )
+    rated_power = tables.Column(
+        verbose_name='Rated (W)'
+    )
+    measured_power = tables.Column(
+        verbose_name='Measured (W)'
+    )
+    headroom = tables.Column(
+        verbose_name='Headroom (W)',
+        orderable=False
+    )
+    utilization = columns.UtilizationColumn(
+        orderable=False
+    )
+    pdu_count = tables.Column(
+        verbose_name='PDUs'
+    )
+    outlet_count = tables.Column(
+        verbose_name='Outlets'
+    )
+    phase_power = tables.Column(
+        verbose_name='Load per Phase',
+        orderable=False
+    )
+    bank_power = tables.Column(
+        verbose_name='Load per Bank',
+        orderable=False
+    )
+    # Summaries are maintained automatically and cannot be edited
+    actions = columns.ActionsColumn(
+        actions=()
+    )
+
+    def render_phase_power(self, record):
+        return ', '.join(f"{phase}: {power:g} W" for phase, power in record.get_phase_loads())
+
+    def render_bank_power(self, record):
+        return ', '.join(f"{bank}: {power:g} W" for bank, power in record.get_bank_loads())
+
+
+class RackPowerSummaryTable(PowerSummaryTable):
+    """Table for displaying rack power capacity"""
+    rack = tables.Column(
+        linkify=True
+    )
+    site = tables.Column(
+        linkify=True
+    )
+
+    class Meta(NetBoxTable.Meta):
+        model = RackPowerSummary
+        fields = (
+            'pk', 'id', 'rack', 'site', 'rated_power', 'measured_power', 'headroom', 'utilization',
+            'pdu_count', 'outlet_count', 'phase_power', 'bank_power', 'last_updated', 'actions'
+        )
+        default_columns = (
+            'rack', 'site', 'rated_power', 'measured_power', 'headroom', 'utilization', 'pdu_count'
+        )
+
+
+class SitePowerSummaryTable(PowerSummaryTable):
+    """Table for displaying site power capacity"""
+    site = tables.Column(
+        linkify=True
+    )
+
+    class Meta(NetBoxTable.Meta):
+        model = SitePowerSummary
+        fields = (
+            'pk', 'id', 'site', 'rated_power', 'measured_power', 'headroom', 'utilization',
+            'pdu_count', 'outlet_count', 'phase_power', 'bank_power', 'last_updated', 'actions'
+        )
+        default_columns = (
+            'site', 'rated_power', 'measured_power', 'headroom', 'utilization', 'pdu_count', 'outlet_count'
+        )
+
+
+class DevicePowerDependencyTable(NetBoxTable):
+    """Table for displaying how devices are fed"""
+    # The device is the primary key; there is no id attribute
+    id = tables.Column(
+        accessor='pk',
+        linkify=True,
+        verbose_name='ID'
+    )
+    device = tables.Column(
+        linkify=True
+    )
+    site = tables.Column(
+        accessor='device__site',
+        linkify=True
+    )
+    redundancy = ChoiceFieldColumn()
+    outlet_count = tables.Column(
+        verbose_name='Outlets'
+    )
+    pdu_count = tables.Column(
+        verbose_name='PDUs'
+    )
+    line_count = tables.Column(
+        verbose_name='Lines'
+    )
+    # Dependencies are maintained automatically and cannot be edited
+    actions = columns.ActionsColumn(
+        actions=()
+    )
+
+    class Meta(NetBoxTable.Meta):
+        model = DevicePowerDependency
+        fields = (
+            'pk', 'id', 'device', 'site', 'redundancy', 'outlet_count', 'pdu_count', 'line_count',
+            'last_updated', 'actions'
+        )
+        default_columns = ('device', 'site', 'redundancy', 'outlet_count', 'pdu_count', 'line_count')
@@ -0,0 +1,69 @@
+import zlib
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+from netbox_pdu_manager.blocks import decode_block, encode_block, np, summarize
+
+# Microseconds
+MINUTE = 60_000_000
+
+
+@skipIf(np is None, "The block codec requires numpy")
+class BlockCodecTestCase(SimpleTestCase):
+    """Blocks decode to exactly the samples they were encoded from"""
+
+    def assertRoundTrip(self, offsets, voltage, current, power):
+        columns = [np.asarray(values, dtype=np.float64) for values in (voltage, current, power)]
+        decoded = decode_block(encode_block(offsets, *columns))
+        self.assertEqual(decoded[0].dtype, np.int64)
+        np.testing.assert_array_equal(decoded[0], offsets)
+        for expected, values in zip(columns, decoded[1:]):
+            self.assertEqual(len(values), len(offsets))
+            # NaN (null) compares equal to NaN
+            np.testing.assert_array_equal(values, expected)
+        return decoded
+
+    def test_full_block(self):
+        count = 60
+        rng = np.random.default_rng(1)
+        offsets = np.arange(count, dtype=np.int64) * MINUTE + rng.integers(0, 1000, count)
+        self.assertRoundTrip(
+            offsets,
+            np.round(230 + rng.random(count), 1),
+            np.round(rng.random(count) * 16, 3),
+            # Not decimals, so stored as XORed floats
+            rng.random(count) * 3680,
+        )
+
+    def test_nulls(self):
+        # 13 samples, so the null bitmap has padding bits
+        offsets = np.arange(13, dtype=np.int64) * MINUTE
+        voltage = np.full(13, 230.5)
+        voltage[[0, 7, 12]] = np.nan
+        current = np.linspace(0.1, 1.3, 13) / 3
+        current[5] = np.nan
+        power = np.full(13, np.nan)
+        self.assertRoundTrip(offsets, voltage, current, power)
+        self.assertEqual(summarize(power), (None, None, None, None))
+        self.assertEqual(summarize(voltage)[3], 230.5)
+
+    def test_single_sample(self):
+        self.assertRoundTrip(np.array([0], dtype=np.int64), [230.0], [np.nan], [-0.0])
+        self.assertRoundTrip(np.array([59 * MINUTE], dtype=np.int64), [np.nan], [0.125], [1e300])
+
+    def test_partial_block(self):
+        # An outlet polled for part of the window, with missed polls
+        offsets = np.array([2, 3, 4, 9, 10, 31], dtype=np.int64) * MINUTE
+        self.assertRoundTrip(
+            offsets,
+            [229.9, 230.1, 230.0, 230.0, np.nan, 231.2],
+            [0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+            [12.5, 13.0, np.nan, np.nan, np.nan, 14.25],
+        )
+
+    def test_unsupported_version(self):
+        data = bytearray(zlib.decompress(encode_block([0], [1.0], [1.0], [1.0])))
+        data[0] = 99
+        with self.assertRaisesMessage(ValueError, 'Unsupported block version 99'):
+            decode_block(zlib.compress(bytes(data)))
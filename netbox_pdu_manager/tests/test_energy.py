@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from unittest import skipUnless
+
+from django.db import connection
+from django.utils import timezone
+from utilities.testing import TestCase
+
+from netbox_pdu_manager.energy import get_period_start, get_settings, record_energy
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.models import OutletEnergy, OutletEnergyPeriod
+
+
+@skipUnless(connection.vendor == 'postgresql', "Energy is accumulated with PostgreSQL upserts")
+class EnergyAccumulationTestCase(TestCase):
+    """Power readings advance the running totals of outlets (Wh and metered seconds)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pdu = generate_dataset(1, 2)[0]
+        cls.start = timezone.make_aware(datetime(2024, 10, 31, 22, 0))
+
+    def poll(self, minutes, power=1200.0, seconds=0):
+        timestamp = self.start + timedelta(minutes=minutes, seconds=seconds)
+        return record_energy({self.pdu.pk: [{'outlet_number': 1, 'power': power}]}, timestamp)
+
+    def get_total(self):
+        return OutletEnergy.objects.get(outlet__pdu=self.pdu, outlet__outlet_number=1)
+
+    def test_gap_not_metered(self):
+        self.poll(0)
+        self.poll(1)
+        # The next reading comes after more than max_gap
+        self.poll(1, seconds=get_settings()['max_gap'] + 1)
+        total = self.get_total()
+        self.assertEqual(total.metered, 60)
+        self.assertAlmostEqual(total.energy, 20)
+        self.assertEqual(total.last_reading, self.start + timedelta(minutes=1, seconds=get_settings()['max_gap'] + 1))
+
+    def test_older_reading_skipped(self):
+        for minutes in range(3):
+            self.poll(minutes)
+        # Replayed and out of order readings are not applied again
+        self.poll(2)
+        self.assertEqual(self.poll(1, power=6000.0), 0)
+        total = self.get_total()
+        self.assertEqual(total.metered, 120)
+        self.assertAlmostEqual(total.energy, 40)
+        self.assertEqual(total.last_power, 1200)
+        self.assertEqual(total.last_reading, self.start + timedelta(minutes=2))
+
+    def test_period_closed(self):
+        # Readings every minute from 23:50 to 23:58, then at 00:02 in the next month
+        for minutes in range(110, 119):
+            self.poll(minutes)
+        self.poll(122, power=600.0)
+        next_period = get_period_start(self.start + timedelta(days=1))
+
+        # The last reading before the end of the month is held until midnight
+        period = OutletEnergyPeriod.objects.get(outlet__pdu=self.pdu, outlet__outlet_number=1)
+        self.assertEqual(period.period_start, get_period_start(self.start))
+        self.assertEqual(period.metered, 600)
+        self.assertAlmostEqual(period.energy, 200)
+        self.assertEqual(period.pdu, self.pdu)
+        self.assertEqual(period.site_id, self.pdu.site_id)
+
+        # The running total restarts at midnight
+        total = self.get_total()
+        self.assertEqual(total.period_start, next_period)
+        self.assertEqual(total.metered, 120)
+        self.assertAlmostEqual(total.energy, 30)
+        self.assertEqual(total.last_reading, next_period + timedelta(minutes=2))
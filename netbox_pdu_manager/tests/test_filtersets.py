@@ -0,0 +1,78 @@
+import json
+from unittest import skipUnless
+
+from dcim.models import Device, DeviceRole, DeviceType, Manufacturer
+from django.db import connection
+from utilities.testing import TestCase
+
+from netbox_pdu_manager.choices import OutletStatusChoices
+from netbox_pdu_manager.filtersets import OutletFilterSet
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.models import PDU, Outlet
+
+
+def get_scans(plan, table):
+    """Yield (node type, index name) for every scan of `table` in an EXPLAIN (FORMAT JSON) plan"""
+    if plan.get('Relation Name') == table:
+        yield plan['Node Type'], plan.get('Index Name', '-')
+    for child in plan.get('Plans', []):
+        yield from get_scans(child, table)
+
+
+def get_indexes(plan):
+    """Yield the name of every index used in an EXPLAIN (FORMAT JSON) plan"""
+    if 'Index Name' in plan:
+        yield plan['Index Name']
+    for child in plan.get('Plans', []):
+        yield from get_indexes(child)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are checked on PostgreSQL")
+class OutletFilterPlanTestCase(TestCase):
+    """The hot outlet filters are served by indexes, not by sequential scans of the outlet table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pdus = generate_dataset(500, 48)
+        site = cls.pdus[0].site
+        manufacturer = Manufacturer.objects.create(name='Manufacturer', slug='manufacturer')
+        device_type = DeviceType.objects.create(manufacturer=manufacturer, model='Server', slug='server')
+        role = DeviceRole.objects.create(name='Server', slug='server')
+        # Few outlets are connected, as on most PDUs the devices sit on a subset
+        cls.devices = []
+        for pdu in cls.pdus[:25]:
+            device = Device.objects.create(name=f'{pdu.name}-server', site=site, device_type=device_type, role=role)
+            Outlet.objects.filter(pdu=pdu, outlet_number__in=(1, 2)).update(connected_device=device)
+            cls.devices.append(device)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {PDU._meta.db_table}')
+            cursor.execute(f'ANALYZE {Outlet._meta.db_table}')
+
+    def assertIndexed(self, params, index=None):
+        filterset = OutletFilterSet(params, Outlet.objects.all())
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        plan = json.loads(filterset.qs.order_by().values('pk').explain(format='json'))[0]['Plan']
+        scans = list(get_scans(plan, Outlet._meta.db_table))
+        self.assertTrue(scans, "The outlet table is not scanned")
+        self.assertNotIn('Seq Scan', [node_type for node_type, _ in scans], f"{params}: {scans}")
+        if index:
+            self.assertIn(index, list(get_indexes(plan)), f"{params}: {scans}")
+
+    def test_pdu_id(self):
+        self.assertIndexed({'pdu_id': [self.pdus[3].pk]})
+
+    def test_pdu_id_and_status(self):
+        self.assertIndexed({'pdu_id': [self.pdus[3].pk], 'status': [OutletStatusChoices.STATUS_OFF]})
+
+    def test_rare_status(self):
+        self.assertIndexed({'status': [OutletStatusChoices.STATUS_ERROR]})
+
+    def test_has_connected_device(self):
+        self.assertIndexed({'has_connected_device': True})
+
+    def test_connected_device_id(self):
+        self.assertIndexed({'connected_device_id': [self.devices[0].pk]})
+
+    def test_search(self):
+        # search_text__contains is a LIKE '%...%' match, served by the trigram GIN index
+        self.assertIndexed({'q': 'Server-421-1'}, index='netbox_pdu_outlet_search_trgm')
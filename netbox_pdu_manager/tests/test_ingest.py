@@ -0,0 +1,36 @@
+from django.utils import timezone
+from utilities.testing import TestCase
+
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.ingest import OutletKeyMap, ingest_records
+from netbox_pdu_manager.models import Outlet
+
+
+class IngestValidationTestCase(TestCase):
+    """Malformed records are rejected one by one without aborting the stream"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pdu = generate_dataset(1, 2)[0]
+
+    def test_malformed_records(self):
+        ts = timezone.now().isoformat()
+        records = [
+            {'pdu': [self.pdu.name], 'outlet_number': 1, 'ts': ts, 'power': 10},
+            {'pdu': {'name': self.pdu.name}, 'outlet_number': 1, 'ts': ts, 'power': 10},
+            {'pdu': self.pdu.name, 'outlet_number': [1], 'ts': ts, 'power': 10},
+            {'pdu': self.pdu.name, 'outlet_number': {'number': 1}, 'ts': ts, 'power': 10},
+            {'pdu': self.pdu.name, 'outlet_number': True, 'ts': ts, 'power': 10},
+            {'pdu': self.pdu.name, 'outlet_number': '1', 'ts': ts, 'power': 10},
+            {'pdu': self.pdu.name, 'outlet_number': 1, 'ts': ts, 'power': [10]},
+            ['not', 'an', 'object'],
+            ValueError("Invalid JSON"),
+            {'pdu': self.pdu.name, 'outlet_number': 2, 'ts': ts, 'power': 42},
+        ]
+        result = ingest_records(enumerate(records, start=1), batch_size=2, keys=OutletKeyMap())
+
+        self.assertEqual(result.accepted, 1)
+        self.assertEqual(result.rejected, len(records) - 1)
+        self.assertEqual([error['record'] for error in result.errors], list(range(1, len(records))))
+        outlet = Outlet.objects.get(pdu=self.pdu, outlet_number=2)
+        self.assertEqual(outlet.last_measured_power, 42)
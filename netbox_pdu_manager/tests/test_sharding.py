@@ -0,0 +1,81 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from utilities.testing import TestCase
+
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.models import PDUPollState
+from netbox_pdu_manager.scheduler import claim_pdus, ensure_poll_states
+from netbox_pdu_manager.sharding import HashRing, Worker
+
+KEYS = [f'pdu:{i}' for i in range(10000)]
+
+
+class HashRingTestCase(SimpleTestCase):
+    """Only the keys on the arcs of a joining or leaving node move"""
+
+    def assignments(self, nodes):
+        ring = HashRing(nodes)
+        return {key: ring.get(key) for key in KEYS}
+
+    def test_node_added(self):
+        before = self.assignments([f'worker-{i}' for i in range(4)])
+        after = self.assignments([f'worker-{i}' for i in range(5)])
+        moved = [key for key in KEYS if before[key] != after[key]]
+        # Every moved key moved to the new node, about 1/5 of them
+        self.assertEqual({after[key] for key in moved}, {'worker-4'})
+        self.assertAlmostEqual(len(moved) / len(KEYS), 1 / 5, delta=0.05)
+
+    def test_node_removed(self):
+        before = self.assignments([f'worker-{i}' for i in range(5)])
+        after = self.assignments([f'worker-{i}' for i in range(5) if i != 2])
+        moved = [key for key in KEYS if before[key] != after[key]]
+        # Only the keys of the removed node moved
+        self.assertEqual(moved, [key for key in KEYS if before[key] == 'worker-2'])
+        self.assertAlmostEqual(len(moved) / len(KEYS), 1 / 5, delta=0.05)
+
+    def test_empty_ring(self):
+        self.assertIsNone(HashRing().get('pdu:1'))
+
+
+class WorkerShardTestCase(SimpleTestCase):
+    """Workers sharing a ring split the PDUs between them with no gaps or overlaps"""
+
+    def test_owns(self):
+        names = [f'worker-{i}' for i in range(3)]
+        workers = [Worker(name=name) for name in names]
+        for worker in workers:
+            worker.ring = HashRing(names)
+        pdus = [SimpleNamespace(pk=pk, site_id=pk % 7) for pk in range(1, 1001)]
+        for pdu in pdus:
+            self.assertEqual(sum(worker.owns(pdu) for worker in workers), 1, f"PDU {pdu.pk}")
+        # Every worker owns a share
+        for worker in workers:
+            self.assertGreater(sum(worker.owns(pdu) for pdu in pdus), 200)
+
+
+class ClaimPDUsTestCase(TestCase):
+    """claim_pdus() leases only due PDUs which are not leased by another worker"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pdus = generate_dataset(4, 1, pdu_attrs=lambda i: {'api_url': f'https://pdu-{i}.example.com'})
+
+    def test_claim(self):
+        now = timezone.now()
+        ensure_poll_states(now)
+        due, leased, expired, not_due = (pdu.pk for pdu in self.pdus)
+        PDUPollState.objects.update(next_poll=now - timedelta(seconds=1))
+        PDUPollState.objects.filter(pk=leased).update(leased_by='other', lease_expires=now + timedelta(seconds=30))
+        PDUPollState.objects.filter(pk=expired).update(leased_by='other', lease_expires=now - timedelta(seconds=1))
+        PDUPollState.objects.filter(pk=not_due).update(next_poll=now + timedelta(seconds=60))
+
+        claimed = claim_pdus(self.pdus, 'worker', now, ttl=30)
+        self.assertEqual(sorted(pdu.pk for pdu in claimed), sorted([due, expired]))
+        self.assertEqual(
+            set(PDUPollState.objects.filter(leased_by='worker').values_list('pk', flat=True)), {due, expired}
+        )
+        # A second worker finds them leased
+        self.assertEqual(claim_pdus(self.pdus, 'worker-2', now, ttl=30), [])
@@ -0,0 +1,107 @@
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from django.test import SimpleTestCase
+
+from netbox_pdu_manager.spool import EPOCH, HEADER_SIZE, MICROSECOND, RECORD, Spool
+
+TIMESTAMP = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def reading(number, power=100.0, **attrs):
+    return {'outlet_number': number, 'voltage': 230.0, 'current': 0.5, 'power': power, **attrs}
+
+
+class SpoolTestCase(SimpleTestCase):
+    """Spool of 4 records in a temporary file"""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.spool = Spool(os.path.join(self.tempdir.name, 'spool'), max_size=HEADER_SIZE + 4 * RECORD.size)
+
+    def tearDown(self):
+        self.spool.close()
+        self.tempdir.cleanup()
+
+    def append(self, *numbers, timestamp=TIMESTAMP):
+        return self.spool.append({1: [reading(number) for number in numbers]}, timestamp)
+
+    def numbers(self, records):
+        return [record[1] for record in records]
+
+    def test_round_trip(self):
+        self.spool.append({
+            1: [
+                reading(1, status='on'),
+                reading(2, power=None, status='off'),
+                reading(3, power=float('nan')),
+            ],
+            2: [{'outlet_number': 4, 'status': 'invalid'}],
+        }, TIMESTAMP)
+        seq, records = self.spool.peek(10)
+        ts = (TIMESTAMP - EPOCH) // MICROSECOND
+        self.assertEqual(seq, 0)
+        self.assertEqual(records, [
+            (1, 1, 'on', ts, 230.0, 0.5, 100.0),
+            (1, 2, 'off', ts, 230.0, 0.5, None),
+            # NaN is stored for missing values
+            (1, 3, None, ts, 230.0, 0.5, None),
+            (2, 4, None, ts, None, None, None),
+        ])
+        self.assertEqual(EPOCH + records[0][3] * MICROSECOND, TIMESTAMP)
+
+    def test_wraparound(self):
+        self.append(1, 2, 3)
+        seq, records = self.spool.peek(10)
+        self.spool.consume(seq, len(records))
+        # Records 3-5 are stored in slots 3, 0 and 1
+        self.append(4, 5, 6, timestamp=TIMESTAMP + timedelta(seconds=1))
+        seq, records = self.spool.peek(10)
+        self.assertEqual(seq, 3)
+        self.assertEqual(self.numbers(records), [4, 5, 6])
+        self.assertEqual(self.numbers(self.spool.peek(2)[1]), [4, 5])
+        self.spool.consume(seq, 2)
+        seq, records = self.spool.peek(10)
+        self.assertEqual(seq, 5)
+        self.assertEqual(self.numbers(records), [6])
+
+    def test_overflow(self):
+        self.append(1, 2, 3)
+        self.assertEqual(self.append(4, 5, 6), 3)
+        # The two oldest records were overwritten
+        self.assertEqual(self.spool.stats()['dropped'], 2)
+        self.assertEqual(len(self.spool), 4)
+        seq, records = self.spool.peek(10)
+        self.assertEqual(seq, 2)
+        self.assertEqual(self.numbers(records), [3, 4, 5, 6])
+
+        # Only the newest records of a batch larger than the spool are kept
+        self.assertEqual(self.append(*range(7, 13)), 6)
+        self.assertEqual(self.spool.stats()['dropped'], 8)
+        self.assertEqual(self.numbers(self.spool.peek(10)[1]), [9, 10, 11, 12])
+
+    def test_consume_clamp(self):
+        self.append(1, 2)
+        seq, records = self.spool.peek(10)
+        # Records overwritten while the batch was replayed stay dropped
+        self.append(3, 4, 5, 6)
+        self.spool.consume(seq, len(records))
+        self.assertEqual(len(self.spool), 4)
+        self.assertEqual(self.numbers(self.spool.peek(10)[1]), [3, 4, 5, 6])
+        # Consuming beyond the written records stops at the write sequence
+        seq, _ = self.spool.peek(10)
+        self.spool.consume(seq, 10)
+        self.assertEqual(len(self.spool), 0)
+        self.assertEqual(self.spool.peek(10), (6, []))
+        self.append(7)
+        self.assertEqual(self.spool.peek(10)[0], 6)
+
+    def test_reopen(self):
+        self.append(1, 2, 3)
+        path = self.spool.path
+        self.spool.close()
+        # Pending records survive, and the capacity is kept while records are pending
+        self.spool = Spool(path, max_size=HEADER_SIZE + 8 * RECORD.size)
+        self.assertEqual(self.spool.capacity, 4)
+        self.assertEqual(self.numbers(self.spool.peek(10)[1]), [1, 2, 3])
@@ -0,0 +1,150 @@
+from dcim.models import Device, DeviceRole, DeviceType, Manufacturer, Rack, Site
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from utilities.testing import TestCase
+
+from netbox_pdu_manager.fixtures import generate_dataset
+from netbox_pdu_manager.models import PDU, Outlet
+
+
+def create_dataset(prefix, pdu_count, outlet_count=4):
+    """
+    Create PDUs in a rack of their own site, with every other outlet connected to a
+    device, and build their power summaries and dependencies. Returns the PDUs.
+    """
+    site = Site.objects.create(name=f'{prefix} site', slug=f'{prefix}-site')
+    rack = Rack.objects.create(name=f'{prefix} rack', site=site)
+    manufacturer, _ = Manufacturer.objects.get_or_create(name='Manufacturer', slug='manufacturer')
+    device_type, _ = DeviceType.objects.get_or_create(manufacturer=manufacturer, model='Server', slug='server')
+    role, _ = DeviceRole.objects.get_or_create(name='Server', slug='server')
+
+    pdus = generate_dataset(pdu_count, outlet_count, prefix=prefix, site=site, pdu_attrs=lambda i: {'rack': rack})
+    for pdu in pdus:
+        device = Device.objects.create(name=f'{pdu.name}-server', site=site, rack=rack, device_type=device_type, role=role)
+        Outlet.objects.filter(pdu=pdu, outlet_number__in=range(1, outlet_count + 1, 2)).update(connected_device=device)
+    queryset = PDU.objects.filter(pk__in=[pdu.pk for pdu in pdus])
+    queryset.refresh_outlet_counters()
+    queryset.refresh_power_summaries()
+    queryset.refresh_power_dependencies()
+    return pdus
+
+
+class PDUViewQueryCountTestCase(TestCase):
+    """The PDU detail view reads its outlet statistics from the PDU's counters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small_pdu = generate_dataset(1, 2, prefix='small')[0]
+        cls.large_pdu = generate_dataset(1, 48, prefix='large')[0]
+
+    def test_detail_query_count(self):
+        self.add_permissions('netbox_pdu_manager.view_pdu', 'netbox_pdu_manager.view_outlet')
+        small_url = reverse('plugins:netbox_pdu_manager:pdu', kwargs={'pk': self.small_pdu.pk})
+        large_url = reverse('plugins:netbox_pdu_manager:pdu', kwargs={'pk': self.large_pdu.pk})
+
+        # The first request fills per-process caches (content types, config)
+        self.assertHttpStatus(self.client.get(small_url), 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertHttpStatus(self.client.get(small_url), 200)
+
+        # 48 outlets take the same queries as 2
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(large_url)
+        self.assertHttpStatus(response, 200)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Every list, detail, bulk edit and bulk delete view takes a fixed number of queries,
+    within its budget, however many rows it renders. Each view is requested before and
+    after the dataset grows, and both counts must match.
+    """
+    # Maximum number of queries per view
+    budgets = {
+        'pdu_list': 30,
+        'outlet_list': 30,
+        'devicepowerdependency_list': 30,
+        'rackpowersummary_list': 30,
+        'sitepowersummary_list': 30,
+        'pdu': 40,
+        'outlet': 30,
+        'pdu_bulk_edit': 40,
+        'outlet_bulk_edit': 40,
+        'pdu_bulk_delete': 30,
+        'outlet_bulk_delete': 30,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.add_permissions(
+            'netbox_pdu_manager.view_pdu',
+            'netbox_pdu_manager.change_pdu',
+            'netbox_pdu_manager.delete_pdu',
+            'netbox_pdu_manager.view_outlet',
+            'netbox_pdu_manager.change_outlet',
+            'netbox_pdu_manager.delete_outlet',
+            'netbox_pdu_manager.view_devicepowerdependency',
+            'netbox_pdu_manager.view_rackpowersummary',
+            'netbox_pdu_manager.view_sitepowersummary',
+        )
+
+    def count_queries(self, name, method='get', data=None, **kwargs):
+        url = reverse(f'plugins:netbox_pdu_manager:{name}', kwargs=kwargs or None)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertHttpStatus(response, 200)
+        return len(queries)
+
+    def assertFixedQueries(self, name, small, large, method='get'):
+        """
+        Request view `name` with the arguments returned by `small()`, then by `large()`
+        after the dataset has grown, and compare the query counts with each other and
+        with the budget
+        """
+        # Warm up per-process caches
+        self.count_queries(name, method, **small())
+        small_count = self.count_queries(name, method, **small())
+        create_dataset(f'{name}-large', 30, outlet_count=8)
+        large_count = self.count_queries(name, method, **large())
+        self.assertEqual(small_count, large_count, f"{name}: query count grows with the rows rendered")
+        self.assertLessEqual(large_count, self.budgets[name], f"{name}: query budget exceeded")
+
+    def test_list_views(self):
+        create_dataset('small', 2)
+        for name in ('pdu_list', 'outlet_list', 'devicepowerdependency_list', 'rackpowersummary_list',
+                     'sitepowersummary_list'):
+            with self.subTest(view=name):
+                self.assertFixedQueries(name, dict, dict)
+
+    def test_pdu_detail_view(self):
+        pdu = create_dataset('small', 1, outlet_count=2)[0]
+        self.assertFixedQueries(
+            'pdu',
+            lambda: {'pk': pdu.pk},
+            lambda: {'pk': PDU.objects.filter(name__startswith='pdu-large').first().pk}
+        )
+
+    def test_outlet_detail_view(self):
+        outlet = Outlet.objects.get(pdu=create_dataset('small', 1)[0], outlet_number=1)
+        self.assertFixedQueries(
+            'outlet',
+            lambda: {'pk': outlet.pk},
+            lambda: {'pk': Outlet.objects.filter(pdu__name__startswith='outlet-large', outlet_number=1).first().pk}
+        )
+
+    def test_bulk_views(self):
+        for model, prefix in ((PDU, 'pdu'), (Outlet, 'outlet')):
+            for action in ('bulk_edit', 'bulk_delete'):
+                name = f'{prefix}_{action}'
+                with self.subTest(view=name):
+                    create_dataset(f'{name}-small', 1, outlet_count=2)
+                    # Without _apply or _confirm, the views render the selected objects
+                    small = list(model.objects.values_list('pk', flat=True)[:2])
+                    self.count_queries(name, 'post', {'pk': small})
+                    small_count = self.count_queries(name, 'post', {'pk': small})
+                    create_dataset(f'{name}-large', 30, outlet_count=8)
+                    large = list(model.objects.values_list('pk', flat=True)[:50])
+                    large_count = self.count_queries(name, 'post', {'pk': large})
+                    self.assertEqual(small_count, large_count, f"{name}: query count grows with the rows rendered")
+                    self.assertLessEqual(large_count, self.budgets[name], f"{name}: query budget exceeded")
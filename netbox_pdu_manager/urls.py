@@ -8,11 +8,15 @@ urlpatterns = (
     path('pdus/', views.PDUListView.as_view(), name='pdu_list'),
     path('pdus/add/', views.PDUEditView.as_view(), name='pdu_add'),
     path('pdus/import/', views.PDUBulkImportView.as_view(), name='pdu_import'),
+    path('pdus/import/stream/', views.PDUStreamingImportView.as_view(), name='pdu_streaming_import'),
     path('pdus/edit/', views.PDUBulkEditView.as_view(), name='pdu_bulk_edit'),
     path('pdus/delete/', views.PDUBulkDeleteView.as_view(), name='pdu_bulk_delete'),
     path('pdus/<int:pk>/', views.PDUView.as_view(), name='pdu'),
     path('pdus/<int:pk>/edit/', views.PDUEditView.as_view(), name='pdu_edit'),
     path('pdus/<int:pk>/delete/', views.PDUDeleteView.as_view(), name='pdu_delete'),
+    path('pdus/<int:pk>/live/', views.PDULiveView.as_view(), name='pdu_live'),
+    path('pdus/<int:pk>/provision-outlets/', views.PDUProvisionOutletsView.as_view(),
+         name='pdu_provision_outlets'),
     path('pdus/<int:pk>/changelog/', ObjectChangeLogView.as_view(),
          name='pdu_changelog', kwargs={'model': models.PDU}),
 
@@ -20,6 +24,7 @@ urlpatterns = (
     path('outlets/', views.OutletListView.as_view(), name='outlet_list'),
     path('outlets/add/', views.OutletEditView.as_view(), name='outlet_add'),
     path('outlets/import/', views.OutletBulkImportView.as_view(), name='outlet_import'),
+    path('outlets/import/stream/', views.OutletStreamingImportView.as_view(), name='outlet_streaming_import'),
     path('outlets/edit/', views.OutletBulkEditView.as_view(), name='outlet_bulk_edit'),
     path('outlets/delete/', views.OutletBulkDeleteView.as_view(), name='outlet_bulk_delete'),
     path('outlets/<int:pk>/', views.OutletView.as_view(), name='outlet'),
@@ -27,4 +32,17 @@ urlpatterns = (
     path('outlets/<int:pk>/delete/', views.OutletDeleteView.as_view(), name='outlet_delete'),
     path('outlets/<int:pk>/changelog/', ObjectChangeLogView.as_view(),
          name='outlet_changelog', kwargs={'model': models.Outlet}),
+    path('outlets/<int:pk>/measurements/', views.OutletMeasurementsView.as_view(), name='outlet_measurements'),
+
+    # Phase balance analysis
+    path('power/analysis/', views.PowerAnalysisView.as_view(), name='power_analysis'),
+
+    # Power dependencies
+    path('power/dependencies/', views.DevicePowerDependencyListView.as_view(), name='devicepowerdependency_list'),
+    path('power/failure-impact/', views.FailureImpactView.as_view(), name='failure_impact'),
+    path('power/energy/', views.EnergyReportView.as_view(), name='energy_report'),
+
+    # Power capacity URLs (the detail views are tabs of the rack and site)
+    path('power/racks/', views.RackPowerSummaryListView.as_view(), name='rackpowersummary_list'),
+    path('power/sites/', views.SitePowerSummaryListView.as_view(), name='sitepowersummary_list'),
 )
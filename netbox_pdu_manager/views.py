@@ -1,7 +1,189 @@
-from django.db.models import Count
+import tempfile
+from datetime import timedelta
+
+from dcim.models import Rack, Site
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
+from django.views.generic import View
+from netbox.object_actions import BulkExport
+from netbox.plugins import get_plugin_config
 from netbox.views import generic
+from utilities.permissions import get_permission_for_model
+from utilities.views import ObjectPermissionRequiredMixin, ViewTab, register_model_view
 
-from . import forms, models, tables, filtersets
+from . import analysis, dependencies, energy, forms, livefeed, models, tables, filtersets
+from .choices import EnergyScopeChoices
+from .history import get_series
+from .jobs import CSVImportJob, OutletSwitchJob
+from .provisioning import provision_outlets
+
+
+#
+# Streaming Import
+#
+
+class StreamingImportView(ObjectPermissionRequiredMixin, View):
+    """
+    Upload a CSV file and import it in the background with the streaming importer,
+    which resolves related objects in bulk and writes in batches. The user's object
+    permissions are enforced by the job. The importer writes in bulk, so it bypasses
+    change logging: no change records are created for imported objects.
+    """
+    queryset = None
+    importer = None
+    list_url = None
+    template_name = 'netbox_pdu_manager/streaming_import.html'
+
+    def get_required_permission(self):
+        return get_permission_for_model(self.queryset.model, 'add')
+
+    def get_context(self, form):
+        return {
+            'model': self.queryset.model,
+            'form': form,
+            'list_url': self.list_url,
+        }
+
+    def get(self, request):
+        return render(request, self.template_name, self.get_context(forms.StreamingImportForm()))
+
+    def post(self, request):
+        form = forms.StreamingImportForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, self.get_context(form))
+        if form.cleaned_data['update_existing'] and not request.user.has_perm(
+            get_permission_for_model(self.queryset.model, 'change')
+        ):
+            form.add_error('update_existing', "You do not have permission to update existing objects.")
+            return render(request, self.template_name, self.get_context(form))
+
+        # Spool the upload to disk so that neither the request nor the job holds it in memory
+        directory = get_plugin_config('netbox_pdu_manager', 'import_directory')
+        with tempfile.NamedTemporaryFile(dir=directory, prefix='pdu-import-', suffix='.csv', delete=False) as f:
+            for chunk in form.cleaned_data['csv_file'].chunks():
+                f.write(chunk)
+        job = CSVImportJob.enqueue(
+            user=request.user,
+            path=f.name,
+            model=self.importer,
+            update_existing=form.cleaned_data['update_existing'],
+        )
+        messages.info(request, f"Import of {form.cleaned_data['csv_file'].name} queued as job {job.pk}")
+        return redirect(job.get_absolute_url())
+
+
+#
+# Phase Balance Analysis
+#
+
+class PowerAnalysisView(ObjectPermissionRequiredMixin, View):
+    """
+    Report of phase imbalance and of phases, banks and outlets near their limits,
+    over all PDUs the user can view (optionally of one site)
+    """
+    queryset = models.PDU.objects.all()
+    template_name = 'netbox_pdu_manager/power_analysis.html'
+
+    def get_required_permission(self):
+        return get_permission_for_model(self.queryset.model, 'view')
+
+    def get(self, request):
+        pdus = self.queryset
+        site = None
+        if (site_id := request.GET.get('site_id', '')).isdigit():
+            site = get_object_or_404(Site.objects.restrict(request.user, 'view'), pk=site_id)
+            pdus = pdus.filter(site=site)
+        try:
+            report = analysis.analyze_fleet(pdus).serialize()
+        except ValueError as e:
+            messages.error(request, f"The analysis is not available: {e}")
+            report = None
+
+        return render(request, self.template_name, {
+            'report': report,
+            'site': site,
+        })
+
+
+#
+# Power Dependencies
+#
+
+class DevicePowerDependencyListView(generic.ObjectListView):
+    """How each device is fed, from the materialized power dependencies"""
+    queryset = models.DevicePowerDependency.objects.select_related('device', 'device__site')
+    table = tables.DevicePowerDependencyTable
+    filterset = filtersets.DevicePowerDependencyFilterSet
+    actions = (BulkExport,)
+
+
+class FailureImpactView(ObjectPermissionRequiredMixin, View):
+    """
+    Report of the devices which lose all or some of their power if the selected PDUs
+    (by pdu_id, rack_id and/or site_id), or only their `phase` or `bank_number`, fail
+    """
+    queryset = models.PDU.objects.all()
+    template_name = 'netbox_pdu_manager/failure_impact.html'
+
+    def get_required_permission(self):
+        return get_permission_for_model(self.queryset.model, 'view')
+
+    def get(self, request):
+        form = forms.FailureScenarioForm(request.GET or None)
+        impact = None
+        if form.is_valid():
+            impact = dependencies.analyze_failure(
+                form.get_pdus(self.queryset),
+                line=form.line,
+                bank_number=form.cleaned_data['bank_number'],
+                dependencies=models.DevicePowerDependency.objects.restrict(request.user, 'view'),
+            ).serialize(limit=1000)
+
+        return render(request, self.template_name, {
+            'form': form,
+            'impact': impact,
+        })
+
+
+class EnergyReportView(ObjectPermissionRequiredMixin, View):
+    """
+    Report of the energy drawn by the outlets in a billing period (`period`, default
+    the current one), per tenant, device, outlet, PDU, rack or site (`scope`)
+    """
+    queryset = models.Outlet.objects.all()
+    template_name = 'netbox_pdu_manager/energy_report.html'
+    # Views of the entities of each scope
+    url_names = {
+        EnergyScopeChoices.SCOPE_TENANT: 'tenancy:tenant',
+        EnergyScopeChoices.SCOPE_DEVICE: 'dcim:device',
+        EnergyScopeChoices.SCOPE_OUTLET: 'plugins:netbox_pdu_manager:outlet',
+        EnergyScopeChoices.SCOPE_PDU: 'plugins:netbox_pdu_manager:pdu',
+        EnergyScopeChoices.SCOPE_RACK: 'dcim:rack',
+        EnergyScopeChoices.SCOPE_SITE: 'dcim:site',
+    }
+
+    def get_required_permission(self):
+        return get_permission_for_model(self.queryset.model, 'view')
+
+    def get(self, request):
+        form = forms.EnergyReportForm(request.GET)
+        report = None
+        if form.is_valid():
+            report = energy.get_energy_report(
+                scope=form.cleaned_data['scope'],
+                period_start=form.cleaned_data['period'],
+                outlets=self.queryset.restrict(request.user, 'view'),
+            ).serialize(limit=1000)
+
+        return render(request, self.template_name, {
+            'form': form,
+            'report': report,
+            'url_name': self.url_names[report['scope']] if report else None,
+            'enabled': energy.get_settings()['enabled'],
+        })
 
 
 #
@@ -10,38 +192,78 @@ from . import forms, models, tables, filtersets
 
 class PDUView(generic.ObjectView):
     """PDU detail view"""
-    queryset = models.PDU.objects.all()
+    queryset = models.PDU.objects.select_related('site', 'rack', 'ip_address', 'poll_state')
 
     def get_extra_context(self, request, instance):
         # Outlet list table
         outlets_table = tables.OutletTable(
-            instance.outlets.all(),
+            instance.outlets.select_related('pdu__site', 'connected_device'),
             orderable=False
         )
         outlets_table.configure(request)
 
-        # Calculate outlet statistics
-        outlet_stats = {
-            'total': instance.outlets.count(),
-            'on': instance.outlets.filter(status='on').count(),
-            'off': instance.outlets.filter(status='off').count(),
-            'unknown': instance.outlets.filter(status='unknown').count(),
-            'connected': instance.outlets.filter(
-                connected_device__isnull=False
-            ).count(),
-        }
-
-        return {
+        context = {
             'outlets_table': outlets_table,
-            'outlet_stats': outlet_stats,
+            'outlet_stats': instance.outlet_stats,
         }
+        live_settings = livefeed.get_settings()
+        if live_settings['enabled']:
+            # Changes from now on are published for this PDU; the page polls its feed from here
+            context['live_sequence'] = livefeed.watch(instance.pk)
+            # The user can view this PDU, so its polls need not check again
+            livefeed.allow(instance.pk, request.user.pk)
+            context['live_interval'] = int(live_settings['refresh_interval'] * 1000)
+        return context
+
+
+class PDULiveView(View):
+    """
+    Changes to a PDU's outlets and counters since event `after`, polled by the PDU page.
+    Events are read from the change feed in the cache and returned at once. The user's
+    view permission on the PDU is checked on the first poll (or when the PDU page is
+    rendered) and then cached for the feed's retention period, so that later polls read
+    only the cache and issue no queries of their own.
+    """
+    queryset = models.PDU.objects.all()
+
+    def get(self, request, pk):
+        if not livefeed.get_settings()['enabled']:
+            raise Http404("Live updates are not enabled.")
+        if not livefeed.is_allowed(pk, request.user.pk):
+            if not request.user.has_perm('netbox_pdu_manager.view_pdu'):
+                raise PermissionDenied
+            get_object_or_404(self.queryset.restrict(request.user, 'view').values_list('pk', flat=True), pk=pk)
+            livefeed.allow(pk, request.user.pk)
+        try:
+            after = int(request.GET.get('after') or 0)
+        except ValueError:
+            after = 0
+        response = JsonResponse(livefeed.poll(pk, after))
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class PDUProvisionOutletsView(generic.ObjectView):
+    """Create the missing outlets of a PDU from its outlet count"""
+    queryset = models.PDU.objects.all()
+    additional_permissions = ['netbox_pdu_manager.add_outlet']
+
+    def get_required_permission(self):
+        return 'netbox_pdu_manager.change_pdu'
+
+    def get(self, request, pk):
+        return redirect(get_object_or_404(self.queryset, pk=pk).get_absolute_url())
+
+    def post(self, request, pk):
+        pdu = get_object_or_404(self.queryset, pk=pk)
+        result = provision_outlets(self.queryset.filter(pk=pdu.pk))
+        messages.success(request, f"Created {result.created} outlets on {pdu.name}")
+        return redirect(pdu.get_absolute_url())
 
 
 class PDUListView(generic.ObjectListView):
     """PDU list view"""
-    queryset = models.PDU.objects.annotate(
-        outlet_count_actual=Count('outlets')
-    )
+    queryset = models.PDU.objects.select_related('site', 'rack', 'ip_address')
     table = tables.PDUTable
     filterset = filtersets.PDUFilterSet
 
@@ -62,16 +284,23 @@ class PDUBulkImportView(generic.BulkImportView):
     queryset = models.PDU.objects.all()
 
 
+class PDUStreamingImportView(StreamingImportView):
+    """PDU streaming CSV import view"""
+    queryset = models.PDU.objects.all()
+    importer = 'pdu'
+    list_url = 'plugins:netbox_pdu_manager:pdu_list'
+
+
 class PDUBulkEditView(generic.BulkEditView):
     """PDU bulk edit view"""
-    queryset = models.PDU.objects.all()
+    queryset = models.PDU.objects.select_related('site', 'rack', 'ip_address')
     filterset = filtersets.PDUFilterSet
     table = tables.PDUTable
 
 
 class PDUBulkDeleteView(generic.BulkDeleteView):
     """PDU bulk delete view"""
-    queryset = models.PDU.objects.all()
+    queryset = models.PDU.objects.select_related('site', 'rack', 'ip_address')
     filterset = filtersets.PDUFilterSet
     table = tables.PDUTable
 
@@ -83,14 +312,45 @@ class PDUBulkDeleteView(generic.BulkDeleteView):
 class OutletView(generic.ObjectView):
     """Outlet detail view"""
     queryset = models.Outlet.objects.select_related(
-        'pdu', 'connected_device'
+        'pdu__site', 'connected_device'
+    )
+
+
+@register_model_view(models.Outlet, 'measurements')
+class OutletMeasurementsView(generic.ObjectView):
+    """Outlet measurement history view"""
+    queryset = models.Outlet.objects.select_related('pdu__site')
+    template_name = 'netbox_pdu_manager/outlet_measurements.html'
+    tab = ViewTab(
+        label='Measurements',
+        permission='netbox_pdu_manager.view_outlet',
+        weight=500
     )
+    ranges = {
+        '1h': timedelta(hours=1),
+        '24h': timedelta(days=1),
+        '7d': timedelta(days=7),
+        '30d': timedelta(days=30),
+        '365d': timedelta(days=365),
+    }
+
+    def get_extra_context(self, request, instance):
+        selected = request.GET.get('range')
+        if selected not in self.ranges:
+            selected = '24h'
+        end = timezone.now()
+
+        return {
+            'ranges': self.ranges.keys(),
+            'selected_range': selected,
+            'series': get_series(instance.pk, end - self.ranges[selected], end),
+        }
 
 
 class OutletListView(generic.ObjectListView):
     """Outlet list view"""
     queryset = models.Outlet.objects.select_related(
-        'pdu', 'connected_device'
+        'pdu__site', 'connected_device'
     )
     table = tables.OutletTable
     filterset = filtersets.OutletFilterSet
@@ -112,15 +372,109 @@ class OutletBulkImportView(generic.BulkImportView):
     queryset = models.Outlet.objects.all()
 
 
-class OutletBulkEditView(generic.BulkEditView):
-    """Outlet bulk edit view"""
+class OutletStreamingImportView(StreamingImportView):
+    """Outlet streaming CSV import view"""
     queryset = models.Outlet.objects.all()
+    importer = 'outlet'
+    list_url = 'plugins:netbox_pdu_manager:outlet_list'
+
+
+class OutletBulkEditView(generic.BulkEditView):
+    """Outlet bulk edit view. A power action switches the selected outlets in a background job."""
+    queryset = models.Outlet.objects.select_related('pdu__site', 'connected_device')
     filterset = filtersets.OutletFilterSet
     table = tables.OutletTable
+    form = forms.OutletBulkEditForm
+
+    def _update_objects(self, form, request):
+        action = form.cleaned_data.get('power_action')
+        edited = set(form.changed_data) - {'pk', 'power_action'}
+        if action and not edited and not request.POST.getlist('_nullify'):
+            # A power action alone changes no fields, so the outlets are not saved one by
+            # one (each with its own change record) before being switched
+            updated_objects = list(self.queryset.filter(pk__in=form.cleaned_data['pk']))
+        else:
+            updated_objects = super()._update_objects(form, request)
+        if action and updated_objects:
+            job = OutletSwitchJob.enqueue(
+                user=request.user,
+                outlets=[obj.pk for obj in updated_objects],
+                action=action,
+            )
+            messages.info(request, f"Switching {len(updated_objects)} outlets {action} as job {job.pk}")
+        return updated_objects
 
 
 class OutletBulkDeleteView(generic.BulkDeleteView):
     """Outlet bulk delete view"""
-    queryset = models.Outlet.objects.all()
+    queryset = models.Outlet.objects.select_related('pdu__site', 'connected_device')
     filterset = filtersets.OutletFilterSet
     table = tables.OutletTable
+
+
+#
+# Power Capacity Views
+#
+
+class RackPowerSummaryListView(generic.ObjectListView):
+    """Power capacity of all racks, from the materialized rack summaries"""
+    queryset = models.RackPowerSummary.objects.select_related('rack', 'site')
+    table = tables.RackPowerSummaryTable
+    filterset = filtersets.RackPowerSummaryFilterSet
+    actions = (BulkExport,)
+
+
+class SitePowerSummaryListView(generic.ObjectListView):
+    """Power capacity of all sites, from the materialized site summaries"""
+    queryset = models.SitePowerSummary.objects.select_related('site')
+    table = tables.SitePowerSummaryTable
+    filterset = filtersets.SitePowerSummaryFilterSet
+    actions = (BulkExport,)
+
+
+class PowerCapacityView(generic.ObjectView):
+    """Base view of the power capacity tab of a rack or site"""
+    template_name = 'netbox_pdu_manager/power_capacity.html'
+    summary_model = None
+    # PDU field which relates PDUs to the object
+    pdu_field = None
+
+    def get_extra_context(self, request, instance):
+        pdus_table = tables.PDUTable(
+            models.PDU.objects.restrict(request.user, 'view').filter(**{self.pdu_field: instance}).select_related(
+                'site', 'rack', 'ip_address'
+            ),
+            orderable=False
+        )
+        pdus_table.configure(request)
+
+        return {
+            'summary': self.summary_model.objects.filter(pk=instance.pk).first(),
+            'pdus_table': pdus_table,
+        }
+
+
+@register_model_view(Rack, 'power')
+class RackPowerView(PowerCapacityView):
+    """Power capacity tab of a rack"""
+    queryset = Rack.objects.all()
+    summary_model = models.RackPowerSummary
+    pdu_field = 'rack'
+    tab = ViewTab(
+        label='Power',
+        permission='netbox_pdu_manager.view_rackpowersummary',
+        weight=2000
+    )
+
+
+@register_model_view(Site, 'power')
+class SitePowerView(PowerCapacityView):
+    """Power capacity tab of a site"""
+    queryset = Site.objects.all()
+    summary_model = models.SitePowerSummary
+    pdu_field = 'site'
+    tab = ViewTab(
+        label='Power',
+        permission='netbox_pdu_manager.view_sitepowersummary',
+        weight=2000
+    )